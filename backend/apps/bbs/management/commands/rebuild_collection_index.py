@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from bbs.models import Collection, CollectionToArticle
+
+
+class Command(BaseCommand):
+    help = "将合集中文章的顺序重排为连续序号并重算合集文章数"
+
+    def handle(self, *args, **options):
+        changed = 0
+        for collection_id in Collection.objects.values_list("id", flat=True):
+            with transaction.atomic():
+                Collection.objects.select_for_update().filter(id=collection_id).first()
+                records = list(CollectionToArticle.objects.filter(
+                    collection_id=collection_id, is_active=True
+                ).order_by("top", "id"))
+
+                update = []
+                for k, i in enumerate(records, 1):
+                    if i.top != k:
+                        i.top = k
+                        update.append(i)
+                CollectionToArticle.objects.bulk_update(update, ["top"])
+                Collection.objects.filter(id=collection_id).update(article_num=len(records))
+                changed += len(update)
+
+        self.stdout.write(f"已重排{changed}条合集记录")
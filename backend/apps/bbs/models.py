@@ -1,7 +1,12 @@
 from backend.libs.wraps.models import APIModel, models
 import datetime
+
+from django.db import transaction
+from django.db.models import Case, F, Q, When
 from message.models import At, Origin
 from user.models import User
+from backend.utils.Redis import ViewCounter, Counter, Leaderboard
+from task.ledger import add_task
 
 
 class Draft(APIModel):
@@ -36,11 +41,11 @@ class Article(APIModel):
         mention = serializer.context["mention"]
         sender: User = serializer.context["request"].user
 
-        sender.daily.add("bbs_post")
+        add_task(sender.id, "bbs_post")
 
         create_data = []
         for receiver in mention:
-            if receiver != sender and receiver.message_setting.at and receiver.id not in sender.black_me_set:
+            if receiver != sender and receiver.message_setting.at and not sender.is_blacked_by(receiver.id):
                 create_data.append(At(
                     sender=sender,
                     receiver=receiver,
@@ -70,15 +75,15 @@ class Comment(APIModel):
         mention = serializer.context["mention"]
         sender: User = serializer.context["request"].user
 
-        sender.daily.add("comment")
+        add_task(sender.id, "comment")
         if self.target:
-            self.parent.author.daily.add("commented")
+            add_task(self.parent.author_id, "commented")
         else:
-            self.article.author.daily.add("commented")
+            add_task(self.article.author_id, "commented")
 
         create_data = []
         for receiver in mention:
-            if receiver != sender and receiver.message_setting.at and receiver.id not in sender.black_me_set:
+            if receiver != sender and receiver.message_setting.at and not sender.is_blacked_by(receiver.id):
                 create_data.append(At(
                     sender=sender,
                     receiver=receiver,
@@ -104,6 +109,13 @@ class View(APIModel):
     article = models.ForeignKey(to="Article", on_delete=models.DO_NOTHING, verbose_name="浏览帖子")
 
 
+article_view_counter = ViewCounter("article", Article, View, "article")
+article_counter = Counter("article", Article)
+comment_counter = Counter("bbs_comment", Comment)
+# 按板块统计的发帖榜，scope为板块id
+post_board = Leaderboard("bbs_post")
+
+
 class UpAndDown(APIModel):
     author = models.ForeignKey(to="user.User", on_delete=models.DO_NOTHING, verbose_name="点赞点踩作者")
     article = models.ForeignKey(to="Article", on_delete=models.DO_NOTHING, null=True, verbose_name="对应文章")
@@ -118,6 +130,7 @@ class Collection(APIModel):
     title = models.CharField(max_length=50, verbose_name="合集描述")
     description = models.CharField(max_length=200, verbose_name="合集描述")
     is_active = models.BooleanField(default=True, verbose_name="是否有效")
+    article_num = models.IntegerField(default=0, verbose_name="文章数")
 
     article = models.ManyToManyField(
         to="Article",
@@ -127,7 +140,81 @@ class Collection(APIModel):
 
 
 class CollectionToArticle(APIModel):
+    """
+    合集中的文章，有效记录的top为1到article_num的连续序号
+    """
     collection = models.ForeignKey(to="Collection", on_delete=models.DO_NOTHING, verbose_name="对应合集")
     article = models.ForeignKey(to="Article", on_delete=models.DO_NOTHING, verbose_name="对应文章")
     top = models.IntegerField(verbose_name="顺序")
     is_active = models.BooleanField(default=True, verbose_name="是否有效")
+
+    class Meta:
+        index_together = [("collection", "is_active", "top"), ("article", "is_active")]
+
+    @classmethod
+    def append(cls, collection: Collection, article: Article):
+        with transaction.atomic():
+            collection = Collection.objects.select_for_update().get(id=collection.id)
+            cls.objects.create(collection=collection, article=article, top=collection.article_num + 1)
+            Collection.objects.filter(id=collection.id).update(article_num=F("article_num") + 1)
+
+    @classmethod
+    def remove(cls, collection: Collection, record: "CollectionToArticle"):
+        """
+        移出合集，其后的文章序号前移一位
+        """
+        with transaction.atomic():
+            Collection.objects.select_for_update().filter(id=collection.id).first()
+            if not cls.objects.filter(id=record.id, is_active=True).update(is_active=False):
+                return
+            cls.objects.filter(collection=collection, is_active=True, top__gt=record.top).update(top=F("top") - 1)
+            Collection.objects.filter(id=collection.id).update(article_num=F("article_num") - 1)
+
+    @classmethod
+    def reorder(cls, collection: Collection, article_ids):
+        """
+        按给定的文章id顺序重排合集，一条UPDATE完成
+        :return: 文章id与合集中的文章不一致时返回False
+        """
+        with transaction.atomic():
+            Collection.objects.select_for_update().filter(id=collection.id).first()
+            records = dict(cls.objects.filter(collection=collection, is_active=True).values_list("article_id", "id"))
+            if len(article_ids) != len(records) or set(article_ids) != set(records):
+                return False
+
+            cls.objects.filter(id__in=records.values()).update(top=Case(
+                *[When(id=records[article_id], then=k) for k, article_id in enumerate(article_ids, 1)]
+            ))
+            return True
+
+    @classmethod
+    def locate(cls, article_ids):
+        """
+        一批文章在所属各合集中的位置与前后文章，两次查询完成
+        :return: {文章id: {合集: {"previous", "next", "order", "total"}}}
+        """
+        ret = {i: {} for i in article_ids}
+        records = list(cls.objects.filter(
+            article_id__in=article_ids, is_active=True, collection__is_active=True
+        ).select_related("collection").order_by("collection_id"))
+        if not records:
+            return ret
+
+        q = Q()
+        for i in records:
+            q |= Q(collection_id=i.collection_id, top__in=(i.top - 1, i.top + 1))
+        neighbor = {
+            (collection_id, top): neighbor_id
+            for collection_id, top, neighbor_id in cls.objects.filter(q, is_active=True).values_list(
+                "collection_id", "top", "article_id"
+            )
+        }
+
+        for i in records:
+            ret[i.article_id][i.collection] = {
+                "previous": neighbor.get((i.collection_id, i.top - 1)),
+                "next": neighbor.get((i.collection_id, i.top + 1)),
+                "order": i.top,
+                "total": i.collection.article_num,
+            }
+        return ret
@@ -1,15 +1,15 @@
-import re
 from datetime import datetime
 
-from lxml import etree
-from django.db.models import F, Window
+from django.db.models import Window
 from django.db.models.functions import Rank
 
 from .models import *
-from user.models import User
+from user.models import User, user_counter
+from task.ledger import add_task
 from backend.libs.wraps.serializers import EmptySerializer, serializers, APIModelSerializer, OtherUserSerializer, \
-    SimpleAuthorSerializer
+    SimpleAuthorSerializer, VoteStateField, ActionSerializerMixin, get_top_children
 from backend.libs.wraps.errors import SerializerError
+from backend.libs.function.content import RichContent
 from backend.libs.constants import response_code
 
 
@@ -19,7 +19,7 @@ class SimpleCategorySerializer(APIModelSerializer):
         fields = ["category", "id"]
 
 
-class DraftSerializer(APIModelSerializer):
+class DraftSerializer(ActionSerializerMixin, APIModelSerializer):
     category = SimpleCategorySerializer(read_only=True)
     category_id = serializers.IntegerField(write_only=True)
 
@@ -34,25 +34,20 @@ class DraftSerializer(APIModelSerializer):
             "raw_content",
         ]
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-
-        action = self.context["view"].action
-        self.context["action"] = action
-        remove = []
+    @classmethod
+    def get_remove_fields(cls, context):
+        action = context["view"].action
         if action == "list":
-            remove = [
+            return [
                 "category_id",
                 "raw_content"
             ]
         if action == "retrieve":
-            remove = [
+            return [
                 "category_id",
                 "update_time"
             ]
-
-        for i in remove:
-            self.fields.pop(i)
+        return []
 
     def create(self, validated_data):
         validated_data["author_id"] = self.context["request"].user.id
@@ -63,29 +58,7 @@ class SimpleCollectionSerializer(APIModelSerializer):
     extra = serializers.SerializerMethodField()
 
     def get_extra(self, instance: Collection):
-        extra = {
-            "previous": None,
-            "next": None,
-        }
-        articles = CollectionToArticle.objects.filter(collection=instance, is_active=True).all()
-        extra["total"] = len(articles)
-
-        searched = False
-        stop = False
-
-        for k, v in enumerate(articles, 1):
-            if v.article != self.context["article"]:
-                if searched and stop:
-                    break
-                elif searched:
-                    extra["next"] = v.article_id
-                    stop = True
-                else:
-                    extra["previous"] = v.article_id
-            else:
-                searched = True
-                extra["order"] = k
-        return extra
+        return self.context["extra"][instance]
 
     class Meta:
         model = Collection
@@ -96,34 +69,30 @@ class SimpleCollectionSerializer(APIModelSerializer):
         ]
 
 
-class ArticleSerializer(APIModelSerializer):
+class ArticleSerializer(ActionSerializerMixin, APIModelSerializer):
     author = OtherUserSerializer(read_only=True)
     category = SimpleCategorySerializer(read_only=True)
     category_id = serializers.IntegerField(write_only=True)
-    is_up = serializers.SerializerMethodField(read_only=True)
+    is_up = VoteStateField(UpAndDown, "article")
     collections = serializers.SerializerMethodField(read_only=True)
 
     def get_collections(self, instance: Article):
+        located = self.context.setdefault("collections", {})
+        if instance.id not in located:
+            ids = [instance.id]
+            if isinstance(self.parent, serializers.ListSerializer) and self.parent.instance is not None:
+                ids += [i.id for i in self.parent.instance if i.id not in located]
+            located.update(CollectionToArticle.locate(ids))
+
+        extra = located[instance.id]
         collections = SimpleCollectionSerializer(
-            instance=instance.collection_set.filter(is_active=True, collectiontoarticle__is_active=True),
+            instance=list(extra),
             read_only=True,
             many=True,
-            context={"article": instance}
+            context={"article": instance, "extra": extra}
         )
         return collections.data
 
-    def get_is_up(self, instance):
-        author_id = self.context["request"].user.id
-        if not author_id:
-            return None
-
-        article_id = instance.id
-        obj = UpAndDown.objects.filter(article_id=article_id, author_id=author_id).first()
-        if not obj:
-            return None
-
-        return obj.is_up
-
     class Meta:
         model = Article
         fields = [
@@ -146,14 +115,11 @@ class ArticleSerializer(APIModelSerializer):
             "collections"
         ]
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-
-        action = self.context["view"].action
-        self.context["action"] = action
-        remove = []
+    @classmethod
+    def get_remove_fields(cls, context):
+        action = context["view"].action
         if action == "create":
-            remove = [
+            return [
                 "description",
                 "author",
                 "category",
@@ -167,14 +133,14 @@ class ArticleSerializer(APIModelSerializer):
             ]
 
         if action == "list":
-            remove = [
+            return [
                 "category_id",
                 "content",
                 "raw_content"
             ]
 
         if action == "update":
-            remove = [
+            return [
                 "author",
                 "category",
                 "category_id",
@@ -189,14 +155,14 @@ class ArticleSerializer(APIModelSerializer):
             ]
 
         if action == "retrieve":
-            remove = [
+            return [
                 "category_id",
                 "description",
                 "raw_content",
             ]
 
         if action == "raw":
-            remove = [
+            return [
                 "author",
                 "category_id",
                 "description",
@@ -210,84 +176,33 @@ class ArticleSerializer(APIModelSerializer):
                 "is_up"
             ]
 
-        for i in remove:
-            self.fields.pop(i)
+        return []
 
     def create(self, validated_data):
-        validated_data["content"] = self._add_mention(validated_data["content"])
+        content = RichContent(validated_data["content"])
+        self.context["mention"] = content.mention
+        validated_data["content"] = content.html
         validated_data["author"] = self.context["request"].user
-        validated_data["description"] = self._get_description(validated_data["content"])
+        validated_data["description"] = content.article_description()
         return super().create(validated_data)
 
     def update(self, instance: Article, validated_data):
-        validated_data["content"] = self._add_mention(validated_data["content"])
-        validated_data["description"] = self._get_description(validated_data["content"])
+        content = RichContent(validated_data["content"])
+        self.context["mention"] = content.mention
+        validated_data["content"] = content.html
+        validated_data["description"] = content.article_description()
         validated_data["update_time"] = datetime.datetime.now()
         return super().update(instance, validated_data)
 
-    def _get_description(self, content):
-        text = etree.HTML(content).xpath("string(.)")
-        if len(text) <= 64:
-            html_text = f'<div>{text}</div>'
-        else:
-            html_text = f'<div>{text[:64]}...</div>'
-
-        img_urls = re.findall('<img src="(.*?)" .*?/>', content)
-
-        if not img_urls:
-            return html_text
-
-        img_url = img_urls[0]
-        html_image = f'<img src="{img_url}"/>'
-        return html_text + html_image
-
-    def _add_mention(self, html):
-        self.context["mention"] = []
-        tree = etree.HTML(html)
-        for i in tree.xpath("//span[@data-w-e-type='mention']"):
-            uid = i.xpath("@data-info")[0]
-            username = i.xpath("text()")[0].replace("@", "")
-            user = User.objects.filter(id=uid, username=username)
-            if user:
-                self.context["mention"].append(user.first())
-                i.set("style", "color: rgb(54, 88, 226);")
-                i.set("uid", uid)
-
-        return etree.tostring(tree).decode("utf-8")[12:-14]
-
 
 class CommentSerializer(APIModelSerializer):
     author = OtherUserSerializer(read_only=True)
     children_comment = serializers.SerializerMethodField(read_only=True)
-    is_up = serializers.SerializerMethodField(read_only=True)
-
-    def get_is_up(self, instance):
-        author_id = self.context["request"].user.id
-        if not author_id:
-            return None
-
-        comment_id = instance.id
-        obj = UpAndDown.objects.filter(comment_id=comment_id, author_id=author_id).first()
-        if not obj:
-            return None
-
-        return obj.is_up
+    is_up = VoteStateField(UpAndDown, "comment")
 
     def get_children_comment(self, instance: Comment):
-        author_id = self.context["request"].user.id
-        if children := instance.parent_comments.all().filter(is_active=True).order_by("-up_num")[:2]:
-            data = ChildrenCommentSerializer(children, many=True, context=self.context).data
-            for i in data:
-                if not author_id:
-                    i["is_up"] = None
-                else:
-                    comment_id = i["id"]
-                    obj = UpAndDown.objects.filter(comment_id=comment_id, author_id=author_id).first()
-                    if not obj:
-                        i["is_up"] = None
-                    else:
-                        i["is_up"] = obj.is_up
-            return data
+        if children := get_top_children(self, instance, Comment, (UpAndDown, "comment")):
+            return ChildrenCommentSerializer(children, many=True, context=self.context).data
         else:
             return []
 
@@ -308,40 +223,14 @@ class CommentSerializer(APIModelSerializer):
         ]
 
     def create(self, validated_data):
-        validated_data["content"] = self._add_mention(validated_data["content"])
+        content = RichContent(validated_data["content"])
+        self.context["mention"] = content.mention
+        validated_data["content"] = content.html
         validated_data["author"] = self.context["request"].user
         validated_data["article_id"] = self.context["kwargs"].get("article_id")
-        validated_data["description"] = self._get_description(validated_data["content"])
+        validated_data["description"] = content.comment_description()
         return super().create(validated_data)
 
-    def _get_description(self, content):
-        text = etree.HTML(content).xpath("string(.)")
-        if len(text) <= 40:
-            html_text = f'<span>{text}</span>'
-        else:
-            html_text = f'<span>{text[:40]}...</span>'
-
-        img_urls = re.findall('<img src="(.*?)" .*?/>', content)
-
-        if not img_urls:
-            return html_text
-
-        return html_text + "<span>[图片]</span>"
-
-    def _add_mention(self, html):
-        self.context["mention"] = []
-        tree = etree.HTML(html)
-        for i in tree.xpath("//span[@data-w-e-type='mention']"):
-            uid = i.xpath("@data-info")[0]
-            username = i.xpath("text()")[0].replace("@", "")
-            user = User.objects.filter(id=uid, username=username)
-            if user:
-                self.context["mention"].append(user.first())
-                i.set("style", "color: rgb(54, 88, 226);")
-                i.set("uid", uid)
-
-        return etree.tostring(tree).decode("utf-8")[12:-14]
-
 
 class SimpleCommentSerializer(APIModelSerializer):
     author = SimpleAuthorSerializer()
@@ -366,22 +255,10 @@ class SimpleArticleSerializer(APIModelSerializer):
 
 class SelfCommentSerializer(APIModelSerializer):
     article = SimpleArticleSerializer()
-    is_up = serializers.SerializerMethodField(read_only=True)
+    is_up = VoteStateField(UpAndDown, "comment")
     target = SimpleCommentSerializer()
     parent = SimpleCommentSerializer()
 
-    def get_is_up(self, instance):
-        author_id = self.context["request"].user.id
-        if not author_id:
-            return None
-
-        comment_id = instance.id
-        obj = UpAndDown.objects.filter(comment_id=comment_id, author_id=author_id).first()
-        if not obj:
-            return None
-
-        return obj.is_up
-
     class Meta:
         model = Comment
         fields = [
@@ -403,19 +280,7 @@ class ChildrenCommentSerializer(APIModelSerializer):
     article_id = serializers.IntegerField(write_only=True)
     parent_id = serializers.IntegerField(write_only=True)
     target_id = serializers.IntegerField(allow_null=True, default=None)
-    is_up = serializers.SerializerMethodField(read_only=True)
-
-    def get_is_up(self, instance):
-        if request := self.context.get("request"):
-            author_id = request.user.id
-            if not author_id:
-                return None
-            comment_id = instance.id
-            obj = UpAndDown.objects.filter(comment_id=comment_id, author_id=author_id).first()
-            if not obj:
-                return None
-
-            return obj.is_up
+    is_up = VoteStateField(UpAndDown, "comment")
 
     class Meta:
         model = Comment
@@ -437,8 +302,10 @@ class ChildrenCommentSerializer(APIModelSerializer):
         if validated_data.get("target_id"):
             validated_data["content"] = self._add_mention_prefix(validated_data["content"], validated_data)
 
-        validated_data["content"] = self._add_mention(validated_data["content"])
-        validated_data["description"] = self._get_description(validated_data["content"])
+        content = RichContent(validated_data["content"])
+        self.context["mention"] = content.mention
+        validated_data["content"] = content.html
+        validated_data["description"] = content.comment_description()
         validated_data["author"] = self.context["request"].user
 
         return super().create(validated_data)
@@ -462,34 +329,6 @@ class ChildrenCommentSerializer(APIModelSerializer):
         ])
         return content
 
-    def _get_description(self, content):
-        text = etree.HTML(content).xpath("string(.)")
-        if len(text) <= 40:
-            html_text = f'<span>{text}</span>'
-        else:
-            html_text = f'<span>{text[:40]}...</span>'
-
-        img_urls = re.findall('<img src="(.*?)" .*?/>', content)
-
-        if not img_urls:
-            return html_text
-
-        return html_text + "<span>[图片]</span>"
-
-    def _add_mention(self, html):
-        self.context["mention"] = []
-        tree = etree.HTML(html)
-        for i in tree.xpath("//span[@data-w-e-type='mention']"):
-            uid = i.xpath("@data-info")[0]
-            username = i.xpath("text()")[0].replace("@", "")
-            user = User.objects.filter(id=uid, username=username)
-            if user:
-                self.context["mention"].append(user.first())
-                i.set("style", "color: rgb(54, 88, 226);")
-                i.set("uid", uid)
-
-        return etree.tostring(tree).decode("utf-8")[12:-14]
-
 
 class VoteArticleSerializer(EmptySerializer):
     article_id = serializers.CharField()
@@ -503,31 +342,32 @@ class VoteArticleSerializer(EmptySerializer):
 
         instance = UpAndDown.objects.filter(article_id=article_id, author_id=user_id).first()
         receiver = Article.objects.get(id=article_id).author
+        up = 0
 
         if not instance:
             if is_up:
-                receiver.up_num += 1
-                User.objects.get(id=user_id).daily.add("like")
-                receiver.daily.add("post_liked")
+                up = 1
+                add_task(user_id, "like")
+                add_task(receiver.id, "post_liked")
 
             instance = UpAndDown.objects.create(article_id=article_id, is_up=is_up, author_id=user_id)
             self._update_num(article_id, is_up, 1 - is_up)
         else:
             if instance.is_up == is_up:
-                receiver.up_num -= is_up
+                up = -is_up
                 instance.delete()
                 self._update_num(article_id, -is_up, is_up - 1)
             else:
                 instance.is_up = is_up
-                receiver.up_num += 2 * is_up - 1
+                up = 2 * is_up - 1
                 instance.save()
                 self._update_num(article_id, 2 * is_up - 1, 1 - 2 * is_up)
-        receiver.save()
+        user_counter.add(receiver.id, up_num=up)
         return instance
 
     @staticmethod
     def _update_num(article_id, up, down):
-        Article.objects.filter(id=article_id).update(up_num=F("up_num") + up, down_num=F("down_num") + down)
+        article_counter.add(article_id, up_num=up, down_num=down)
 
 
 class VoteCommentSerializer(EmptySerializer):
@@ -544,8 +384,8 @@ class VoteCommentSerializer(EmptySerializer):
 
         if not instance:
             if is_up:
-                User.objects.get(id=user_id).daily.add("like")
-                Comment.objects.get(id=comment_id).author.daily.add("comment_liked")
+                add_task(user_id, "like")
+                add_task(Comment.objects.get(id=comment_id).author_id, "comment_liked")
 
             instance = UpAndDown.objects.create(comment_id=comment_id, is_up=is_up, author_id=user_id)
             self._update_num(comment_id, is_up, 1 - is_up)
@@ -562,10 +402,10 @@ class VoteCommentSerializer(EmptySerializer):
 
     @staticmethod
     def _update_num(comment_id, up, down):
-        Comment.objects.filter(id=comment_id).update(up_num=F("up_num") + up, down_num=F("down_num") + down)
+        comment_counter.add(comment_id, up_num=up, down_num=down)
 
 
-class CategorySerializer(APIModelSerializer):
+class CategorySerializer(ActionSerializerMixin, APIModelSerializer):
     class Meta:
         model = Category
         fields = [
@@ -576,37 +416,32 @@ class CategorySerializer(APIModelSerializer):
             "icon_detail",
         ]
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-
-        view = self.context["view"]
-        self.context["action"] = view.action
+    @classmethod
+    def get_remove_fields(cls, context):
+        view = context["view"]
         if view.action == "retrieve":
-            remove = [
+            return [
                 "icon",
             ]
         elif view.action == "list" and view.request.query_params.get("type") == "edit":
-            remove = [
+            return [
                 "description",
                 "icon_detail",
                 "icon",
             ]
         else:
-            remove = [
+            return [
                 "description",
                 "icon_detail",
             ]
 
-        for i in remove:
-            self.fields.pop(i)
-
 
-class CollectionSerializer(APIModelSerializer):
+class CollectionSerializer(ActionSerializerMixin, APIModelSerializer):
     total = serializers.SerializerMethodField()
     involved = serializers.SerializerMethodField()
 
     def get_total(self, instance: Collection):
-        return len(instance.article.filter(collectiontoarticle__is_active=True).all())
+        return instance.article_num
 
     def get_involved(self, instance: Collection):
         return CollectionToArticle.objects.filter(
@@ -629,37 +464,37 @@ class CollectionSerializer(APIModelSerializer):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        view = self.context["view"]
-        self.context["action"] = view.action
-        article_id = self.context["view"].request.query_params.get("article_id")
-        if view.action == "list" and article_id:
+        if article_id := self.context["view"].request.query_params.get("article_id"):
             self.context["article_id"] = article_id
-            remove = [
+
+    @classmethod
+    def get_remove_fields(cls, context):
+        view = context["view"]
+        article_id = view.request.query_params.get("article_id")
+        if view.action == "list" and article_id:
+            return [
                 "description",
             ]
-
         elif view.action == "list" and not article_id:
-            remove = [
+            return [
                 "description",
                 "involved"
             ]
         elif view.action == "retrieve":
-            remove = [
+            return [
                 "create_time",
                 "total",
                 "involved",
             ]
         elif view.action == "update":
-            remove = [
+            return [
                 "create_time",
                 "involved",
             ]
         else:
-            remove = [
+            return [
                 "involved",
             ]
-        for i in remove:
-            self.fields.pop(i)
 
     def create(self, validated_data):
         validated_data["author"] = self.context["view"].request.user
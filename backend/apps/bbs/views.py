@@ -1,13 +1,17 @@
 from rest_framework.decorators import action
-from django.db.models import Q
 from rest_framework.request import Request
 
 from .serializers import *
-from message.models import Dynamic, MessageSetting, Like, Reply, Origin, At
+from message.models import Dynamic, Like, Reply, Origin, At
+from message import fanout
 from backend.libs.constants import response_code
-from backend.libs.wraps.views import APIModelViewSet
+from backend.libs.wraps.views import APIModelViewSet, AsyncReadMixin, CursorPag
 from backend.libs.wraps.response import APIResponse
 from backend.libs.wraps.authenticators import CommonJwtAuthentication, UserInfoAuthentication
+from search.models import Category as SearchCategory
+from search.index import update_document, remove_document
+from common import feed
+from backend.utils.Redis.leaderboard import PERIODS, week_of
 
 
 class DraftView(APIModelViewSet):
@@ -27,8 +31,9 @@ class DraftView(APIModelViewSet):
             "-update_time")
 
 
-class ArticleView(APIModelViewSet):
+class ArticleView(AsyncReadMixin, APIModelViewSet):
     authentication_classes = [CommonJwtAuthentication]
+    pagination_class = CursorPag
     queryset = Article.objects.filter(is_active=True)
     serializer_class = ArticleSerializer
     filter_fields = [
@@ -50,8 +55,6 @@ class ArticleView(APIModelViewSet):
         "author__id",
         "author__username",
         "category__category",
-        "description",
-        "content"
     ]
     code = {
         "create": response_code.SUCCESS_POST_ARTICLE,
@@ -74,36 +77,29 @@ class ArticleView(APIModelViewSet):
         return self.queryset.filter(author=self.request.user, author__is_active=True).all()
 
     def after_retrieve(self, instance, request, *args, **kwargs):
-        if not View.objects.filter(
-                article=instance,
-                name_id=request.user.id
-        ).exists() and not request.user.is_anonymous:
-            instance.view_num += 1
-            instance.save()
-            View.objects.create(article=instance, name_id=request.user.id)
+        instance.view_num += article_view_counter.view(instance.id, request.user.id)
 
     def before_create(self, request, *args, **kwargs):
         if not request.user.is_superuser and request.data.get("category_id") == 1:
             return APIResponse(response_code.NO_PERMISSION, "无权限")
 
     def after_create(self, instance, request, *args, **kwargs):
-        follower_list = request.user.follow_me.exclude(
-            follower__message_setting__dynamic=0,
-        ).filter(
-            ~Q(follower_id__in=request.user.black_me_set)
-        ).all()
-
-        create_data = map(lambda follower: Dynamic(
-            sender=request.user,
-            receiver=follower.follower,
-            origin=Origin.BBS_ARTICLE,
-            bbs_article=instance,
-            is_viewed=follower.follower.message_setting.dynamic == MessageSetting.IGNORE,
-        ), follower_list)
-
-        Dynamic.objects.bulk_create(create_data)
+        update_document(SearchCategory.ARTICLE, instance)
+        feed.update_item(SearchCategory.ARTICLE, instance)
+        post_board.incr(instance.author_id, 1, instance.category_id)
+
+        fanout.enqueue(request.user, Origin.BBS_ARTICLE, instance)
+
+    def after_update(self, instance, request, *args, **kwargs):
+        update_document(SearchCategory.ARTICLE, instance)
+        feed.update_item(SearchCategory.ARTICLE, instance)
 
     def after_destroy(self, instance, request, *args, **kwargs):
+        remove_document(SearchCategory.ARTICLE, instance.id)
+        feed.remove_item(SearchCategory.ARTICLE, instance.id)
+        post_board.incr(instance.author_id, -1, instance.category_id, periods=(
+            PERIODS if week_of(instance.create_time.date()) == week_of() else ("all",)
+        ))
         Dynamic.handle_delete(instance, Origin.BBS_ARTICLE)
         Like.handle_delete(instance, Origin.BBS_ARTICLE)
         Reply.handle_delete(instance, Origin.BBS_ARTICLE)
@@ -139,26 +135,14 @@ class ArticleView(APIModelViewSet):
         if receiver != sender:
             if receiver.message_setting.like:
 
-                like = Like.objects.filter(bbs_article=article, sender=sender)
-                if request.data.get("is_up") and not like:
-                    Like.objects.create(
-                        origin=Origin.BBS_ARTICLE,
-                        bbs_article_id=pk,
-                        sender=sender,
-                        receiver=receiver,
-                        is_viewed=receiver.is_viewed(sender, "like")
-                    )
-                else:
-                    like = like.first()
-                    like.time = datetime.datetime.now()
-                    like.is_active = request.data.get("is_up") and not like.is_active
-                    like.save()
+                Like.vote(Origin.BBS_ARTICLE, article, sender, receiver, request.data.get("is_up"))
 
         return APIResponse(response_code.SUCCESS_VOTE_ARTICLE, "评价成功")
 
 
-class CommentView(APIModelViewSet):
+class CommentView(AsyncReadMixin, APIModelViewSet):
     authentication_classes = [CommonJwtAuthentication]
+    pagination_class = CursorPag
     queryset = Comment.objects.filter(is_active=True, parent_id=None, article__is_active=True)
     serializer_class = CommentSerializer
     filter_fields = ["author_id"]
@@ -185,9 +169,7 @@ class CommentView(APIModelViewSet):
         return queryset.filter(author=self.request.user)
 
     def after_create(self, instance: Comment, request, *args, **kwargs):
-        instance.article.comment_num += 1
-        instance.article.comment_time = datetime.datetime.now()
-        instance.article.save()
+        article_counter.add(instance.article_id, comment_num=1, comment_time=datetime.datetime.now())
 
         receiver = instance.article.author
         sender = request.user
@@ -201,25 +183,10 @@ class CommentView(APIModelViewSet):
             )
 
         if request.data.get("share"):
-            follower_list = request.user.follow_me.exclude(
-                follower__message_setting__dynamic=0,
-            ).filter(
-                ~Q(follower_id__in=request.user.black_me_set)
-            ).all()
-
-            create_data = map(lambda follower: Dynamic(
-                sender=request.user,
-                receiver=follower.follower,
-                origin=Origin.BBS_COMMENT,
-                bbs_comment=instance,
-                is_viewed=follower.follower.message_setting.dynamic == MessageSetting.IGNORE,
-            ), follower_list)
-
-            Dynamic.objects.bulk_create(create_data)
+            fanout.enqueue(request.user, Origin.BBS_COMMENT, instance)
 
     def after_destroy(self, instance: Comment, request, *args, **kwargs):
-        instance.article.comment_num -= 1 + instance.comment_num
-        instance.article.save()
+        article_counter.add(instance.article_id, comment_num=-1 - instance.comment_num)
 
         Dynamic.handle_delete(instance, Origin.BBS_COMMENT)
         Like.handle_delete(instance, Origin.BBS_COMMENT)
@@ -243,25 +210,12 @@ class CommentView(APIModelViewSet):
         receiver = comment.author
         sender = request.user
         if receiver != sender and receiver.message_setting.like:
-            like = Like.objects.filter(origin=Origin.BBS_COMMENT, bbs_comment=comment, sender=sender)
-            if request.data.get("is_up") and not like:
-                Like.objects.create(
-                    origin=Origin.BBS_COMMENT,
-                    bbs_comment_id=pk,
-                    sender=sender,
-                    receiver=receiver,
-                    is_viewed=receiver.is_viewed(sender, "like")
-                )
-            else:
-                like = like.first()
-                like.time = datetime.datetime.now()
-                like.is_active = request.data.get("is_up") and not like.is_active
-                like.save()
+            Like.vote(Origin.BBS_COMMENT, comment, sender, receiver, request.data.get("is_up"))
 
         return APIResponse(response_code.SUCCESS_VOTE_COMMENT, "评价成功")
 
 
-class ChildrenCommentView(APIModelViewSet):
+class ChildrenCommentView(AsyncReadMixin, APIModelViewSet):
     authentication_classes = [CommonJwtAuthentication]
     queryset = Comment.objects.filter(is_active=True, parent_id__isnull=False, parent__is_active=True,
                                       article__is_active=True)
@@ -288,11 +242,8 @@ class ChildrenCommentView(APIModelViewSet):
         request.data["parent_id"] = kwargs.pop("parent_id", None)
 
     def after_create(self, instance: Comment, request, *args, **kwargs):
-        instance.article.comment_num += 1
-        instance.article.comment_time = datetime.datetime.now()
-        instance.article.save()
-        instance.parent.comment_num += 1
-        instance.parent.save()
+        article_counter.add(instance.article_id, comment_num=1, comment_time=datetime.datetime.now())
+        comment_counter.add(instance.parent_id, comment_num=1)
 
         receiver = instance.target.author if instance.target else instance.parent.author
         sender = request.user
@@ -307,27 +258,11 @@ class ChildrenCommentView(APIModelViewSet):
             )
 
         if request.data.get("share"):
-            follower_list = request.user.follow_me.exclude(
-                follower__message_setting__dynamic=0,
-            ).filter(
-                ~Q(follower_id__in=request.user.black_me_set)
-            ).all()
-
-            create_data = map(lambda follower: Dynamic(
-                sender=request.user,
-                receiver=follower.follower,
-                origin=Origin.BBS_COMMENT,
-                bbs_comment=instance,
-                is_viewed=follower.follower.message_setting.dynamic == MessageSetting.IGNORE,
-            ), follower_list)
-
-            Dynamic.objects.bulk_create(create_data)
+            fanout.enqueue(request.user, Origin.BBS_COMMENT, instance)
 
     def after_destroy(self, instance: Comment, request, *args, **kwargs):
-        instance.article.comment_num -= 1
-        instance.article.save()
-        instance.parent.comment_num -= 1
-        instance.parent.save()
+        article_counter.add(instance.article_id, comment_num=-1)
+        comment_counter.add(instance.parent_id, comment_num=-1)
 
         Dynamic.handle_delete(instance, Origin.BBS_COMMENT)
         Like.handle_delete(instance, Origin.BBS_COMMENT)
@@ -432,8 +367,7 @@ class CollectionArticleView(APIModelViewSet):
         if collection in article.collection_set.filter(collectiontoarticle__is_active=True).all():
             return APIResponse(response_code.ALREADY_IN_COLLECTION, "文章已在该合集中")
 
-        total = CollectionToArticle.objects.filter(collection=collection, is_active=True).count()
-        CollectionToArticle.objects.create(article=article, top=total + 1, collection=collection)
+        CollectionToArticle.append(collection, article)
         return APIResponse(self.code["create"], "已添加到合集")
 
     def destroy(self, request, *args, **kwargs):
@@ -449,8 +383,24 @@ class CollectionArticleView(APIModelViewSet):
         if not article:
             return APIResponse(response_code.INEXISTENT_ARTICLE, "文章不存在")
 
-        article = article.first()
-
-        article.is_active = False
-        article.save()
+        CollectionToArticle.remove(collection, article.first())
         return APIResponse(self.code["destroy"], "已移出合集")
+
+    @action(["POST"], False)
+    def reorder(self, request, *args, **kwargs):
+        collection = Collection.objects.filter(id=self.kwargs.get("collection_id"), is_active=True).first()
+        if not collection:
+            return APIResponse(response_code.INEXISTENT_COLLECTION, "合集不存在")
+
+        if collection.author_id != request.user.id:
+            return APIResponse(response_code.NO_PERMISSION, "无权限")
+
+        try:
+            article_ids = [int(i) for i in request.data.get("article_ids")]
+        except (TypeError, ValueError):
+            return APIResponse(response_code.INVALID_PARAMS, "参数错误")
+
+        if not CollectionToArticle.reorder(collection, article_ids):
+            return APIResponse(response_code.INVALID_PARAMS, "文章与合集不一致")
+
+        return APIResponse(response_code.SUCCESS_SORT_COLLECTION, "已调整合集顺序")
@@ -0,0 +1,52 @@
+from search.index import SOURCES, get_model, is_indexable
+from .models import FeedItem
+
+
+def update_item(category, instance):
+    """
+    发布或修改内容时更新信息流条目，对象已删除或不可见时移出信息流
+    """
+    if not is_indexable(category, instance):
+        return remove_item(category, instance.id)
+
+    FeedItem.objects.update_or_create(
+        category=category, object_id=instance.id, defaults={"update_time": instance.update_time}
+    )
+
+
+def remove_item(category, object_id):
+    FeedItem.objects.filter(category=category, object_id=object_id).delete()
+
+
+def rebuild(category, chunk=500):
+    """
+    按来源表分批重建某类内容的信息流条目，并移除已不可见的条目
+    :return: 条目数
+    """
+    queryset = get_model(category).objects.filter(**SOURCES[category][1]).order_by("id")
+    last_id = 0
+    total = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id).values_list("id", "update_time")[:chunk])
+        if not batch:
+            break
+
+        existing = {
+            i.object_id: i for i in FeedItem.objects.filter(category=category, object_id__in=[i for i, _ in batch])
+        }
+        create_data, update_data = [], []
+        for object_id, update_time in batch:
+            if item := existing.get(object_id):
+                if item.update_time != update_time:
+                    item.update_time = update_time
+                    update_data.append(item)
+            else:
+                create_data.append(FeedItem(category=category, object_id=object_id, update_time=update_time))
+        FeedItem.objects.bulk_update(update_data, ["update_time"])
+        FeedItem.objects.bulk_create(create_data, ignore_conflicts=True)
+
+        last_id = batch[-1][0]
+        total += len(batch)
+
+    FeedItem.objects.filter(category=category).exclude(object_id__in=queryset.values("id")).delete()
+    return total
@@ -0,0 +1,71 @@
+import asyncio
+import time
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.urls import resolve
+
+from backend.libs.wraps.views import run_read
+
+PATHS = [
+    "/bbs/article/",
+    "/bbs/article/1/",
+    "/bbs/article/1/comment/",
+    "/common/recommend/community/",
+    "/user/self/message/",
+]
+
+
+class Command(BaseCommand):
+    help = "对比同步视图与异步读视图在并发请求下的吞吐与延迟"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", action="append", help="请求路径，可重复，默认为热点读接口")
+        parser.add_argument("--number", type=int, default=200, help="每个接口的请求数")
+        parser.add_argument("--concurrency", type=int, default=50, help="并发数")
+        parser.add_argument("--token", default=None, help="登录token，用于需要登录的接口")
+
+    async def run(self, view, path, number, concurrency, headers):
+        factory = RequestFactory()
+        semaphore = asyncio.Semaphore(concurrency)
+        latency = []
+
+        async def request():
+            async with semaphore:
+                start = time.perf_counter()
+                await view(factory.get(path, **headers))
+                latency.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(request() for _ in range(number)))
+        total = time.perf_counter() - start
+        latency.sort()
+        return number / total, latency[len(latency) // 2], latency[int(len(latency) * 0.95)]
+
+    def report(self, name, result):
+        qps, p50, p95 = result
+        self.stdout.write(f"  {name:<6} {qps:8.1f} req/s  p50: {p50 * 1e3:8.1f}ms  p95: {p95 * 1e3:8.1f}ms")
+
+    def handle(self, *args, **options):
+        headers = {"HTTP_AUTHORIZATION": options["token"]} if options["token"] else {}
+        for path in options["path"] or PATHS:
+            match = resolve(path)
+            async_view = match.func
+            sync_view = getattr(async_view, "__wrapped__", async_view)
+            if not asyncio.iscoroutinefunction(async_view):
+                self.stderr.write(f"{path} 不是异步读视图，跳过")
+                continue
+
+            # 与ASGI下的同步视图一致：全部请求在同一线程中执行
+            sync = sync_to_async(partial(run_read, sync_view), thread_sensitive=True)
+
+            def bind(view):
+                return lambda request: view(request, *match.args, **match.kwargs)
+
+            self.stdout.write(path)
+            for name, view in [("同步", bind(sync)), ("异步", bind(async_view))]:
+                self.report(name, asyncio.run(self.run(
+                    view, path, options["number"], options["concurrency"], headers
+                )))
@@ -0,0 +1,49 @@
+import re
+import timeit
+
+from lxml import etree
+from django.core.management.base import BaseCommand
+
+from backend.libs.function.content import RichContent
+
+
+def legacy(html):
+    tree = etree.HTML(html)
+    for i in tree.xpath("//span[@data-w-e-type='mention']"):
+        i.set("style", "color: rgb(54, 88, 226);")
+    content = etree.tostring(tree).decode("utf-8")[12:-14]
+
+    text = etree.HTML(content).xpath("string(.)")
+    img_urls = re.findall('<img src="(.*?)" .*?/>', content)
+    return content, text[:64], img_urls[:1]
+
+
+def pipeline(html):
+    content = RichContent(html)
+    return content.html, content.article_description()
+
+
+def make_post(paragraphs):
+    body = []
+    for i in range(paragraphs):
+        body.append(f"<p>第{i}段 区块链预测市场的讨论内容 some english words {i}</p>")
+        if i % 20 == 0:
+            body.append(f'<p><img src="articles/{i}.png" alt="" data-href="" style=""/></p>')
+    return "".join(body)
+
+
+class Command(BaseCommand):
+    help = "对比旧的多次解析与单次解析富文本的耗时"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--number", type=int, default=50, help="每种规模的重复次数")
+
+    def handle(self, *args, **options):
+        number = options["number"]
+        for paragraphs in (10, 100, 1000, 5000):
+            html = make_post(paragraphs)
+            old = timeit.timeit(lambda: legacy(html), number=number) / number
+            new = timeit.timeit(lambda: pipeline(html), number=number) / number
+            self.stdout.write(
+                f"{len(html) // 1024:>5}KB  旧: {old * 1000:8.3f}ms  新: {new * 1000:8.3f}ms  加速: {old / new:5.2f}x"
+            )
@@ -0,0 +1,98 @@
+import datetime
+import timeit
+from collections import OrderedDict
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+
+from backend.libs.wraps.renderers import FastJSONRenderer, orjson
+
+
+def make_author(i):
+    return OrderedDict(id=i, username=f"用户{i}", avatar="avatar/default.png", exp=1024, metal=[
+        OrderedDict(id=1, name="先行者", image="metal/1.png"),
+    ])
+
+
+def make_article():
+    content = "".join(f"<p>第{i}段，<strong>正文</strong>内容<a href='https://example.com/{i}'>链接</a></p>"
+                      for i in range(2000))
+    return ReturnDict(
+        id=1,
+        title="一篇很长的文章",
+        author=make_author(1),
+        content=content,
+        category=OrderedDict(id=1, category="分类"),
+        like_num=10,
+        comment_num=20,
+        view_num=300,
+        create_time="2022-03-01 12:00:00",
+        is_liked=False,
+        is_collected=False,
+        serializer=None,
+    )
+
+
+def make_comments(n):
+    return ReturnList([OrderedDict(
+        id=i,
+        content=f"<p>评论{i}</p>",
+        author=make_author(i),
+        like_num=i,
+        comment_num=3,
+        create_time="2022-03-01 12:00:00",
+        is_liked=bool(i % 2),
+        children=[OrderedDict(id=i * 10 + j, content="回复", author=make_author(j), reply=None) for j in range(3)],
+    ) for i in range(n)], serializer=None)
+
+
+def make_messages(n):
+    now = datetime.datetime.now()
+    return [OrderedDict(
+        id=i,
+        content="系统消息",
+        time=now,
+        date=now.date(),
+        is_viewed=False,
+        sender=make_author(i),
+    ) for i in range(n)]
+
+
+def wrap(data):
+    return {"code": 200, "msg": "成功", "data": data}
+
+
+class Command(BaseCommand):
+    help = "对比DRF的JSONRenderer与FastJSONRenderer的渲染耗时"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--number", type=int, default=500, help="重复次数")
+        parser.add_argument("--page", type=int, default=20, help="列表条数")
+
+    def report(self, name, old, new, number):
+        old, new = old / number, new / number
+        self.stdout.write(f"{name:<20} 旧: {old * 1e6:9.1f}us  新: {new * 1e6:9.1f}us  加速: {old / new:5.2f}x")
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stderr.write("未安装orjson，FastJSONRenderer将退回JSONRenderer")
+            return
+
+        number = options["number"]
+        page = options["page"]
+        old_renderer, new_renderer = JSONRenderer(), FastJSONRenderer()
+
+        for name, data in [
+            ("文章详情", wrap(make_article())),
+            ("评论列表", wrap(make_comments(page))),
+            ("消息列表", wrap(make_messages(page))),
+        ]:
+            old = old_renderer.render(data)
+            new = new_renderer.render(data)
+            if old != new:
+                self.stderr.write(f"{name}: 两种渲染结果不一致")
+
+            old = timeit.timeit(lambda: old_renderer.render(data), number=number)
+            new = timeit.timeit(lambda: new_renderer.render(data), number=number)
+            self.report(name, old, new, number)
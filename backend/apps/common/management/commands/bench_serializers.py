@@ -0,0 +1,99 @@
+import datetime
+import timeit
+from types import SimpleNamespace
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+
+from bbs.serializers import (
+    ArticleSerializer, DraftSerializer, CategorySerializer, CollectionSerializer, Category as BBSCategory
+)
+from special.serializers import ColumnSerializer, MyColumnSerializer
+from information.models import News
+from information.serializers import NewsSerializer
+from vote.serializers import VoteSerializer
+
+
+def legacy_class(serializer_class):
+    """
+    还原旧的实现：构建全部字段后按action移除
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(cls, self).__init__(*args, **kwargs)
+        for i in serializer_class.get_remove_fields(self.context):
+            self.fields.pop(i)
+
+    cls = type(serializer_class.__name__, (serializer_class,), {"_specialized": True, "__init__": __init__})
+    return cls
+
+
+def make_context(action, **query_params):
+    request = SimpleNamespace(query_params=query_params, user=AnonymousUser())
+    return {"view": SimpleNamespace(action=action, request=request), "request": request}
+
+
+def make_news(n):
+    now = datetime.datetime.now()
+    return [News(
+        id=i,
+        title=f"资讯{i}",
+        author_id=1,
+        description="摘要",
+        content="<p>内容</p>",
+        raw_content="[]",
+        create_time=now,
+        update_time=now,
+    ) for i in range(n)]
+
+
+def make_category(n):
+    return [BBSCategory(id=i, category=f"分类{i}", description="暂无介绍~", icon="a.png", icon_detail="b.png")
+            for i in range(n)]
+
+
+class Command(BaseCommand):
+    help = "对比运行时移除字段与缓存裁剪后的序列化器类的耗时"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--number", type=int, default=2000, help="重复次数")
+        parser.add_argument("--page", type=int, default=10, help="每页条数")
+
+    def report(self, name, old, new, number):
+        old, new = old / number, new / number
+        self.stdout.write(f"{name:<28} 旧: {old * 1e6:9.1f}us  新: {new * 1e6:9.1f}us  加速: {old / new:5.2f}x")
+
+    def handle(self, *args, **options):
+        number = options["number"]
+        page = options["page"]
+
+        self.stdout.write("实例化many=True序列化器并构建字段:")
+        for serializer_class, action in [
+            (ArticleSerializer, "list"),
+            (ArticleSerializer, "retrieve"),
+            (DraftSerializer, "list"),
+            (ColumnSerializer, "list"),
+            (MyColumnSerializer, "list"),
+            (NewsSerializer, "list"),
+            (CategorySerializer, "list"),
+            (CollectionSerializer, "list"),
+            (VoteSerializer, "list"),
+        ]:
+            legacy = legacy_class(serializer_class)
+            context = make_context(action)
+            old = timeit.timeit(lambda: legacy([], many=True, context=context).child.fields, number=number)
+            new = timeit.timeit(lambda: serializer_class([], many=True, context=context).child.fields, number=number)
+            self.report(f"{serializer_class.__name__}.{action}", old, new, number)
+
+        self.stdout.write(f"序列化一页{page}条数据:")
+        for serializer_class, action, data in [
+            (NewsSerializer, "list", make_news(page)),
+            (NewsSerializer, "retrieve", make_news(1)[0]),
+            (CategorySerializer, "list", make_category(page)),
+        ]:
+            legacy = legacy_class(serializer_class)
+            context = make_context(action)
+            many = isinstance(data, list)
+            old = timeit.timeit(lambda: legacy(data, many=many, context=context).data, number=number)
+            new = timeit.timeit(lambda: serializer_class(data, many=many, context=context).data, number=number)
+            self.report(f"{serializer_class.__name__}.{action}", old, new, number)
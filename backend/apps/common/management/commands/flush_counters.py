@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from user.models import user_counter
+
+
+class Command(BaseCommand):
+    help = "将redis中缓冲的计数增量批量写回数据库"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=int, default=0, help="循环执行间隔(秒)，为0时只执行一次")
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        while True:
+            for counter in (user_counter,):
+                self.stdout.write(f"{counter.name}: 写回{counter.flush()}条计数增量")
+
+            if not interval:
+                break
+            time.sleep(interval)
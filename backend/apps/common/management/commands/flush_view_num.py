@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from bbs.models import article_view_counter
+from special.models import column_view_counter
+
+
+class Command(BaseCommand):
+    help = "将redis中缓冲的浏览量与浏览记录批量写回数据库"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=int, default=0, help="循环执行间隔(秒)，为0时只执行一次")
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        while True:
+            for counter in (article_view_counter, column_view_counter):
+                updated, logged = counter.flush()
+                self.stdout.write(f"{counter.name}: 更新{updated}条浏览量，写入{logged}条浏览记录")
+
+            if not interval:
+                break
+            time.sleep(interval)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from common.feed import rebuild
+from search.models import Category
+
+
+class Command(BaseCommand):
+    help = "按文章、专栏、资讯重建社区推荐信息流"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk", type=int, default=500, help="每批读取的对象数")
+
+    def handle(self, *args, **options):
+        for name, category in (("article", Category.ARTICLE), ("column", Category.COLUMN), ("news", Category.NEWS)):
+            total = rebuild(category, options["chunk"])
+            self.stdout.write(f"{name}: 信息流共{total}条")
@@ -0,0 +1,106 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from redis.exceptions import RedisError
+
+from bbs import models as bbs
+from special import models as special
+from task.ledger import flush as flush_daily
+from task.models import Daily
+from backend.libs.function.get import getDate
+from backend.utils.Redis.leaderboard import PERIODS
+from user.models import User, Follow, user_counter, experience_board, up_board, fans_board
+
+
+def group_count(queryset, group, ids, *fields):
+    """
+    :return: {(分组字段值, *fields): 计数}
+    """
+    return {
+        tuple(row[:-1]): row[-1]
+        for row in queryset.filter(**{f"{group}__in": ids}).order_by().values(group, *fields).annotate(
+            n=Count("id")
+        ).values_list(group, *fields, "n")
+    }
+
+
+class Command(BaseCommand):
+    help = "按数据库重新计算经验、获赞、粉丝与板块发帖排行榜，分批写入暂存榜单后整体替换"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk", type=int, default=1000, help="每批处理的用户数")
+
+    def week_scores(self, ids, today, week_start):
+        """
+        :return: {榜单: {用户id: 本周增量}}
+        """
+        experience = {}
+        for record in Daily.objects.filter(user_id__in=ids, date__gte=getDate() - today.weekday()):
+            experience[record.user_id] = experience.get(record.user_id, 0) + sum(
+                getattr(record, task) * exp for task, (_, exp) in Daily.REWARD.items()
+            )
+
+        up = {}
+        for queryset, group in [
+            (bbs.UpAndDown.objects.filter(is_up=True, article__isnull=False), "article__author_id"),
+            (special.UpAndDown.objects.filter(is_up=True, column__isnull=False), "column__author_id"),
+        ]:
+            for (user_id,), n in group_count(queryset.filter(submit_time__gte=week_start), group, ids).items():
+                up[user_id] = up.get(user_id, 0) + n
+
+        fans = {
+            user_id: n for (user_id,), n in group_count(
+                Follow.objects.filter(create_time__gte=week_start), "followed_id", ids
+            ).items()
+        }
+        return {experience_board: experience, up_board: up, fans_board: fans}
+
+    def handle(self, *args, **options):
+        try:
+            user_counter.flush()
+            flush_daily()
+        except RedisError as e:
+            self.stderr.write(f"缓冲的计数未能写回:{str(e)}")
+            return
+
+        today = datetime.date.today()
+        week_start = datetime.datetime.combine(today - datetime.timedelta(days=today.weekday()), datetime.time.min)
+        categories = list(bbs.Category.objects.values_list("id", flat=True))
+        boards = [(board, None) for board in (experience_board, up_board, fans_board)]
+        boards += [(bbs.post_board, category_id) for category_id in categories]
+        for board, scope in boards:
+            for period in PERIODS:
+                board.reset_staging(period, scope)
+
+        last = 0
+        total = 0
+        while True:
+            users = list(User.objects.filter(id__gt=last, is_active=True).order_by("id").values_list(
+                "id", "experience", "up_num", "fans_num"
+            )[:options["chunk"]])
+            if not users:
+                break
+            ids = [i[0] for i in users]
+            last = ids[-1]
+
+            for i, board in enumerate((experience_board, up_board, fans_board), 1):
+                board.stage({user[0]: user[i] for user in users})
+            for board, scores in self.week_scores(ids, today, week_start).items():
+                board.stage(scores, "week")
+
+            articles = bbs.Article.objects.filter(is_active=True)
+            for period, queryset in [("all", articles), ("week", articles.filter(create_time__gte=week_start))]:
+                posts = {}
+                for (user_id, category_id), n in group_count(queryset, "author_id", ids, "category_id").items():
+                    posts.setdefault(category_id, {})[user_id] = n
+                for category_id, scores in posts.items():
+                    bbs.post_board.stage(scores, period, category_id)
+
+            total += len(ids)
+            self.stdout.write(f"已处理{total}名用户")
+
+        for board, scope in boards:
+            for period in PERIODS:
+                board.publish(period, scope)
+        self.stdout.write(f"已重建{len(boards)}个排行榜")
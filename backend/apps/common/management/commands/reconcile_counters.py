@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Case, Count, Q, Value, When
+from redis.exceptions import RedisError
+
+from bbs import models as bbs
+from special import models as special
+from issue import models as issue
+from vote import models as vote
+from user.models import User, Follow, user_counter
+
+
+def get_counters():
+    """
+    [(模型, 计数字段, [(来源查询, 分组字段), ...])]，计数为各来源按分组字段计数之和
+    """
+    bbs_comment = bbs.Comment.objects.filter(is_active=True)
+    special_comment = special.Comment.objects.filter(is_active=True)
+    return [
+        (bbs.Article, "comment_num", [
+            (bbs_comment.filter(Q(parent__isnull=True) | Q(parent__is_active=True)), "article_id"),
+        ]),
+        (bbs.Article, "up_num", [(bbs.UpAndDown.objects.filter(is_up=True), "article_id")]),
+        (bbs.Article, "down_num", [(bbs.UpAndDown.objects.filter(is_up=False), "article_id")]),
+        (bbs.Comment, "comment_num", [(bbs_comment, "parent_id")]),
+        (bbs.Comment, "up_num", [(bbs.UpAndDown.objects.filter(is_up=True), "comment_id")]),
+        (bbs.Comment, "down_num", [(bbs.UpAndDown.objects.filter(is_up=False), "comment_id")]),
+        (special.Column, "comment_num", [
+            (special_comment.filter(Q(parent__isnull=True) | Q(parent__is_active=True)), "column_id"),
+        ]),
+        (special.Column, "up_num", [(special.UpAndDown.objects.filter(is_up=True), "column_id")]),
+        (special.Column, "down_num", [(special.UpAndDown.objects.filter(is_up=False), "column_id")]),
+        (special.Comment, "comment_num", [(special_comment, "parent_id")]),
+        (special.Comment, "up_num", [(special.UpAndDown.objects.filter(is_up=True), "comment_id")]),
+        (special.Comment, "down_num", [(special.UpAndDown.objects.filter(is_up=False), "comment_id")]),
+        (issue.IssueComment, "comment_num", [(issue.IssueComment.objects.filter(is_active=True), "parent_id")]),
+        (issue.IssueComment, "up_num", [(issue.IssueCommentVote.objects.filter(is_up=True), "comment_id")]),
+        (issue.IssueComment, "down_num", [(issue.IssueCommentVote.objects.filter(is_up=False), "comment_id")]),
+        (vote.VoteChoice, "num", [(vote.ChoiceToUser.objects.all(), "choice_id")]),
+        (User, "fans_num", [(Follow.objects.all(), "followed_id")]),
+        (User, "attention_num", [(Follow.objects.all(), "follower_id")]),
+        (User, "up_num", [
+            (bbs.UpAndDown.objects.filter(is_up=True, article__isnull=False), "article__author_id"),
+            (special.UpAndDown.objects.filter(is_up=True, column__isnull=False), "column__author_id"),
+        ]),
+    ]
+
+
+class Command(BaseCommand):
+    help = "按来源表重新计算冗余计数字段，分批以聚合查询计算并只更新不一致的行"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk", type=int, default=1000, help="每批处理的行数")
+
+    def reconcile(self, model, field, sources, chunk):
+        fixed = 0
+        last = 0
+        while True:
+            current = dict(model.objects.filter(id__gt=last).order_by("id").values_list("id", field)[:chunk])
+            if not current:
+                return fixed
+            ids = list(current)
+            last = ids[-1]
+
+            counts = {}
+            for queryset, group in sources:
+                for k, n in queryset.filter(**{f"{group}__in": ids}).order_by().values(group).annotate(
+                        n=Count("id")).values_list(group, "n"):
+                    counts[k] = counts.get(k, 0) + n
+
+            diff = {i: counts.get(i, 0) for i, v in current.items() if v != counts.get(i, 0)}
+            if diff:
+                model.objects.filter(id__in=list(diff)).update(**{
+                    field: Case(*[When(id=k, then=Value(v)) for k, v in diff.items()])
+                })
+            fixed += len(diff)
+
+    def handle(self, *args, **options):
+        try:
+            user_counter.flush()
+        except RedisError as e:
+            self.stderr.write(f"缓冲的计数未能写回:{str(e)}")
+
+        for model, field, sources in get_counters():
+            fixed = self.reconcile(model, field, sources, options["chunk"])
+            self.stdout.write(f"{model._meta.label}.{field}: 修正{fixed}行")
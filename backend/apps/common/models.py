@@ -1,4 +1,5 @@
 from backend.libs.wraps.models import APIModel, models
+from search.models import Category
 
 
 class Banner(APIModel):
@@ -20,3 +21,18 @@ class Sign(APIModel):
 class ReceiveRecord(APIModel):
     address = models.ForeignKey(to="Sign", on_delete=models.DO_NOTHING)
     data = models.DateTimeField(auto_now_add=True, verbose_name="日期")
+
+
+class FeedItem(APIModel):
+    STATUS_CHOICES = [
+        (Category.ARTICLE, "论坛文章"),
+        (Category.COLUMN, "专栏帖子"),
+        (Category.NEWS, "资讯"),
+    ]
+    category = models.IntegerField(choices=STATUS_CHOICES, verbose_name="内容类别")
+    object_id = models.IntegerField(verbose_name="对应对象id")
+    update_time = models.DateTimeField(verbose_name="内容最后更新时间")
+
+    class Meta:
+        unique_together = ("category", "object_id")
+        index_together = ("update_time", "id")
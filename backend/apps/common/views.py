@@ -15,10 +15,12 @@ from backend.libs.constants import response_code
 from backend.libs.wraps.response import APIResponse
 from backend.libs.wraps.authenticators import UserInfoAuthentication
 from backend.libs.wraps.logger import log
-from backend.libs.scripts.sql import recommend_sql
-from bbs.serializers import ArticleSerializer, Article
-from special.serializers import ColumnSerializer, Column
-from information.serializers import NewsSerializer, News
+from backend.libs.wraps.views import AsyncReadMixin, CursorPag, derive_queryset_options
+from bbs.serializers import ArticleSerializer
+from special.serializers import ColumnSerializer
+from information.serializers import NewsSerializer
+from search.models import Category as SearchCategory
+from search.index import SOURCES, get_model
 from backend.privacy.keys import ETH
 from backend.libs.contract.abi import predictionMarket
 
@@ -108,51 +110,52 @@ class ImageView(ViewSet):
         return APIResponse(response_code.SUCCESS_POST_ISSUE_IMAGE, "成功", {"data": image})
 
 
-class RecommendView(ViewSet):
+class RecommendView(AsyncReadMixin, ViewSet):
+    serializers = {
+        SearchCategory.ARTICLE: ArticleSerializer,
+        SearchCategory.COLUMN: ColumnSerializer,
+        SearchCategory.NEWS: NewsSerializer,
+    }
+
+    def hydrate(self, items, context):
+        """
+        按内容类别分批加载并序列化，返回与items顺序一致的[{"type": 类别, "content": 数据}]
+        """
+        object_ids = {}
+        for item in items:
+            object_ids.setdefault(item.category, []).append(item.object_id)
+
+        data = {}
+        for category, ids in object_ids.items():
+            serializer_class = self.serializers[category]
+            model = get_model(category)
+            select, prefetch, defer = derive_queryset_options(serializer_class(context=context), model)
+            queryset = model.objects.filter(id__in=ids, author__is_active=True, **SOURCES[category][1]).select_related(
+                *select
+            ).prefetch_related(*prefetch).defer(*defer)
+            serializer = serializer_class(list(queryset), many=True, context=context)
+            for instance, row in zip(serializer.instance, serializer.data):
+                data[(category, instance.id)] = row
+
+        return [
+            {"type": item.category, "content": data[(item.category, item.object_id)]}
+            for item in items if (item.category, item.object_id) in data
+        ]
+
     @action(["GET"], False)
     def community(self, request):
-        offset = int(request.query_params.get("offset", 0))
-        data = {
-            "article": [],
-            "column": [],
-            "news": []
-        }
-
-        for i in Article.objects.raw(recommend_sql % offset):
-            if i.recommend_type == 1:
-                data["article"].append(i.id)
-            if i.recommend_type == 2:
-                data["column"].append(i.id)
-            if i.recommend_type == 3:
-                data["news"].append(i.id)
-        total = len(data["article"]) + len(data["column"]) + len(data["news"])
-
+        """
+        社区推荐，文章、专栏、资讯按最后更新时间合并排序，携带cursor参数时按游标分页
+        """
         class view:
             action = "list"
 
-        article = ArticleSerializer(
-            Article.objects.filter(author__is_active=True, id__in=data["article"]),
-            many=True,
-            context={"view": view, "request": request}
-        ).data
-        column = ColumnSerializer(
-            Column.objects.filter(author__is_active=True, id__in=data["column"]),
-            many=True,
-            context={"view": view, "request": request}
-        ).data
-        news = NewsSerializer(
-            News.objects.filter(author__is_active=True, id__in=data["news"]),
-            many=True,
-            context={"view": view, "request": request}
-        ).data
-        return APIResponse(code=response_code.SUCCESS_GET_COMMUNITY_RECOMMEND, result={
-            "content": {
-                "article": article,
-                "column": column,
-                "news": news,
-            },
-            "end": total != 10
-        })
+        pag = CursorPag()
+        items = pag.paginate_queryset(FeedItem.objects.order_by("-update_time"), request, view=self)
+        return pag.get_paginated_response([
+            response_code.SUCCESS_GET_COMMUNITY_RECOMMEND,
+            self.hydrate(items, {"view": view, "request": request}),
+        ])
 
 
 addr = web3.toChecksumAddress("0xAecf7e7eE830416F0541278D474d61A54C4905E2")
@@ -1,8 +1,8 @@
 from .models import *
-from backend.libs.wraps.serializers import APIModelSerializer
+from backend.libs.wraps.serializers import APIModelSerializer, ActionSerializerMixin
 
 
-class NewsSerializer(APIModelSerializer):
+class NewsSerializer(ActionSerializerMixin, APIModelSerializer):
     class Meta:
         model = News
         fields = [
@@ -17,11 +17,9 @@ class NewsSerializer(APIModelSerializer):
             "is_draft",
         ]
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-
-        action = self.context["view"].action
-        self.context["action"] = action
+    @classmethod
+    def get_remove_fields(cls, context):
+        action = context["view"].action
         remove = []
         if action == "list":
             remove = [
@@ -30,14 +28,14 @@ class NewsSerializer(APIModelSerializer):
                 "raw_content",
                 "update_time",
             ]
-            if not self.context["request"].query_params.get("self"):
+            if not context["request"].query_params.get("self"):
                 remove.append("is_draft")
         if action == "retrieve":
             remove = [
                 "author",
                 "is_draft",
             ]
-            if not self.context["request"].query_params.get("raw"):
+            if not context["request"].query_params.get("raw"):
                 remove += ["description", "raw_content"]
         if action == "create":
             remove = [
@@ -51,8 +49,7 @@ class NewsSerializer(APIModelSerializer):
                 "create_time",
                 "update_time",
             ]
-        for i in remove:
-            self.fields.pop(i)
+        return remove
 
     def create(self, validated_data):
         validated_data["author_id"] = self.context["request"].user.id
@@ -2,6 +2,9 @@ from .serializers import *
 from backend.libs.constants import response_code
 from backend.libs.wraps.views import APIModelViewSet
 from backend.libs.wraps.authenticators import PermissionAuthentication, UserInfoAuthentication
+from search.models import Category as SearchCategory
+from search.index import update_document, remove_document
+from common import feed
 
 
 class NewsView(APIModelViewSet):
@@ -28,3 +31,15 @@ class NewsView(APIModelViewSet):
             return self.queryset.filter(is_active=True, author=self.request.user).order_by("-create_time")
 
         return self.queryset.filter(is_active=True, is_draft=False).order_by("-create_time")
+
+    def after_create(self, instance, request, *args, **kwargs):
+        update_document(SearchCategory.NEWS, instance)
+        feed.update_item(SearchCategory.NEWS, instance)
+
+    def after_update(self, instance, request, *args, **kwargs):
+        update_document(SearchCategory.NEWS, instance)
+        feed.update_item(SearchCategory.NEWS, instance)
+
+    def after_destroy(self, instance, request, *args, **kwargs):
+        remove_document(SearchCategory.NEWS, instance.id)
+        feed.remove_item(SearchCategory.NEWS, instance.id)
@@ -1,4 +1,5 @@
 from backend.libs.wraps.models import APIModel, models
+from backend.utils.Redis import Counter
 
 
 class Issue(APIModel):
@@ -28,3 +29,6 @@ class IssueCommentVote(APIModel):
     comment = models.ForeignKey(to="IssueComment", on_delete=models.DO_NOTHING, null=True, verbose_name="对应评论")
     is_up = models.BooleanField(verbose_name="是否点赞")
     submit_time = models.DateTimeField(auto_now=True, verbose_name="点赞点踩时间")
+
+
+comment_counter = Counter("issue_comment", IssueComment)
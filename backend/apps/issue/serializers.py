@@ -1,13 +1,10 @@
-import re
-
-from lxml import etree
-from django.db.models import F
-
 from .models import *
 from user.models import User
+from task.ledger import add_task
 from backend.libs.wraps.serializers import EmptySerializer, serializers, APIModelSerializer, OtherUserSerializer, \
-    SimpleAuthorSerializer
+    SimpleAuthorSerializer, VoteStateField, get_top_children
 from backend.libs.wraps.errors import SerializerError
+from backend.libs.function.content import RichContent
 from backend.libs.constants import response_code
 
 
@@ -16,19 +13,7 @@ class ChildrenCommentSerializer(APIModelSerializer):
     address = serializers.CharField(write_only=True)
     parent_id = serializers.IntegerField(write_only=True)
     target_id = serializers.IntegerField(allow_null=True, default=None)
-    is_up = serializers.SerializerMethodField(read_only=True)
-
-    def get_is_up(self, instance):
-        if request := self.context.get("request"):
-            author_id = request.user.id
-            if not author_id:
-                return None
-            comment_id = instance.id
-            obj = IssueCommentVote.objects.filter(comment_id=comment_id, author_id=author_id).first()
-            if not obj:
-                return None
-
-            return obj.is_up
+    is_up = VoteStateField(IssueCommentVote, "comment")
 
     class Meta:
         model = IssueComment
@@ -50,8 +35,10 @@ class ChildrenCommentSerializer(APIModelSerializer):
         if validated_data.get("target_id"):
             validated_data["content"] = self._add_mention_prefix(validated_data["content"], validated_data)
         validated_data["issue"] = Issue.objects.get(address=validated_data.pop("address"))
-        validated_data["content"] = self._add_mention(validated_data["content"])
-        validated_data["description"] = self._get_description(validated_data["content"])
+        content = RichContent(validated_data["content"])
+        self.context["mention"] = content.mention
+        validated_data["content"] = content.html
+        validated_data["description"] = content.comment_description()
         validated_data["author"] = self.context["request"].user
 
         return super().create(validated_data)
@@ -75,67 +62,15 @@ class ChildrenCommentSerializer(APIModelSerializer):
         ])
         return content
 
-    def _get_description(self, content):
-        text = etree.HTML(content).xpath("string(.)")
-        if len(text) <= 40:
-            html_text = f'<span>{text}</span>'
-        else:
-            html_text = f'<span>{text[:40]}...</span>'
-
-        img_urls = re.findall('<img src="(.*?)" .*?/>', content)
-
-        if not img_urls:
-            return html_text
-
-        return html_text + "<span>[图片]</span>"
-
-    def _add_mention(self, html):
-        self.context["mention"] = []
-        tree = etree.HTML(html)
-        for i in tree.xpath("//span[@data-w-e-type='mention']"):
-            uid = i.xpath("@data-info")[0]
-            username = i.xpath("text()")[0].replace("@", "")
-            user = User.objects.filter(id=uid, username=username)
-            if user:
-                self.context["mention"].append(user.first())
-                i.set("style", "color: rgb(54, 88, 226);")
-                i.set("uid", uid)
-
-        return etree.tostring(tree).decode("utf-8")[12:-14]
-
 
 class IssueCommentSerializer(APIModelSerializer):
     author = OtherUserSerializer(read_only=True)
     children_comment = serializers.SerializerMethodField(read_only=True)
-    is_up = serializers.SerializerMethodField(read_only=True)
-
-    def get_is_up(self, instance):
-        author_id = self.context["request"].user.id
-        if not author_id:
-            return None
-
-        comment_id = instance.id
-        obj = IssueCommentVote.objects.filter(comment_id=comment_id, author_id=author_id).first()
-        if not obj:
-            return None
-
-        return obj.is_up
+    is_up = VoteStateField(IssueCommentVote, "comment")
 
     def get_children_comment(self, instance: IssueComment):
-        author_id = self.context["request"].user.id
-        if children := instance.parent_comments.all().filter(is_active=True).order_by("-up_num")[:2]:
-            data = ChildrenCommentSerializer(children, many=True, context=self.context).data
-            for i in data:
-                if not author_id:
-                    i["is_up"] = None
-                else:
-                    comment_id = i["id"]
-                    obj = IssueCommentVote.objects.filter(comment_id=comment_id, author_id=author_id).first()
-                    if not obj:
-                        i["is_up"] = None
-                    else:
-                        i["is_up"] = obj.is_up
-            return data
+        if children := get_top_children(self, instance, IssueComment, (IssueCommentVote, "comment")):
+            return ChildrenCommentSerializer(children, many=True, context=self.context).data
         else:
             return []
 
@@ -156,40 +91,14 @@ class IssueCommentSerializer(APIModelSerializer):
         ]
 
     def create(self, validated_data):
-        validated_data["content"] = self._add_mention(validated_data["content"])
+        content = RichContent(validated_data["content"])
+        self.context["mention"] = content.mention
+        validated_data["content"] = content.html
         validated_data["author"] = self.context["request"].user
         validated_data["issue"] = Issue.objects.get(address=self.context["kwargs"].get("address"))
-        validated_data["description"] = self._get_description(validated_data["content"])
+        validated_data["description"] = content.comment_description()
         return super().create(validated_data)
 
-    def _get_description(self, content):
-        text = etree.HTML(content).xpath("string(.)")
-        if len(text) <= 40:
-            html_text = f'<span>{text}</span>'
-        else:
-            html_text = f'<span>{text[:40]}...</span>'
-
-        img_urls = re.findall('<img src="(.*?)" .*?/>', content)
-
-        if not img_urls:
-            return html_text
-
-        return html_text + "<span>[图片]</span>"
-
-    def _add_mention(self, html):
-        self.context["mention"] = []
-        tree = etree.HTML(html)
-        for i in tree.xpath("//span[@data-w-e-type='mention']"):
-            uid = i.xpath("@data-info")[0]
-            username = i.xpath("text()")[0].replace("@", "")
-            user = User.objects.filter(id=uid, username=username)
-            if user:
-                self.context["mention"].append(user.first())
-                i.set("style", "color: rgb(54, 88, 226);")
-                i.set("uid", uid)
-
-        return etree.tostring(tree).decode("utf-8")[12:-14]
-
 
 class VoteCommentSerializer(EmptySerializer):
     comment_id = serializers.IntegerField()
@@ -205,8 +114,8 @@ class VoteCommentSerializer(EmptySerializer):
 
         if not instance:
             if is_up:
-                User.objects.get(id=user_id).daily.add("like")
-                IssueComment.objects.get(id=comment_id).author.daily.add("comment_liked")
+                add_task(user_id, "like")
+                add_task(IssueComment.objects.get(id=comment_id).author_id, "comment_liked")
 
             instance = IssueCommentVote.objects.create(comment_id=comment_id, is_up=is_up, author_id=user_id)
             self._update_num(comment_id, is_up, 1 - is_up)
@@ -223,7 +132,7 @@ class VoteCommentSerializer(EmptySerializer):
 
     @staticmethod
     def _update_num(comment_id, up, down):
-        IssueComment.objects.filter(id=comment_id).update(up_num=F("up_num") + up, down_num=F("down_num") + down)
+        comment_counter.add(comment_id, up_num=up, down_num=down)
 
 
 class SimpleIssueSerializer(APIModelSerializer):
@@ -248,22 +157,10 @@ class SimpleCommentSerializer(APIModelSerializer):
 
 class SelfCommentSerializer(APIModelSerializer):
     issue = SimpleIssueSerializer()
-    is_up = serializers.SerializerMethodField(read_only=True)
+    is_up = VoteStateField(IssueCommentVote, "comment")
     target = SimpleCommentSerializer()
     parent = SimpleCommentSerializer()
 
-    def get_is_up(self, instance):
-        author_id = self.context["request"].user.id
-        if not author_id:
-            return None
-
-        comment_id = instance.id
-        obj = IssueCommentVote.objects.filter(comment_id=comment_id, author_id=author_id).first()
-        if not obj:
-            return None
-
-        return obj.is_up
-
     class Meta:
         model = IssueComment
         fields = [
@@ -57,20 +57,7 @@ class IssueCommentView(APIModelViewSet):
         receiver = comment.author
         sender = request.user
         if receiver != sender and receiver.message_setting.like:
-            like = Like.objects.filter(origin=Origin.ISSUE_COMMENT, bbs_comment=comment, sender=sender)
-            if request.data.get("is_up") and not like:
-                Like.objects.create(
-                    origin=Origin.ISSUE_COMMENT,
-                    bbs_comment_id=pk,
-                    sender=sender,
-                    receiver=receiver,
-                    is_viewed=receiver.is_viewed(sender, "like")
-                )
-            else:
-                like = like.first()
-                like.time = datetime.now()
-                like.is_active = request.data.get("is_up") and not like.is_active
-                like.save()
+            Like.vote(Origin.ISSUE_COMMENT, comment, sender, receiver, request.data.get("is_up"))
 
         return APIResponse(response_code.SUCCESS_VOTE_COMMENT, "评价成功")
 
@@ -101,8 +88,7 @@ class IssueChildrenCommentView(APIModelViewSet):
         request.data["parent_id"] = kwargs.pop("parent_id", None)
 
     def after_create(self, instance: IssueComment, request, *args, **kwargs):
-        instance.parent.comment_num += 1
-        instance.parent.save()
+        comment_counter.add(instance.parent_id, comment_num=1)
 
         receiver = instance.target.author if instance.target else instance.parent.author
         sender = request.user
@@ -117,8 +103,7 @@ class IssueChildrenCommentView(APIModelViewSet):
             )
 
     def after_destroy(self, instance: IssueComment, request, *args, **kwargs):
-        instance.parent.comment_num -= 1
-        instance.parent.save()
+        comment_counter.add(instance.parent_id, comment_num=-1)
 
         Dynamic.handle_delete(instance, Origin.ISSUE_COMMENT)
         Like.handle_delete(instance, Origin.ISSUE_COMMENT)
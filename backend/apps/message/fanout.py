@@ -0,0 +1,93 @@
+from django.db import transaction
+
+from .models import Dynamic, FanoutJob, MessageSetting, ORIGIN_FIELD
+from user.models import Follow, BlackList
+from backend.libs.wraps.logger import log
+
+CHUNK = 1000
+
+MAX_RETRY = 5
+
+
+def enqueue(sender, origin, instance):
+    """
+    创建动态推送任务，由run_fanout命令在后台推送给关注者
+    """
+    return FanoutJob.objects.create(sender=sender, origin=origin, **{ORIGIN_FIELD[origin]: instance})
+
+
+def get_followers(job):
+    return Follow.objects.filter(
+        followed_id=job.sender_id,
+    ).exclude(
+        follower__message_setting__dynamic=MessageSetting.FORBID,
+    ).exclude(
+        follower_id__in=BlackList.objects.filter(blacked_id=job.sender_id).values("blacker_id")
+    )
+
+
+def run_chunk(job_id, chunk=CHUNK):
+    """
+    推送一批关注者，推送进度与动态写入在同一事务中，重试时从上次进度继续
+    返回任务是否已完成
+    """
+    with transaction.atomic():
+        job = FanoutJob.objects.select_for_update().get(id=job_id)
+        if job.status in FanoutJob.FINISHED:
+            return True
+
+        followers = get_followers(job)
+        if job.status == FanoutJob.PENDING:
+            job.total = followers.count()
+            job.status = FanoutJob.RUNNING
+
+        batch = list(followers.filter(id__gt=job.cursor).order_by("id").values_list(
+            "id",
+            "follower_id",
+            "follower__message_setting__dynamic"
+        )[:chunk])
+
+        if not batch:
+            job.status = FanoutJob.DONE
+            job.save()
+            return True
+
+        field = f"{ORIGIN_FIELD[job.origin]}_id"
+        Dynamic.objects.bulk_create(map(lambda x: Dynamic(
+            sender_id=job.sender_id,
+            receiver_id=x[1],
+            origin=job.origin,
+            is_viewed=x[2] == MessageSetting.IGNORE,
+            **{field: getattr(job, field)}
+        ), batch))
+
+        job.cursor = batch[-1][0]
+        job.done += len(batch)
+        job.save()
+        return False
+
+
+def run(job_id, chunk=CHUNK):
+    try:
+        while not run_chunk(job_id, chunk):
+            pass
+    except Exception as e:
+        log.error(f"动态推送任务{job_id}失败:{str(e)}")
+        job = FanoutJob.objects.get(id=job_id)
+        if job.status in FanoutJob.FINISHED:
+            return
+        job.retry += 1
+        if job.retry >= MAX_RETRY:
+            job.status = FanoutJob.FAILED
+        job.save()
+
+
+def run_pending(limit=100, chunk=CHUNK):
+    jobs = FanoutJob.objects.filter(
+        status__in=[FanoutJob.PENDING, FanoutJob.RUNNING]
+    ).order_by("id").values_list("id", flat=True)[:limit]
+
+    jobs = list(jobs)
+    for job_id in jobs:
+        run(job_id, chunk)
+    return len(jobs)
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max
+from django.db.models.functions import Greatest, Least
+
+from message.models import Conversation, Private
+
+
+class Command(BaseCommand):
+    help = "按私信记录重建私信会话表"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk", type=int, default=1000, help="每批写入的会话数")
+
+    def handle(self, *args, **options):
+        chunk = options["chunk"]
+        queryset = Private.objects.filter(is_active=True).annotate(
+            low=Least("sender_id", "receiver_id"),
+            high=Greatest("sender_id", "receiver_id"),
+        )
+
+        last = {
+            (i["low"], i["high"]): i["last_id"]
+            for i in queryset.values("low", "high").annotate(last_id=Max("id"))
+        }
+        unread = {
+            (i["low"], i["high"], i["receiver_id"]): i["n"]
+            for i in queryset.filter(is_viewed=False).values("low", "high", "receiver_id").annotate(n=Count("id"))
+        }
+
+        pairs = list(last.items())
+        with transaction.atomic():
+            Conversation.objects.all().delete()
+            for start in range(0, len(pairs), chunk):
+                batch = pairs[start:start + chunk]
+                time = dict(Private.objects.filter(id__in=[i[1] for i in batch]).values_list("id", "time"))
+                Conversation.objects.bulk_create([Conversation(
+                    low_user_id=low,
+                    high_user_id=high,
+                    last_message_id=last_id,
+                    last_time=time[last_id],
+                    low_unread=unread.get((low, high, low), 0),
+                    high_unread=unread.get((low, high, high), 0),
+                ) for (low, high), last_id in batch])
+
+        self.stdout.write(f"已重建{len(pairs)}个私信会话")
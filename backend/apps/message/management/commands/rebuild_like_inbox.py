@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Q
+
+from message.models import Like, LikeInbox, ORIGIN_FIELD
+
+
+class Command(BaseCommand):
+    help = "按点赞消息重建点赞汇总表"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk", type=int, default=1000, help="每批写入的汇总数")
+
+    def handle(self, *args, **options):
+        chunk = options["chunk"]
+        total = 0
+        with transaction.atomic():
+            LikeInbox.objects.all().delete()
+            for origin, field in ORIGIN_FIELD.items():
+                groups = list(Like.objects.filter(
+                    origin=origin,
+                    is_active=True,
+                    **{f"{field}__isnull": False}
+                ).values("receiver_id", f"{field}_id").annotate(
+                    total=Count("id"),
+                    new=Count("id", filter=Q(is_viewed=False)),
+                    last_id=Max("id"),
+                    last_time=Max("time"),
+                ))
+
+                for start in range(0, len(groups), chunk):
+                    batch = groups[start:start + chunk]
+                    last = Like.objects.in_bulk([i["last_id"] for i in batch])
+                    LikeInbox.objects.bulk_create([LikeInbox(
+                        receiver_id=i["receiver_id"],
+                        origin=origin,
+                        object_id=i[f"{field}_id"],
+                        sender_id=last[i["last_id"]].sender_id,
+                        total=i["total"],
+                        new=i["new"],
+                        last_time=i["last_time"],
+                        **{f"{field}_id": i[f"{field}_id"]}
+                    ) for i in batch])
+                total += len(groups)
+
+        self.stdout.write(f"已重建{total}条点赞汇总")
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from user.models import User
+from message.unread import count_unread
+from backend.utils.Redis.unread import store_unread
+
+
+class Command(BaseCommand):
+    help = "按数据库重新统计并校正redis中的未读消息计数"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk", type=int, default=500, help="每批校正的用户数")
+        parser.add_argument("--interval", type=int, default=0, help="循环执行间隔(秒)，为0时只执行一次")
+
+    def handle(self, *args, **options):
+        chunk = options["chunk"]
+        interval = options["interval"]
+        while True:
+            total = 0
+            last = 0
+            while user_ids := list(
+                    User.objects.filter(id__gt=last, is_active=True).order_by("id").values_list("id", flat=True)[:chunk]
+            ):
+                store_unread(count_unread(user_ids))
+                total += len(user_ids)
+                last = user_ids[-1]
+            self.stdout.write(f"已校正{total}个用户的未读消息计数")
+
+            if not interval:
+                break
+            time.sleep(interval)
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from message.fanout import run_pending
+
+
+class Command(BaseCommand):
+    help = "执行待处理的动态推送任务"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=int, default=0, help="循环执行间隔(秒)，为0时只执行一次")
+        parser.add_argument("--chunk", type=int, default=1000, help="每批推送的关注者数")
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        while True:
+            count = run_pending(chunk=options["chunk"])
+            if count:
+                self.stdout.write(f"已处理{count}个推送任务")
+
+            if not interval:
+                break
+            time.sleep(interval)
@@ -1,7 +1,11 @@
 from backend.libs.wraps.models import APIModel, models
+from backend.utils.Redis.unread import incr_unread
+import datetime
+from collections import Counter
 from functools import partial
 
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Count, F, Q
 
 UserField = partial(models.ForeignKey, to="user.User", on_delete=models.DO_NOTHING)
 
@@ -14,14 +18,64 @@ class Origin:
     ISSUE_COMMENT = 4
 
 
+ORIGIN_FIELD = {
+    Origin.BBS_ARTICLE: "bbs_article",
+    Origin.BBS_COMMENT: "bbs_comment",
+    Origin.SPECIAL_COLUMN: "special_column",
+    Origin.SPECIAL_COMMENT: "special_comment",
+    Origin.ISSUE_COMMENT: "issue_comment",
+}
+
+
+class MessageManager(models.Manager):
+    """
+    新建消息时同步累加接收者的未读计数，事务回滚时不计数
+    """
+
+    def notify(self, messages):
+        counts = Counter(i.receiver_id for i in messages if i.is_active and not i.is_viewed)
+        if counts:
+            transaction.on_commit(lambda: incr_unread(self.model.unread_category(), counts))
+
+    def create(self, **kwargs):
+        instance = super().create(**kwargs)
+        self.notify([instance])
+        return instance
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        self.notify(objs)
+        return objs
+
+
 class AbstractMessage(APIModel):
     is_viewed = models.BooleanField(default=False, verbose_name="是否已读")
     is_active = models.BooleanField(default=True, verbose_name="是否有效")
     time = models.DateTimeField(auto_now_add=True, verbose_name="消息时间")
 
+    objects = MessageManager()
+
     class Meta:
         abstract = True
 
+    @classmethod
+    def unread_category(cls):
+        return cls._meta.model_name
+
+    @classmethod
+    def deactivate(cls, queryset):
+        """
+        批量失效消息，并扣减其中未读消息的计数
+        """
+        queryset = list(queryset)
+        for i in queryset:
+            i.is_active = False
+        cls.objects.bulk_update(queryset, ["is_active"])
+
+        counts = Counter(i.receiver_id for i in queryset if not i.is_viewed)
+        if counts:
+            transaction.on_commit(lambda: incr_unread(cls.unread_category(), {k: -v for k, v in counts.items()}))
+
 
 class AbstractOrigin(APIModel):
     STATUS_CHOICES = [
@@ -99,9 +153,7 @@ class Reply(AbstractMessage, AbstractOrigin):
         else:
             return
 
-        for i in queryset:
-            i.is_active = False
-        cls.objects.bulk_update(queryset, ["is_active"])
+        cls.deactivate(queryset)
 
 
 class At(AbstractMessage, AbstractOrigin):
@@ -173,15 +225,51 @@ class At(AbstractMessage, AbstractOrigin):
         else:
             return
 
-        for i in queryset:
-            i.is_active = False
-        cls.objects.bulk_update(queryset, ["is_active"])
+        cls.deactivate(queryset)
 
 
 class Like(AbstractMessage, AbstractOrigin):
     sender = UserField(verbose_name="发信人", related_name="my_like")
     receiver = UserField(verbose_name="收信人", related_name="like_me")
 
+    @classmethod
+    def vote(cls, origin, instance, sender, receiver, is_up):
+        """
+        点赞时新建或切换点赞消息，并同步点赞汇总
+        """
+        field = ORIGIN_FIELD[origin]
+        with transaction.atomic():
+            like = cls.objects.select_for_update().filter(origin=origin, sender=sender, **{field: instance}).first()
+            if like is None:
+                if is_up:
+                    like = cls.objects.create(
+                        origin=origin,
+                        sender=sender,
+                        receiver=receiver,
+                        is_viewed=receiver.is_viewed(sender, "like"),
+                        **{field: instance}
+                    )
+                    LikeInbox.push(like, 1)
+                return
+
+            was_active = like.is_active
+            like.time = datetime.datetime.now()
+            like.is_active = bool(is_up) and not like.is_active
+            like.save()
+            if like.is_active == was_active:
+                return
+
+            delta = 1 if like.is_active else -1
+            LikeInbox.push(like, delta)
+            if not like.is_viewed:
+                transaction.on_commit(lambda: incr_unread(cls.unread_category(), {like.receiver_id: delta}))
+
+    @classmethod
+    def deactivate(cls, queryset):
+        queryset = list(queryset)
+        super().deactivate(queryset)
+        LikeInbox.discount(queryset)
+
     @classmethod
     def handle_delete(cls, instance, category):
         if category == Origin.BBS_ARTICLE:
@@ -259,9 +347,65 @@ class Like(AbstractMessage, AbstractOrigin):
         else:
             return
 
-        for i in queryset:
-            i.is_active = False
-        cls.objects.bulk_update(queryset, ["is_active"])
+        cls.deactivate(queryset)
+
+
+class LikeInbox(AbstractOrigin):
+    """
+    点赞消息汇总，每个接收者的每个被赞对象一行，随点赞增量更新
+    """
+    receiver = UserField(verbose_name="收信人", related_name="like_inbox")
+    sender = UserField(verbose_name="最近点赞人", related_name="+")
+    object_id = models.IntegerField(verbose_name="被赞对象id")
+    total = models.IntegerField(default=0, verbose_name="点赞数")
+    new = models.IntegerField(default=0, verbose_name="未读点赞数")
+    last_time = models.DateTimeField(verbose_name="最近点赞时间")
+
+    class Meta:
+        unique_together = ("receiver", "origin", "object_id")
+        index_together = ("receiver", "last_time", "id")
+
+    @classmethod
+    def push(cls, like, delta):
+        """
+        点赞生效(delta=1)或取消(delta=-1)，需在与点赞相同的事务中调用
+        """
+        field = f"{ORIGIN_FIELD[like.origin]}_id"
+        object_id = getattr(like, field)
+        inbox, _ = cls.objects.select_for_update().get_or_create(
+            receiver_id=like.receiver_id,
+            origin=like.origin,
+            object_id=object_id,
+            defaults={
+                field: object_id,
+                "sender_id": like.sender_id,
+                "last_time": like.time,
+            }
+        )
+        data = {
+            "total": F("total") + delta,
+            "new": F("new") + (0 if like.is_viewed else delta),
+        }
+        if delta > 0:
+            data.update(sender_id=like.sender_id, last_time=like.time)
+        cls.objects.filter(id=inbox.id).update(**data)
+        cls.objects.filter(id=inbox.id, total__lte=0).delete()
+
+    @classmethod
+    def discount(cls, likes):
+        """
+        扣减一批已失效点赞
+        """
+        counts = {}
+        for like in likes:
+            key = (like.receiver_id, like.origin, getattr(like, f"{ORIGIN_FIELD[like.origin]}_id"))
+            total, new = counts.get(key, (0, 0))
+            counts[key] = (total + 1, new + (0 if like.is_viewed else 1))
+
+        for (receiver_id, origin, object_id), (total, new) in counts.items():
+            queryset = cls.objects.filter(receiver_id=receiver_id, origin=origin, object_id=object_id)
+            queryset.update(total=F("total") - total, new=F("new") - new)
+            queryset.filter(total__lte=0).delete()
 
 
 class System(AbstractMessage):
@@ -275,12 +419,87 @@ class Private(AbstractMessage):
     content = models.CharField(max_length=256, verbose_name="消息详情")
 
 
+class Conversation(APIModel):
+    """
+    私信会话，按(较小用户id, 较大用户id)唯一，记录最后一条消息与双方未读数
+    """
+    low_user = UserField(verbose_name="id较小的用户", related_name="conversation_low")
+    high_user = UserField(verbose_name="id较大的用户", related_name="conversation_high")
+    last_message = models.ForeignKey(to="Private", null=True, default=None, on_delete=models.DO_NOTHING)
+    last_time = models.DateTimeField(verbose_name="最后消息时间")
+    low_unread = models.IntegerField(default=0, verbose_name="id较小的用户未读数")
+    high_unread = models.IntegerField(default=0, verbose_name="id较大的用户未读数")
+
+    class Meta:
+        unique_together = ("low_user", "high_user")
+        index_together = [("low_user", "last_time", "id"), ("high_user", "last_time", "id")]
+
+    @staticmethod
+    def pair(user_a, user_b):
+        return tuple(sorted((int(user_a), int(user_b))))
+
+    @classmethod
+    def push(cls, message):
+        """
+        新私信写入会话，需在与私信相同的事务中调用
+        """
+        low, high = cls.pair(message.sender_id, message.receiver_id)
+        conversation, _ = cls.objects.select_for_update().get_or_create(
+            low_user_id=low,
+            high_user_id=high,
+            defaults={"last_time": message.time}
+        )
+        side = "low_unread" if int(message.receiver_id) == low else "high_unread"
+        cls.objects.filter(id=conversation.id).update(**{
+            "last_message": message,
+            "last_time": message.time,
+            side: F(side) + (0 if message.is_viewed else 1),
+        })
+
+    @classmethod
+    def mark_viewed(cls, user_a, user_b):
+        low, high = cls.pair(user_a, user_b)
+        cls.objects.filter(low_user_id=low, high_user_id=high).update(low_unread=0, high_unread=0)
+
+    @classmethod
+    def refresh(cls, user_a, user_b):
+        """
+        按私信记录重新计算一个会话
+        """
+        low, high = cls.pair(user_a, user_b)
+        queryset = Private.objects.filter(
+            Q(sender_id=low, receiver_id=high) | Q(sender_id=high, receiver_id=low),
+            is_active=True
+        )
+        with transaction.atomic():
+            last = queryset.order_by("-id").first()
+            if last is None:
+                cls.objects.filter(low_user_id=low, high_user_id=high).delete()
+                return
+
+            unread = dict(queryset.filter(is_viewed=False).values_list("receiver_id").annotate(n=Count("id")))
+            cls.objects.update_or_create(low_user_id=low, high_user_id=high, defaults={
+                "last_message": last,
+                "last_time": last.time,
+                "low_unread": unread.get(low, 0),
+                "high_unread": unread.get(high, 0),
+            })
+
+    def get_target_id(self, user_id):
+        return self.high_user_id if self.low_user_id == user_id else self.low_user_id
+
+    def get_unread(self, user_id):
+        return self.low_unread if self.low_user_id == user_id else self.high_unread
+
+
 class Dynamic(AbstractMessage, AbstractOrigin):
     sender = UserField(verbose_name="发信人", related_name="my_dynamic")
     receiver = UserField(verbose_name="收信人", related_name="dynamic_me")
 
     @classmethod
     def handle_delete(cls, instance, category):
+        FanoutJob.cancel(instance, category)
+
         if category == Origin.BBS_ARTICLE:
             queryset = cls.objects.filter(
                 Q(
@@ -356,9 +575,51 @@ class Dynamic(AbstractMessage, AbstractOrigin):
         else:
             return
 
-        for i in queryset:
-            i.is_active = False
-        cls.objects.bulk_update(queryset, ["is_active"])
+        cls.deactivate(queryset)
+
+
+class FanoutJob(AbstractOrigin):
+    PENDING = 0
+    RUNNING = 1
+    DONE = 2
+    FAILED = 3
+    CANCELLED = 4
+    STATUS_CHOICES = [
+        (PENDING, "等待中"),
+        (RUNNING, "进行中"),
+        (DONE, "已完成"),
+        (FAILED, "失败"),
+        (CANCELLED, "已取消"),
+    ]
+    FINISHED = (DONE, FAILED, CANCELLED)
+    sender = UserField(verbose_name="发信人", related_name="my_fanout")
+    status = models.IntegerField(choices=STATUS_CHOICES, default=PENDING, verbose_name="状态")
+    cursor = models.BigIntegerField(default=0, verbose_name="已推送的最后一条关注记录id")
+    total = models.IntegerField(default=0, verbose_name="待推送人数")
+    done = models.IntegerField(default=0, verbose_name="已推送人数")
+    retry = models.IntegerField(default=0, verbose_name="重试次数")
+    create_time = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    update_time = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+
+    class Meta:
+        index_together = ("status", "id")
+
+    @classmethod
+    def cancel(cls, instance, category):
+        if field := ORIGIN_FIELD.get(category):
+            cls.objects.filter(
+                status__in=[cls.PENDING, cls.RUNNING],
+                **{field: instance}
+            ).update(status=cls.CANCELLED)
+
+    @property
+    def progress(self):
+        """
+        已取消的任务保留取消时的进度
+        """
+        if self.status == self.DONE:
+            return 1
+        return self.done / self.total if self.total else 0
 
 
 class MessageSetting(APIModel):
@@ -1,9 +1,14 @@
+from django.db import transaction
+
 from .models import *
 from bbs import models as bbs_model
 from bbs import serializers as bbs_serializers
 from special import models as special_model
 from special import serializers as special_serializer
-from backend.libs.wraps.serializers import APIModelSerializer, serializers, SimpleAuthorSerializer
+from issue import models as issue_model
+from issue import serializers as issue_serializers
+from backend.libs.wraps.serializers import APIModelSerializer, serializers, SimpleAuthorSerializer, VoteStateField, \
+    prime_vote_state
 from backend.libs.wraps.errors import SerializerError
 from backend.libs.constants import response_code
 from user.models import User
@@ -17,21 +22,9 @@ class MessageSettingSerializer(APIModelSerializer):
 
 class DynamicBBSArticleSerializer(APIModelSerializer):
     author = SimpleAuthorSerializer()
-    is_up = serializers.SerializerMethodField()
+    is_up = VoteStateField(bbs_model.UpAndDown, "article")
     category = bbs_serializers.SimpleCategorySerializer()
 
-    def get_is_up(self, instance):
-        author_id = self.context["request"].user.id
-        if not author_id:
-            return None
-
-        article_id = instance.id
-        obj = bbs_serializers.UpAndDown.objects.filter(article_id=article_id, author_id=author_id).first()
-        if not obj:
-            return None
-
-        return obj.is_up
-
     class Meta:
         model = bbs_model.Article
         fields = [
@@ -53,19 +46,7 @@ class DynamicBBSCommentSerializer(APIModelSerializer):
     parent = bbs_serializers.SimpleCommentSerializer()
     target = bbs_serializers.SimpleCommentSerializer()
     article = bbs_serializers.SimpleArticleSerializer()
-    is_up = serializers.SerializerMethodField(read_only=True)
-
-    def get_is_up(self, instance):
-        author_id = self.context["request"].user.id
-        if not author_id:
-            return None
-
-        comment_id = instance.id
-        obj = bbs_model.UpAndDown.objects.filter(comment_id=comment_id, author_id=author_id).first()
-        if not obj:
-            return None
-
-        return obj.is_up
+    is_up = VoteStateField(bbs_model.UpAndDown, "comment")
 
     class Meta:
         model = bbs_model.Comment
@@ -85,21 +66,9 @@ class DynamicBBSCommentSerializer(APIModelSerializer):
 
 class DynamicSpecialColumnSerializer(APIModelSerializer):
     author = SimpleAuthorSerializer()
-    is_up = serializers.SerializerMethodField()
+    is_up = VoteStateField(special_model.UpAndDown, "column")
     tag = special_serializer.TagSerializer(many=True)
 
-    def get_is_up(self, instance):
-        author_id = self.context["request"].user.id
-        if not author_id:
-            return None
-
-        column_id = instance.id
-        obj = special_model.UpAndDown.objects.filter(column_id=column_id, author_id=author_id).first()
-        if not obj:
-            return None
-
-        return obj.is_up
-
     class Meta:
         model = special_model.Column
         fields = [
@@ -121,19 +90,7 @@ class DynamicSpecialCommentSerializer(APIModelSerializer):
     parent = special_serializer.SimpleCommentSerializer()
     target = special_serializer.SimpleCommentSerializer()
     column = special_serializer.SimpleColumnSerializer()
-    is_up = serializers.SerializerMethodField(read_only=True)
-
-    def get_is_up(self, instance):
-        author_id = self.context["request"].user.id
-        if not author_id:
-            return None
-
-        comment_id = instance.id
-        obj = special_model.UpAndDown.objects.filter(comment_id=comment_id, author_id=author_id).first()
-        if not obj:
-            return None
-
-        return obj.is_up
+    is_up = VoteStateField(special_model.UpAndDown, "comment")
 
     class Meta:
         model = bbs_model.Comment
@@ -154,7 +111,19 @@ class DynamicSpecialCommentSerializer(APIModelSerializer):
 class DynamicSerializer(APIModelSerializer):
     content = serializers.SerializerMethodField()
 
+    def _prime_vote_state(self):
+        if self.context.get("dynamic_primed") or not isinstance(self.parent, serializers.ListSerializer):
+            return
+
+        self.context["dynamic_primed"] = True
+        page = self.parent.instance
+        prime_vote_state(self.context, bbs_model.UpAndDown, "article", map(lambda x: x.bbs_article_id, page))
+        prime_vote_state(self.context, bbs_model.UpAndDown, "comment", map(lambda x: x.bbs_comment_id, page))
+        prime_vote_state(self.context, special_model.UpAndDown, "column", map(lambda x: x.special_column_id, page))
+        prime_vote_state(self.context, special_model.UpAndDown, "comment", map(lambda x: x.special_comment_id, page))
+
     def get_content(self, instance: Dynamic):
+        self._prime_vote_state()
         if instance.origin == Origin.BBS_ARTICLE:
             content = DynamicBBSArticleSerializer(instance.bbs_article, context=self.context).data
         elif instance.origin == Origin.BBS_COMMENT:
@@ -180,19 +149,7 @@ class DynamicSerializer(APIModelSerializer):
 class ReplyBBSArticleSerializer(APIModelSerializer):
     author = SimpleAuthorSerializer()
     article = bbs_serializers.SimpleArticleSerializer()
-    is_up = serializers.SerializerMethodField(read_only=True)
-
-    def get_is_up(self, instance):
-        author_id = self.context["request"].user.id
-        if not author_id:
-            return None
-
-        comment_id = instance.id
-        obj = bbs_model.UpAndDown.objects.filter(comment_id=comment_id, author_id=author_id).first()
-        if not obj:
-            return None
-
-        return obj.is_up
+    is_up = VoteStateField(bbs_model.UpAndDown, "comment")
 
     class Meta:
         model = bbs_model.Comment
@@ -211,19 +168,7 @@ class ReplyBBSCommentSerializer(APIModelSerializer):
     article = bbs_serializers.SimpleArticleSerializer()
     parent = bbs_serializers.SimpleCommentSerializer()
     target = bbs_serializers.SimpleCommentSerializer()
-    is_up = serializers.SerializerMethodField(read_only=True)
-
-    def get_is_up(self, instance):
-        author_id = self.context["request"].user.id
-        if not author_id:
-            return None
-
-        comment_id = instance.id
-        obj = bbs_model.UpAndDown.objects.filter(comment_id=comment_id, author_id=author_id).first()
-        if not obj:
-            return None
-
-        return obj.is_up
+    is_up = VoteStateField(bbs_model.UpAndDown, "comment")
 
     class Meta:
         model = bbs_model.Comment
@@ -242,19 +187,7 @@ class ReplyBBSCommentSerializer(APIModelSerializer):
 class ReplySpecialColumnSerializer(APIModelSerializer):
     author = SimpleAuthorSerializer()
     column = special_serializer.SimpleColumnSerializer()
-    is_up = serializers.SerializerMethodField(read_only=True)
-
-    def get_is_up(self, instance):
-        author_id = self.context["request"].user.id
-        if not author_id:
-            return None
-
-        comment_id = instance.id
-        obj = special_model.UpAndDown.objects.filter(comment_id=comment_id, author_id=author_id).first()
-        if not obj:
-            return None
-
-        return obj.is_up
+    is_up = VoteStateField(special_model.UpAndDown, "comment")
 
     class Meta:
         model = special_model.Comment
@@ -273,19 +206,7 @@ class ReplySpecialCommentSerializer(APIModelSerializer):
     column = special_serializer.SimpleColumnSerializer()
     parent = special_serializer.SimpleCommentSerializer()
     target = special_serializer.SimpleCommentSerializer()
-    is_up = serializers.SerializerMethodField(read_only=True)
-
-    def get_is_up(self, instance):
-        author_id = self.context["request"].user.id
-        if not author_id:
-            return None
-
-        comment_id = instance.id
-        obj = special_model.UpAndDown.objects.filter(comment_id=comment_id, author_id=author_id).first()
-        if not obj:
-            return None
-
-        return obj.is_up
+    is_up = VoteStateField(special_model.UpAndDown, "comment")
 
     class Meta:
         model = special_model.Comment
@@ -304,7 +225,17 @@ class ReplySpecialCommentSerializer(APIModelSerializer):
 class ReplySerializer(APIModelSerializer):
     content = serializers.SerializerMethodField()
 
+    def _prime_vote_state(self):
+        if self.context.get("reply_primed") or not isinstance(self.parent, serializers.ListSerializer):
+            return
+
+        self.context["reply_primed"] = True
+        page = self.parent.instance
+        prime_vote_state(self.context, bbs_model.UpAndDown, "comment", map(lambda x: x.bbs_comment_id, page))
+        prime_vote_state(self.context, special_model.UpAndDown, "comment", map(lambda x: x.special_comment_id, page))
+
     def get_content(self, instance: Reply):
+        self._prime_vote_state()
         if instance.origin == Origin.BBS_ARTICLE:
             content = ReplyBBSArticleSerializer(instance.bbs_comment, context=self.context).data
         elif instance.origin == Origin.BBS_COMMENT:
@@ -359,18 +290,28 @@ class LikeSpecialCommentSerializer(APIModelSerializer):
         ]
 
 
+class LikeIssueCommentSerializer(APIModelSerializer):
+    issue = issue_serializers.SimpleIssueSerializer()
+
+    class Meta:
+        model = issue_model.IssueComment
+        fields = [
+            "id",
+            "description",
+            "issue"
+        ]
+
+
 class LikeSerializer(APIModelSerializer):
     is_viewed = serializers.SerializerMethodField()
     content = serializers.SerializerMethodField()
     sender = SimpleAuthorSerializer()
-    total = serializers.SerializerMethodField()
-    new = serializers.SerializerMethodField()
-    time = serializers.SerializerMethodField()
+    time = serializers.DateTimeField(source="last_time")
 
-    def get_is_viewed(self, instance):
-        return instance.viewed
+    def get_is_viewed(self, instance: LikeInbox):
+        return not instance.new
 
-    def get_content(self, instance: Like):
+    def get_content(self, instance: LikeInbox):
         if instance.origin == Origin.BBS_ARTICLE:
             content = LikeBBSArticleSerializer(instance.bbs_article).data
         elif instance.origin == Origin.BBS_COMMENT:
@@ -379,21 +320,14 @@ class LikeSerializer(APIModelSerializer):
             content = LikeSpecialColumnSerializer(instance.special_column).data
         elif instance.origin == Origin.SPECIAL_COMMENT:
             content = LikeSpecialCommentSerializer(instance.special_comment).data
+        elif instance.origin == Origin.ISSUE_COMMENT:
+            content = LikeIssueCommentSerializer(instance.issue_comment).data
         else:
             raise SerializerError("异常记录", response_code.INVALID_PARAMS)
         return content
 
-    def get_total(self, instance):
-        return instance.total
-
-    def get_new(self, instance):
-        return int(instance.new)
-
-    def get_time(self, instance):
-        return instance.last_time
-
     class Meta:
-        model = Like
+        model = LikeInbox
         fields = [
             "id",
             "origin",
@@ -497,25 +431,34 @@ class SystemSerializer(APIModelSerializer):
 
 
 class PrivateSerializer(APIModelSerializer):
+    id = serializers.IntegerField(source="last_message_id")
+    content = serializers.CharField(source="last_message.content", default=None)
+    time = serializers.DateTimeField(source="last_time")
     target = serializers.SerializerMethodField()
     is_viewed = serializers.SerializerMethodField()
-    time = serializers.SerializerMethodField()
     new = serializers.SerializerMethodField()
 
-    def get_is_viewed(self, instance):
-        return instance.viewed
+    def get_target_users(self, instance):
+        if (users := self.context.get("private_target")) is None:
+            user_id = self.context["request"].user.id
+            page = self.parent.instance if isinstance(self.parent, serializers.ListSerializer) else [instance]
+            users = self.context["private_target"] = User.objects.in_bulk(
+                [i.get_target_id(user_id) for i in page]
+            )
+        return users
 
-    def get_target(self, instance):
-        return SimpleAuthorSerializer(User.objects.get(id=instance.target_id)).data
+    def get_target(self, instance: Conversation):
+        target_id = instance.get_target_id(self.context["request"].user.id)
+        return SimpleAuthorSerializer(self.get_target_users(instance).get(target_id)).data
 
-    def get_time(self, instance):
-        return instance.last_time
+    def get_is_viewed(self, instance: Conversation):
+        return not instance.get_unread(self.context["request"].user.id)
 
-    def get_new(self, instance):
-        return instance.new
+    def get_new(self, instance: Conversation):
+        return instance.get_unread(self.context["request"].user.id)
 
     class Meta:
-        model = Private
+        model = Conversation
         fields = [
             "id",
             "content",
@@ -541,4 +484,31 @@ class PrivateDetailSerializer(APIModelSerializer):
     def create(self, validated_data):
         validated_data["sender"] = self.context["request"].user
         validated_data["receiver_id"] = self.context["request"].query_params.get("uid")
-        return super().create(validated_data)
+        with transaction.atomic():
+            instance = super().create(validated_data)
+            Conversation.push(instance)
+        return instance
+
+
+class FanoutJobSerializer(APIModelSerializer):
+    progress = serializers.SerializerMethodField()
+    cancelled = serializers.SerializerMethodField()
+
+    def get_progress(self, instance: FanoutJob):
+        return instance.progress
+
+    def get_cancelled(self, instance: FanoutJob):
+        return instance.status == FanoutJob.CANCELLED
+
+    class Meta:
+        model = FanoutJob
+        fields = [
+            "id",
+            "origin",
+            "status",
+            "total",
+            "done",
+            "progress",
+            "cancelled",
+            "create_time",
+        ]
@@ -0,0 +1,47 @@
+from django.db.models import Count
+from redis.exceptions import RedisError
+
+from .models import Dynamic, At, Private, System, Like, Reply
+from backend.libs.wraps.logger import log
+from backend.utils.Redis.unread import CATEGORY, get_unread, store_unread
+
+MESSAGE_MODELS = [Dynamic, At, Private, System, Like, Reply]
+
+
+def count_unread(user_ids):
+    """
+    从数据库统计一批用户的未读消息数
+    :return: {用户id: {类别: 未读数}}
+    """
+    data = {i: {} for i in user_ids}
+    for model in MESSAGE_MODELS:
+        condition = {
+            "receiver_id__in": user_ids,
+            "is_active": True,
+            "is_viewed": False,
+        }
+        if model is not System:
+            condition["sender__is_active"] = True
+
+        queryset = model.objects.filter(**condition).values("receiver_id").annotate(n=Count("id"))
+        for i in queryset:
+            data[i["receiver_id"]][model.unread_category()] = i["n"]
+    return data
+
+
+def get_user_unread(user_id):
+    """
+    优先读取未读计数缓存，缓存缺失时从数据库统计并写入，redis不可用时直接统计
+    """
+    try:
+        if (data := get_unread(user_id)) is not None:
+            return data
+    except RedisError as e:
+        log.warning(f"未读计数缓存不可用:{str(e)}")
+
+    data = count_unread([user_id])
+    try:
+        store_unread(data)
+    except RedisError as e:
+        log.warning(f"未读计数写入失败:{str(e)}")
+    return {i: data[user_id].get(i, 0) for i in CATEGORY}
@@ -11,6 +11,7 @@ router.register("at", AtView, "")
 router.register("system", SystemView, "")
 router.register("private", PrivateView, "")
 router.register("private_detail", PrivateDetailView, "")
+router.register("fanout", FanoutJobView, "")
 router.register("", MessageSettingView, "")
 
 urlpatterns = [
@@ -1,13 +1,16 @@
+from collections import Counter
+
+from django.db import transaction
 from django.db.models import Q
 from rest_framework.viewsets import ViewSet
 from rest_framework.decorators import action
 
 from .serializers import *
 from backend.libs.wraps.authenticators import CommonJwtAuthentication
-from backend.libs.wraps.views import APIModelViewSet
+from backend.libs.wraps.views import APIModelViewSet, CursorPag
 from backend.libs.wraps.response import APIResponse
 from backend.libs.constants import response_code
-from backend.libs.scripts.sql import like_sql, private_sql
+from backend.utils.Redis.unread import incr_unread, reset_unread
 
 
 class MessageSettingView(ViewSet):
@@ -29,6 +32,7 @@ class MessageSettingView(ViewSet):
 
 class DynamicView(APIModelViewSet):
     authentication_classes = [CommonJwtAuthentication]
+    pagination_class = CursorPag
     serializer_class = DynamicSerializer
     queryset = Dynamic
     code = {
@@ -48,15 +52,17 @@ class DynamicView(APIModelViewSet):
     def get_queryset(self):
         return self.request.user.dynamic_me.filter(
             is_active=True,
-            sender_id__in=self.request.user.my_follow_set - self.request.user.my_black_set
+            sender_id__in=self.request.user.dynamic_sender_set
         ).order_by("-id")
 
     def after_list(self, queryset, request, *args, **kwargs):
         request.user.dynamic_me.all().filter(is_active=True, is_viewed=False).update(is_viewed=True)
+        reset_unread(request.user.id, "dynamic")
 
 
 class ReplyView(APIModelViewSet):
     authentication_classes = [CommonJwtAuthentication]
+    pagination_class = CursorPag
     serializer_class = ReplySerializer
     queryset = Reply
     code = {
@@ -72,25 +78,44 @@ class ReplyView(APIModelViewSet):
 
     def after_list(self, queryset, request, *args, **kwargs):
         request.user.reply_me.all().filter(is_active=True, is_viewed=False).update(is_viewed=True)
+        reset_unread(request.user.id, "reply")
 
 
 class LikeView(APIModelViewSet):
     authentication_classes = [CommonJwtAuthentication]
+    pagination_class = CursorPag
     serializer_class = LikeSerializer
+    queryset = LikeInbox
     code = {
         "list": response_code.SUCCESS_GET_LIKE_LIST,
     }
     exclude = ["create", "retrieve", "update", "destroy"]
+    queryset_options = {
+        "list": {
+            "select_related": [
+                "bbs_article",
+                "bbs_comment__article",
+                "special_column",
+                "special_comment__column",
+                "issue_comment__issue",
+            ],
+        }
+    }
 
     def get_queryset(self):
-        return Like.objects.raw(like_sql % self.request.user.id)
+        # 未读条目只能由列表打开后的新点赞产生，其last_time晚于全部已读条目，按last_time倒序即未读在前
+        return self.request.user.like_inbox.order_by("-last_time")
 
     def after_list(self, queryset, request, *args, **kwargs):
-        request.user.like_me.all().filter(is_active=True, is_viewed=False).update(is_viewed=True)
+        with transaction.atomic():
+            request.user.like_me.all().filter(is_active=True, is_viewed=False).update(is_viewed=True)
+            request.user.like_inbox.filter(new__gt=0).update(new=0)
+        reset_unread(request.user.id, "like")
 
 
 class AtView(APIModelViewSet):
     authentication_classes = [CommonJwtAuthentication]
+    pagination_class = CursorPag
     serializer_class = AtSerializer
     queryset = At
     code = {
@@ -106,10 +131,12 @@ class AtView(APIModelViewSet):
 
     def after_list(self, queryset, request, *args, **kwargs):
         request.user.at_me.all().filter(is_active=True, is_viewed=False).update(is_viewed=True)
+        reset_unread(request.user.id, "at")
 
 
 class SystemView(APIModelViewSet):
     authentication_classes = [CommonJwtAuthentication]
+    pagination_class = CursorPag
     serializer_class = SystemSerializer
     queryset = System
     code = {
@@ -123,12 +150,14 @@ class SystemView(APIModelViewSet):
 
     def after_list(self, queryset, request, *args, **kwargs):
         request.user.system_me.all().filter(is_active=True, is_viewed=False).update(is_viewed=True)
+        reset_unread(request.user.id, "system")
 
 
 class PrivateView(APIModelViewSet):
     authentication_classes = [CommonJwtAuthentication]
+    pagination_class = CursorPag
     serializer_class = PrivateSerializer
-    queryset = Private
+    queryset = Conversation
     code = {
         "list": response_code.SUCCESS_GET_PRIVATE_LIST,
         "destroy": response_code.SUCCESS_DELETE_PRIVATE
@@ -136,7 +165,9 @@ class PrivateView(APIModelViewSet):
     exclude = ["create", "retrieve", "update"]
 
     def get_queryset(self):
-        return Private.objects.raw(private_sql.format(user_id=self.request.user.id))
+        return Conversation.objects.filter(
+            Q(low_user_id=self.request.user.id) | Q(high_user_id=self.request.user.id)
+        ).select_related("last_message").order_by("-last_time")
 
     def destroy(self, request, *args, **kwargs):
         pass
@@ -181,6 +212,33 @@ class PrivateDetailView(APIModelViewSet):
                 is_viewed=False
             )
         )
-        for i in queryset:
-            i.is_viewed = True
-        Private.objects.bulk_update(queryset, ["is_viewed"])
+        with transaction.atomic():
+            queryset = list(queryset.select_for_update())
+            for i in queryset:
+                i.is_viewed = True
+            Private.objects.bulk_update(queryset, ["is_viewed"])
+
+            if uid := self.request.query_params.get("uid"):
+                Conversation.mark_viewed(self.request.user.id, uid)
+
+        counts = Counter(i.receiver_id for i in queryset if i.is_active)
+        incr_unread("private", {k: -v for k, v in counts.items()})
+
+    def after_destroy(self, instance, request, *args, **kwargs):
+        if not instance.is_viewed:
+            incr_unread("private", {instance.receiver_id: -1})
+        Conversation.refresh(instance.sender_id, instance.receiver_id)
+
+
+class FanoutJobView(APIModelViewSet):
+    authentication_classes = [CommonJwtAuthentication]
+    serializer_class = FanoutJobSerializer
+    queryset = FanoutJob
+    code = {
+        "list": response_code.SUCCESS_GET_FANOUT_LIST,
+        "retrieve": response_code.SUCCESS_GET_FANOUT,
+    }
+    exclude = ["create", "update", "destroy"]
+
+    def get_queryset(self):
+        return self.request.user.my_fanout.all().order_by("-id")
@@ -0,0 +1,95 @@
+import math
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import F, Q, Sum, Case, When, Value, Count, IntegerField
+
+from .models import Category, Document, Posting
+from .tokenizer import html_text, tokenize, term_weight
+
+SOURCES = {
+    Category.ARTICLE: ("bbs.Article", {"is_active": True}),
+    Category.COLUMN: ("special.Column", {"is_active": True, "is_draft": False, "is_audit": True}),
+    Category.NEWS: ("information.News", {"is_active": True, "is_draft": False}),
+}
+
+MAX_QUERY_TERMS = 16
+
+
+def get_model(category):
+    return apps.get_model(SOURCES[category][0])
+
+
+def is_indexable(category, instance):
+    return all(getattr(instance, k) == v for k, v in SOURCES[category][1].items())
+
+
+def update_document(category, instance):
+    """
+    重建单个对象的索引，对象已删除或不可见时移出索引
+    """
+    if not is_indexable(category, instance):
+        return remove_document(category, instance.id)
+
+    weight = term_weight(instance.title, html_text(instance.content))
+    with transaction.atomic():
+        document, _ = Document.objects.update_or_create(category=category, object_id=instance.id)
+        Posting.objects.filter(document=document).delete()
+        Posting.objects.bulk_create(map(
+            lambda item: Posting(term=item[0], document=document, weight=item[1]),
+            weight.items()
+        ))
+
+
+def remove_document(category, object_id):
+    Document.objects.filter(category=category, object_id=object_id).delete()
+
+
+def rebuild(category, chunk=500):
+    model = get_model(category)
+    queryset = model.objects.filter(**SOURCES[category][1]).order_by("id")
+    last_id = 0
+    total = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id).only("id", "title", "content", *SOURCES[category][1])[:chunk])
+        if not batch:
+            return total
+
+        for instance in batch:
+            update_document(category, instance)
+        last_id = batch[-1].id
+        total += len(batch)
+
+
+def get_idf(terms):
+    total = Document.objects.count()
+    df = dict(Posting.objects.filter(term__in=terms).values_list("term").annotate(df=Count("id")))
+    return {term: int(math.log((total + 1) / (n + 1)) * 1000) + 1 for term, n in df.items()}
+
+
+def search(query, position=None, limit=10):
+    """
+    按tf-idf得分降序检索，position为上一页最后一条的(得分, 文档id)
+    返回[(类别, 对象id, 得分, 文档id)]，多取一条用于判断是否有下一页
+    """
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    idf = get_idf(terms)
+    if not idf:
+        return []
+
+    score = Sum(F("weight") * Case(
+        *[When(term=term, then=Value(n)) for term, n in idf.items()],
+        default=Value(0),
+        output_field=IntegerField()
+    ))
+    queryset = Posting.objects.filter(term__in=idf.keys()).values("document_id").annotate(score=score)
+    if position:
+        last_score, last_id = position
+        queryset = queryset.filter(Q(score__lt=last_score) | Q(score=last_score, document_id__lt=last_id))
+
+    ranked = list(queryset.order_by("-score", "-document_id")[:limit + 1])
+    documents = Document.objects.in_bulk([i["document_id"] for i in ranked])
+    return [
+        (documents[i["document_id"]].category, documents[i["document_id"]].object_id, i["score"], i["document_id"])
+        for i in ranked if i["document_id"] in documents
+    ]
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from search.models import Category
+from search.index import rebuild
+
+
+class Command(BaseCommand):
+    help = "重建文章、专栏、资讯的全文索引"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk", type=int, default=500, help="每批读取的对象数")
+
+    def handle(self, *args, **options):
+        for name, category in (("article", Category.ARTICLE), ("column", Category.COLUMN), ("news", Category.NEWS)):
+            total = rebuild(category, options["chunk"])
+            self.stdout.write(f"{name}: 已索引{total}条")
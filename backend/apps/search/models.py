@@ -0,0 +1,30 @@
+from backend.libs.wraps.models import APIModel, models
+
+
+class Category:
+    ARTICLE = 1
+    COLUMN = 2
+    NEWS = 3
+
+
+class Document(APIModel):
+    STATUS_CHOICES = [
+        (Category.ARTICLE, "论坛文章"),
+        (Category.COLUMN, "专栏帖子"),
+        (Category.NEWS, "资讯"),
+    ]
+    category = models.IntegerField(choices=STATUS_CHOICES, verbose_name="文档类别")
+    object_id = models.IntegerField(verbose_name="对应对象id")
+    update_time = models.DateTimeField(auto_now=True, verbose_name="索引时间")
+
+    class Meta:
+        unique_together = ("category", "object_id")
+
+
+class Posting(APIModel):
+    term = models.CharField(max_length=32, verbose_name="词项")
+    document = models.ForeignKey(to="Document", on_delete=models.CASCADE, verbose_name="对应文档")
+    weight = models.IntegerField(verbose_name="词项权重")
+
+    class Meta:
+        index_together = ("term", "document")
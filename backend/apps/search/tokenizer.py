@@ -0,0 +1,46 @@
+import re
+from collections import Counter
+
+from lxml import etree
+
+CJK = r"\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+
+TOKEN = re.compile(rf"[{CJK}]+|[a-z0-9]+")
+
+IS_CJK = re.compile(rf"[{CJK}]")
+
+MAX_TERM_LENGTH = 32
+
+
+def html_text(html):
+    if not html:
+        return ""
+    return etree.HTML(html).xpath("string(.)")
+
+
+def tokenize(text):
+    """
+    中文按相邻二字切分，单字成词；英文与数字按连续串切分
+    """
+    terms = []
+    for run in TOKEN.findall(text.lower()):
+        if IS_CJK.match(run):
+            if len(run) == 1:
+                terms.append(run)
+            else:
+                terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            terms.append(run[:MAX_TERM_LENGTH])
+    return terms
+
+
+def term_weight(title, text, title_boost=3, max_tf=10):
+    """
+    标题中的词项按title_boost加权，正文词频上限为max_tf
+    """
+    title_count = Counter(tokenize(title))
+    text_count = Counter(tokenize(text))
+    weight = {}
+    for term in title_count.keys() | text_count.keys():
+        weight[term] = title_count[term] * title_boost + min(text_count[term], max_tf)
+    return weight
@@ -0,0 +1,11 @@
+from django.urls import path, include
+from rest_framework.routers import SimpleRouter
+
+from .views import *
+
+router = SimpleRouter()
+router.register("", SearchView, "search")
+
+urlpatterns = [
+    path("", include(router.urls))
+]
@@ -0,0 +1,94 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from rest_framework.viewsets import ViewSet
+from rest_framework.pagination import OrderedDict
+from rest_framework.utils.urls import replace_query_param
+
+from .models import Category
+from .index import search
+from bbs.serializers import ArticleSerializer, Article
+from special.serializers import ColumnSerializer, Column
+from information.serializers import NewsSerializer, News
+from backend.libs.constants import response_code
+from backend.libs.wraps.response import APIResponse
+from backend.libs.wraps.authenticators import UserInfoAuthentication
+
+
+class SearchView(ViewSet):
+    authentication_classes = [UserInfoAuthentication]
+    page_size = 10
+    max_page_size = 50
+
+    def list(self, request):
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            return APIResponse(response_code.INVALID_PARAMS, "缺少参数")
+
+        try:
+            limit = min(int(request.query_params.get("limit", self.page_size)), self.max_page_size)
+            position = self._decode_cursor(request.query_params.get("cursor"))
+        except Exception:
+            return APIResponse(response_code.INVALID_PARAMS, "参数错误")
+
+        ranked = search(query, position, limit)
+        next_link = None
+        if len(ranked) > limit:
+            ranked = ranked[:limit]
+            _, _, score, document_id = ranked[-1]
+            next_link = replace_query_param(
+                request.build_absolute_uri(),
+                "cursor",
+                urlsafe_b64encode(json.dumps([score, document_id]).encode("utf-8")).decode("ascii")
+            )
+
+        content = self._hydrate(request, ranked)
+        results = [
+            {"type": category, "score": score, "content": content[category][object_id]}
+            for category, object_id, score, _ in ranked if object_id in content[category]
+        ]
+
+        return APIResponse(response_code.SUCCESS_SEARCH, "成功获取此页数据", OrderedDict([
+            ('count', None),
+            ('next', next_link),
+            ('previous', None),
+            ('results', results)
+        ]))
+
+    @staticmethod
+    def _decode_cursor(cursor):
+        if not cursor:
+            return None
+        score, document_id = json.loads(urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+        return int(score), int(document_id)
+
+    @staticmethod
+    def _hydrate(request, ranked):
+        ids = {Category.ARTICLE: [], Category.COLUMN: [], Category.NEWS: []}
+        for category, object_id, _, _ in ranked:
+            ids[category].append(object_id)
+
+        class view:
+            action = "list"
+
+        context = {"view": view, "request": request}
+        article = ArticleSerializer(
+            Article.objects.filter(author__is_active=True, id__in=ids[Category.ARTICLE]),
+            many=True,
+            context=context
+        ).data
+        column = ColumnSerializer(
+            Column.objects.filter(author__is_active=True, id__in=ids[Category.COLUMN]),
+            many=True,
+            context=context
+        ).data
+        news = NewsSerializer(
+            News.objects.filter(author__is_active=True, id__in=ids[Category.NEWS]),
+            many=True,
+            context=context
+        ).data
+        return {
+            Category.ARTICLE: {i["id"]: i for i in article},
+            Category.COLUMN: {i["id"]: i for i in column},
+            Category.NEWS: {i["id"]: i for i in news},
+        }
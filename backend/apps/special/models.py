@@ -3,6 +3,7 @@ import datetime
 from backend.libs.wraps.models import APIModel, models
 from user.models import User
 from message.models import At, Origin
+from backend.utils.Redis import ViewCounter, Counter
 
 
 class Column(APIModel):
@@ -68,7 +69,7 @@ class Comment(APIModel):
 
         create_data = []
         for receiver in mention:
-            if receiver != sender and receiver.message_setting.at and receiver.id not in sender.black_me_set:
+            if receiver != sender and receiver.message_setting.at and not sender.is_blacked_by(receiver.id):
                 create_data.append(At(
                     sender=sender,
                     receiver=receiver,
@@ -90,6 +91,11 @@ class View(APIModel):
     column = models.ForeignKey(to="Column", on_delete=models.DO_NOTHING, verbose_name="浏览专栏")
 
 
+column_view_counter = ViewCounter("column", Column, View, "column")
+column_counter = Counter("column", Column)
+comment_counter = Counter("special_comment", Comment)
+
+
 class UpAndDown(APIModel):
     author = models.ForeignKey(
         to="user.User",
@@ -1,14 +1,11 @@
-import re
 from datetime import datetime
 
-from lxml import etree
-from django.db.models import F
-
 from .models import *
-from user.models import User
+from user.models import User, user_counter
 from backend.libs.wraps.serializers import EmptySerializer, serializers, APIModelSerializer, OtherUserSerializer, \
-    SimpleAuthorSerializer
+    SimpleAuthorSerializer, VoteStateField, ActionSerializerMixin, get_top_children
 from backend.libs.wraps.errors import SerializerError
+from backend.libs.function.content import RichContent
 from backend.libs.constants import response_code
 
 
@@ -18,7 +15,7 @@ class TagSerializer(APIModelSerializer):
         fields = "__all__"
 
 
-class MyColumnSerializer(APIModelSerializer):
+class MyColumnSerializer(ActionSerializerMixin, APIModelSerializer):
     tag = TagSerializer(many=True, read_only=True)
     tag_list = serializers.ListField(write_only=True)
 
@@ -41,14 +38,11 @@ class MyColumnSerializer(APIModelSerializer):
             "content": {"required": False}
         }
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-
-        action = self.context["view"].action
-        self.context["action"] = action
-        remove = []
+    @classmethod
+    def get_remove_fields(cls, context):
+        action = context["view"].action
         if action == "list":
-            remove = [
+            return [
                 "menu",
                 "tag",
                 "description",
@@ -56,23 +50,22 @@ class MyColumnSerializer(APIModelSerializer):
                 "content"
             ]
         if action == "retrieve":
-            remove = [
+            return [
                 "update_time",
                 "menu",
                 "content",
             ]
         if action == "create":
-            remove = [
+            return [
                 "update_time",
                 "is_audit",
             ]
         if action == "update":
-            remove = [
+            return [
                 "update_time",
                 "is_audit",
             ]
-        for i in remove:
-            self.fields.pop(i)
+        return []
 
     def create(self, validated_data):
         validated_data["is_audit"] = True
@@ -92,22 +85,10 @@ class MyColumnSerializer(APIModelSerializer):
         return instance
 
 
-class ColumnSerializer(APIModelSerializer):
+class ColumnSerializer(ActionSerializerMixin, APIModelSerializer):
     author = OtherUserSerializer(read_only=True)
     tag = TagSerializer(many=True, read_only=True)
-    is_up = serializers.SerializerMethodField(read_only=True)
-
-    def get_is_up(self, instance):
-        author_id = self.context["request"].user.id
-        if not author_id:
-            return None
-
-        column_id = instance.id
-        obj = UpAndDown.objects.filter(column_id=column_id, author_id=author_id).first()
-        if not obj:
-            return None
-
-        return obj.is_up
+    is_up = VoteStateField(UpAndDown, "column")
 
     class Meta:
         model = Column
@@ -129,14 +110,11 @@ class ColumnSerializer(APIModelSerializer):
             "down_num",
         ]
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-
-        action = self.context["view"].action
-        self.context["action"] = action
-        remove = []
+    @classmethod
+    def get_remove_fields(cls, context):
+        action = context["view"].action
         if action == "list":
-            remove = [
+            return [
                 "menu",
                 "update_time",
                 "content",
@@ -144,11 +122,10 @@ class ColumnSerializer(APIModelSerializer):
                 "down_num"
             ]
         if action == "retrieve":
-            remove = [
+            return [
                 "comment_time",
             ]
-        for i in remove:
-            self.fields.pop(i)
+        return []
 
 
 class VoteColumnSerializer(EmptySerializer):
@@ -163,63 +140,40 @@ class VoteColumnSerializer(EmptySerializer):
 
         instance = UpAndDown.objects.filter(column_id=column_id, author_id=user_id).first()
         receiver = Column.objects.get(id=column_id).author
+        up = 0
 
         if not instance:
             if is_up:
-                receiver.up_num += 1
+                up = 1
             instance = UpAndDown.objects.create(column_id=column_id, is_up=is_up, author_id=user_id)
             self._update_num(column_id, is_up, 1 - is_up)
         else:
             if instance.is_up == is_up:
-                receiver.up_num -= is_up
+                up = -is_up
                 instance.delete()
                 self._update_num(column_id, -is_up, is_up - 1)
             else:
                 instance.is_up = is_up
-                receiver.up_num += 2 * is_up - 1
+                up = 2 * is_up - 1
                 instance.save()
                 self._update_num(column_id, 2 * is_up - 1, 1 - 2 * is_up)
 
-        receiver.save()
+        user_counter.add(receiver.id, up_num=up)
         return instance
 
     @staticmethod
     def _update_num(column_id, up, down):
-        Column.objects.filter(id=column_id).update(up_num=F("up_num") + up, down_num=F("down_num") + down)
+        column_counter.add(column_id, up_num=up, down_num=down)
 
 
 class CommentSerializer(APIModelSerializer):
     author = OtherUserSerializer(read_only=True)
     children_comment = serializers.SerializerMethodField(read_only=True)
-    is_up = serializers.SerializerMethodField(read_only=True)
-
-    def get_is_up(self, instance):
-        author_id = self.context["request"].user.id
-        if not author_id:
-            return None
-
-        comment_id = instance.id
-        obj = UpAndDown.objects.filter(comment_id=comment_id, author_id=author_id).first()
-        if not obj:
-            return None
-
-        return obj.is_up
+    is_up = VoteStateField(UpAndDown, "comment")
 
     def get_children_comment(self, instance: Comment):
-        author_id = self.context["request"].user.id
-        if children := instance.parent_comments.all().filter(is_active=True).order_by("-up_num")[:2]:
-            data = ChildrenCommentSerializer(children, many=True, context=self.context).data
-            for i in data:
-                if not author_id:
-                    i["is_up"] = None
-                else:
-                    comment_id = i["id"]
-                    obj = UpAndDown.objects.filter(comment_id=comment_id, author_id=author_id).first()
-                    if not obj:
-                        i["is_up"] = None
-                    else:
-                        i["is_up"] = obj.is_up
-            return data
+        if children := get_top_children(self, instance, Comment, (UpAndDown, "comment")):
+            return ChildrenCommentSerializer(children, many=True, context=self.context).data
         else:
             return []
 
@@ -240,59 +194,21 @@ class CommentSerializer(APIModelSerializer):
         ]
 
     def create(self, validated_data):
-        validated_data["content"] = self._add_mention(validated_data["content"])
+        content = RichContent(validated_data["content"])
+        self.context["mention"] = content.mention
+        validated_data["content"] = content.html
         validated_data["author"] = self.context["request"].user
         validated_data["column_id"] = self.context["kwargs"].get("column_id")
-        validated_data["description"] = self._get_description(validated_data["content"])
+        validated_data["description"] = content.comment_description()
         return super().create(validated_data)
 
-    def _get_description(self, content):
-        text = etree.HTML(content).xpath("string(.)")
-        if len(text) <= 40:
-            html_text = f'<span>{text}</span>'
-        else:
-            html_text = f'<span>{text[:40]}...</span>'
-
-        img_urls = re.findall('<img src="(.*?)" .*?/>', content)
-
-        if not img_urls:
-            return html_text
-
-        return html_text + "<span>[图片]</span>"
-
-    def _add_mention(self, html):
-        self.context["mention"] = []
-        tree = etree.HTML(html)
-        for i in tree.xpath("//span[@data-w-e-type='mention']"):
-            uid = i.xpath("@data-info")[0]
-            username = i.xpath("text()")[0].replace("@", "")
-            user = User.objects.filter(id=uid, username=username)
-            if user:
-                self.context["mention"].append(user.first())
-                i.set("style", "color: rgb(54, 88, 226);")
-                i.set("uid", uid)
-
-        return etree.tostring(tree).decode("utf-8")[12:-14]
-
 
 class ChildrenCommentSerializer(APIModelSerializer):
     author = OtherUserSerializer(read_only=True)
     column_id = serializers.IntegerField(write_only=True)
     parent_id = serializers.IntegerField(write_only=True)
     target_id = serializers.IntegerField(allow_null=True, default=None)
-    is_up = serializers.SerializerMethodField(read_only=True)
-
-    def get_is_up(self, instance):
-        if request := self.context.get("request"):
-            author_id = request.user.id
-            if not author_id:
-                return None
-            comment_id = instance.id
-            obj = UpAndDown.objects.filter(comment_id=comment_id, author_id=author_id).first()
-            if not obj:
-                return None
-
-            return obj.is_up
+    is_up = VoteStateField(UpAndDown, "comment")
 
     class Meta:
         model = Comment
@@ -314,8 +230,10 @@ class ChildrenCommentSerializer(APIModelSerializer):
         if validated_data.get("target_id"):
             validated_data["content"] = self._add_mention_prefix(validated_data["content"], validated_data)
 
-        validated_data["content"] = self._add_mention(validated_data["content"])
-        validated_data["description"] = self._get_description(validated_data["content"])
+        content = RichContent(validated_data["content"])
+        self.context["mention"] = content.mention
+        validated_data["content"] = content.html
+        validated_data["description"] = content.comment_description()
         validated_data["author"] = self.context["request"].user
 
         return super().create(validated_data)
@@ -339,34 +257,6 @@ class ChildrenCommentSerializer(APIModelSerializer):
         ])
         return content
 
-    def _get_description(self, content):
-        text = etree.HTML(content).xpath("string(.)")
-        if len(text) <= 40:
-            html_text = f'<span>{text}</span>'
-        else:
-            html_text = f'<span>{text[:40]}...</span>'
-
-        img_urls = re.findall('<img src="(.*?)" .*?/>', content)
-
-        if not img_urls:
-            return html_text
-
-        return html_text + "<span>[图片]</span>"
-
-    def _add_mention(self, html):
-        self.context["mention"] = []
-        tree = etree.HTML(html)
-        for i in tree.xpath("//span[@data-w-e-type='mention']"):
-            uid = i.xpath("@data-info")[0]
-            username = i.xpath("text()")[0].replace("@", "")
-            user = User.objects.filter(id=uid, username=username)
-            if user:
-                self.context["mention"].append(user.first())
-                i.set("style", "color: rgb(54, 88, 226);")
-                i.set("uid", uid)
-
-        return etree.tostring(tree).decode("utf-8")[12:-14]
-
 
 class VoteCommentSerializer(EmptySerializer):
     comment_id = serializers.IntegerField()
@@ -396,7 +286,7 @@ class VoteCommentSerializer(EmptySerializer):
 
     @staticmethod
     def _update_num(comment_id, up, down):
-        Comment.objects.filter(id=comment_id).update(up_num=F("up_num") + up, down_num=F("down_num") + down)
+        comment_counter.add(comment_id, up_num=up, down_num=down)
 
 
 class SimpleColumnSerializer(APIModelSerializer):
@@ -422,22 +312,10 @@ class SimpleCommentSerializer(APIModelSerializer):
 
 class SelfCommentSerializer(APIModelSerializer):
     column = SimpleColumnSerializer()
-    is_up = serializers.SerializerMethodField(read_only=True)
+    is_up = VoteStateField(UpAndDown, "comment")
     target = SimpleCommentSerializer()
     parent = SimpleCommentSerializer()
 
-    def get_is_up(self, instance):
-        author_id = self.context["request"].user.id
-        if not author_id:
-            return None
-
-        comment_id = instance.id
-        obj = UpAndDown.objects.filter(comment_id=comment_id, author_id=author_id).first()
-        if not obj:
-            return None
-
-        return obj.is_up
-
     class Meta:
         model = Comment
         fields = [
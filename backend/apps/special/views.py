@@ -1,13 +1,16 @@
 from rest_framework.decorators import action
-from django.db.models import Q
 from rest_framework.request import Request
 
 from .serializers import *
-from message.models import Dynamic, MessageSetting, Like, Reply, Origin, At
+from message.models import Dynamic, FanoutJob, Like, Reply, Origin, At
+from message import fanout
 from backend.libs.constants import response_code
-from backend.libs.wraps.views import APIModelViewSet
+from backend.libs.wraps.views import APIModelViewSet, AsyncReadMixin, CursorPag
 from backend.libs.wraps.response import APIResponse
 from backend.libs.wraps.authenticators import CommonJwtAuthentication, UserInfoAuthentication, PermissionAuthentication
+from search.models import Category as SearchCategory
+from search.index import update_document, remove_document
+from common import feed
 
 
 class TagView(APIModelViewSet):
@@ -37,49 +40,30 @@ class MyColumnView(APIModelViewSet):
             "-update_time")
 
     def after_create(self, instance, request, *args, **kwargs):
+        update_document(SearchCategory.COLUMN, instance)
+        feed.update_item(SearchCategory.COLUMN, instance)
+
         if instance.is_draft:
             return
 
-        follower_list = request.user.follow_me.exclude(
-            follower__message_setting__dynamic=0,
-        ).filter(
-            ~Q(follower_id__in=request.user.black_me_set)
-        ).all()
-
-        create_data = map(lambda follower: Dynamic(
-            sender=request.user,
-            receiver=follower.follower,
-            origin=Origin.SPECIAL_COLUMN,
-            special_column=instance,
-            is_viewed=follower.follower.message_setting.dynamic == MessageSetting.IGNORE,
-        ), follower_list)
-
-        Dynamic.objects.bulk_create(create_data)
+        fanout.enqueue(request.user, Origin.SPECIAL_COLUMN, instance)
 
     def after_update(self, instance, request, *args, **kwargs):
+        update_document(SearchCategory.COLUMN, instance)
+        feed.update_item(SearchCategory.COLUMN, instance)
+
         if instance.is_draft:
             return
 
-        if Dynamic.objects.filter(special_column=instance):
+        if FanoutJob.objects.filter(special_column=instance).exists() or \
+                Dynamic.objects.filter(special_column=instance).exists():
             return
 
-        follower_list = request.user.follow_me.exclude(
-            follower__message_setting__dynamic=0,
-        ).filter(
-            ~Q(follower_id__in=request.user.black_me_set)
-        ).all()
-
-        create_data = map(lambda follower: Dynamic(
-            sender=request.user,
-            receiver=follower.follower,
-            origin=Origin.SPECIAL_COLUMN,
-            special_column=instance,
-            is_viewed=follower.follower.message_setting.dynamic == MessageSetting.IGNORE,
-        ), follower_list)
-
-        Dynamic.objects.bulk_create(create_data)
+        fanout.enqueue(request.user, Origin.SPECIAL_COLUMN, instance)
 
     def after_destroy(self, instance, request, *args, **kwargs):
+        remove_document(SearchCategory.COLUMN, instance.id)
+        feed.remove_item(SearchCategory.COLUMN, instance.id)
         Dynamic.handle_delete(instance, Origin.SPECIAL_COLUMN)
         Like.handle_delete(instance, Origin.SPECIAL_COLUMN)
         Reply.handle_delete(instance, Origin.SPECIAL_COLUMN)
@@ -104,13 +88,7 @@ class ColumnView(APIModelViewSet):
     }
 
     def after_retrieve(self, instance, request, *args, **kwargs):
-        if not View.objects.filter(
-                column=instance,
-                name_id=request.user.id
-        ).exists() and not request.user.is_anonymous:
-            instance.view_num += 1
-            instance.save()
-            View.objects.create(column=instance, name_id=request.user.id)
+        instance.view_num += column_view_counter.view(instance.id, request.user.id)
 
     @action(["POST"], True)
     def vote(self, request, pk):
@@ -131,26 +109,14 @@ class ColumnView(APIModelViewSet):
         sender = request.user
 
         if receiver != sender and receiver.message_setting.like:
-            like = Like.objects.filter(special_column=column, sender=sender)
-            if request.data.get("is_up") and not like:
-                Like.objects.create(
-                    origin=Origin.SPECIAL_COLUMN,
-                    special_column_id=pk,
-                    sender=sender,
-                    receiver=receiver,
-                    is_viewed=receiver.is_viewed(sender, "like")
-                )
-            else:
-                like = like.first()
-                like.time = datetime.datetime.now()
-                like.is_active = request.data.get("is_up") and not like.is_active
-                like.save()
+            Like.vote(Origin.SPECIAL_COLUMN, column, sender, receiver, request.data.get("is_up"))
 
         return APIResponse(response_code.SUCCESS_VOTE_COLUMN, "评价成功")
 
 
-class CommentView(APIModelViewSet):
+class CommentView(AsyncReadMixin, APIModelViewSet):
     authentication_classes = [CommonJwtAuthentication]
+    pagination_class = CursorPag
     queryset = Comment.objects.filter(
         is_active=True,
         parent_id=None,
@@ -196,27 +162,12 @@ class CommentView(APIModelViewSet):
         receiver = comment.author
         sender = request.user
         if receiver != sender and receiver.message_setting.like:
-            like = Like.objects.filter(origin=Origin.SPECIAL_COMMENT, special_comment=comment, sender=sender)
-            if request.data.get("is_up") and not like:
-                Like.objects.create(
-                    origin=Origin.SPECIAL_COMMENT,
-                    special_comment_id=pk,
-                    sender=sender,
-                    receiver=receiver,
-                    is_viewed=receiver.is_viewed(sender, "like")
-                )
-            else:
-                like = like.first()
-                like.time = datetime.datetime.now()
-                like.is_active = request.data.get("is_up") and not like.is_active
-                like.save()
+            Like.vote(Origin.SPECIAL_COMMENT, comment, sender, receiver, request.data.get("is_up"))
 
         return APIResponse(response_code.SUCCESS_VOTE_COMMENT, "评价成功")
 
     def after_create(self, instance: Comment, request, *args, **kwargs):
-        instance.column.comment_num += 1
-        instance.column.comment_time = datetime.datetime.now()
-        instance.column.save()
+        column_counter.add(instance.column_id, comment_num=1, comment_time=datetime.datetime.now())
 
         receiver = instance.column.author
         sender = request.user
@@ -231,25 +182,10 @@ class CommentView(APIModelViewSet):
             )
 
         if request.data.get("share"):
-            follower_list = request.user.follow_me.exclude(
-                follower__message_setting__dynamic=0,
-            ).filter(
-                ~Q(follower_id__in=request.user.black_me_set)
-            ).all()
-
-            create_data = map(lambda follower: Dynamic(
-                sender=request.user,
-                receiver=follower.follower,
-                origin=Origin.SPECIAL_COMMENT,
-                special_comment=instance,
-                is_viewed=follower.follower.message_setting.dynamic == MessageSetting.IGNORE,
-            ), follower_list)
-
-            Dynamic.objects.bulk_create(create_data)
+            fanout.enqueue(request.user, Origin.SPECIAL_COMMENT, instance)
 
     def after_destroy(self, instance: Comment, request, *args, **kwargs):
-        instance.column.comment_num -= 1 + instance.comment_num
-        instance.column.save()
+        column_counter.add(instance.column_id, comment_num=-1 - instance.comment_num)
 
         Dynamic.handle_delete(instance, Origin.SPECIAL_COMMENT)
         Like.handle_delete(instance, Origin.SPECIAL_COMMENT)
@@ -257,7 +193,7 @@ class CommentView(APIModelViewSet):
         At.handle_delete(instance, Origin.SPECIAL_COMMENT)
 
 
-class ChildrenCommentView(APIModelViewSet):
+class ChildrenCommentView(AsyncReadMixin, APIModelViewSet):
     authentication_classes = [CommonJwtAuthentication]
     queryset = Comment.objects.filter(
         is_active=True,
@@ -287,11 +223,8 @@ class ChildrenCommentView(APIModelViewSet):
         request.data["parent_id"] = kwargs.pop("parent_id", None)
 
     def after_create(self, instance: Comment, request, *args, **kwargs):
-        instance.column.comment_num += 1
-        instance.column.comment_time = datetime.datetime.now()
-        instance.column.save()
-        instance.parent.comment_num += 1
-        instance.parent.save()
+        column_counter.add(instance.column_id, comment_num=1, comment_time=datetime.datetime.now())
+        comment_counter.add(instance.parent_id, comment_num=1)
 
         receiver = instance.target.author if instance.target else instance.parent.author
         sender = request.user
@@ -306,27 +239,11 @@ class ChildrenCommentView(APIModelViewSet):
             )
 
         if request.data.get("share"):
-            follower_list = request.user.follow_me.exclude(
-                follower__message_setting__dynamic=0,
-            ).filter(
-                ~Q(follower_id__in=request.user.black_me_set)
-            ).all()
-
-            create_data = map(lambda follower: Dynamic(
-                sender=request.user,
-                receiver=follower.follower,
-                origin=Origin.SPECIAL_COMMENT,
-                special_comment=instance,
-                is_viewed=follower.follower.message_setting.dynamic == MessageSetting.IGNORE,
-            ), follower_list)
-
-            Dynamic.objects.bulk_create(create_data)
+            fanout.enqueue(request.user, Origin.SPECIAL_COMMENT, instance)
 
     def after_destroy(self, instance: Comment, request, *args, **kwargs):
-        instance.column.comment_num -= 1
-        instance.column.save()
-        instance.parent.comment_num -= 1
-        instance.parent.save()
+        column_counter.add(instance.column_id, comment_num=-1)
+        comment_counter.add(instance.parent_id, comment_num=-1)
 
         Dynamic.handle_delete(instance, Origin.SPECIAL_COMMENT)
         Like.handle_delete(instance, Origin.SPECIAL_COMMENT)
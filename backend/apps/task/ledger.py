@@ -0,0 +1,97 @@
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from redis.exceptions import RedisError
+
+from backend.libs.function.get import getDate
+from backend.libs.wraps.logger import log
+from backend.utils.Redis import DailyLedger
+from backend.utils.Redis.principal import bump_principal
+from user.models import User, user_counter, experience_board
+from .models import Daily
+
+
+def load(user_id, date):
+    return Daily.objects.filter(user_id=user_id, date=date).values(*Daily.T).first() or {}
+
+
+daily_ledger = DailyLedger("task", Daily.REWARD, load)
+
+
+def add_task(user_id, task):
+    """
+    记录一次任务，未达当日上限时奖励经验
+    :return: 是否获得奖励
+    """
+    if not user_id:
+        return False
+
+    today = getDate()
+    try:
+        if daily_ledger.add(int(user_id), task, today):
+            experience_board.incr(user_id, Daily.REWARD[task][1])
+            return True
+        return False
+    except RedisError as e:
+        log.warning(f"每日任务台账不可用:{str(e)}")
+
+    if exp := Daily.add(user_id, task, today):
+        user_counter.add(user_id, experience=exp)
+        return True
+    return False
+
+
+def get_tasks(user_id):
+    """
+    :return: {任务: 当日次数}
+    """
+    today = getDate()
+    try:
+        return daily_ledger.get(user_id, today)
+    except RedisError as e:
+        log.warning(f"每日任务台账不可用:{str(e)}")
+    data = load(user_id, today)
+    return {task: data.get(task, 0) for task in Daily.T}
+
+
+def flush(batch=500):
+    """
+    将昨天与今天的台账写回task_daily与用户经验，返回写回的用户数
+    经验按台账次数与加锁读取的数据库次数之差计算，重复写回同一批台账不会重复奖励
+    """
+    today = getDate()
+    flushed = 0
+    for date in (today - 1, today):
+        for counts in daily_ledger.drain(date, batch):
+            exp = {}
+            with transaction.atomic():
+                records = {i.user_id: i for i in Daily.objects.select_for_update().filter(
+                    date=date, user_id__in=list(counts)
+                )}
+                create_data, update_data = [], []
+                for user_id, data in counts.items():
+                    record = records.get(user_id)
+                    n = 0
+                    for task, count in data.items():
+                        saved = getattr(record, task) if record else 0
+                        n += max(count - saved, 0) * Daily.REWARD[task][1]
+                        data[task] = max(count, saved)
+                    if n:
+                        exp[user_id] = n
+
+                    if record:
+                        for task, count in data.items():
+                            setattr(record, task, count)
+                        update_data.append(record)
+                    else:
+                        create_data.append(Daily(user_id=user_id, date=date, **data))
+                Daily.objects.bulk_update(update_data, Daily.T)
+                Daily.objects.bulk_create(create_data)
+
+                if exp:
+                    User.objects.filter(id__in=list(exp)).update(experience=F("experience") + Case(
+                        *[When(id=user_id, then=Value(n)) for user_id, n in exp.items()], default=Value(0)
+                    ))
+
+            bump_principal(list(exp))
+            flushed += len(counts)
+    return flushed
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from task.ledger import flush
+
+
+class Command(BaseCommand):
+    help = "将redis中的每日任务台账批量写回task_daily与用户经验"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=500, help="每批写回的用户数")
+        parser.add_argument("--interval", type=int, default=0, help="循环执行间隔(秒)，为0时只执行一次")
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        while True:
+            self.stdout.write(f"写回{flush(options['batch'])}名用户的每日任务")
+
+            if not interval:
+                break
+            time.sleep(interval)
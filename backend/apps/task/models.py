@@ -1,5 +1,6 @@
 from backend.libs.wraps.models import APIModel, models
 from django.core.validators import MaxValueValidator
+from django.db.models import F
 
 
 # Create your models here.
@@ -30,64 +31,33 @@ class Daily(APIModel):
     stared = models.IntegerField(default=0, validators=[MaxValueValidator(10)], verbose_name="被收藏")
     date = models.IntegerField(default=0, verbose_name="日期")
 
-    def add(self, task):
-        if task == "sign" and self.sign < 1:
-            self.sign += 1
-            self.user.experience += 50
-            self.user.save()
-            self.save()
-
-        if task == "bbs_post" and self.bbs_post < 2:
-            self.bbs_post += 1
-            self.user.experience += 20
-            self.user.save()
-            self.save()
-
-        if task == "column_post" and self.column_post < 5:
-            self.column_post += 1
-            self.user.experience += 50
-            self.user.save()
-            self.save()
-
-        if task == "answer_adopted" and self.answer_adopted < 5:
-            self.answer_adopted += 1
-            self.user.experience += 50
-            self.user.save()
-            self.save()
-
-        if task == "comment" and self.comment < 10:
-            self.comment += 1
-            self.user.experience += 10
-            self.user.save()
-            self.save()
-
-        if task == "like" and self.like < 10:
-            self.like += 1
-            self.user.experience += 5
-            self.user.save()
-            self.save()
-
-        if task == "comment_liked" and self.comment_liked < 10:
-            self.comment_liked += 1
-            self.user.experience += 10
-            self.user.save()
-            self.save()
-
-        if task == "post_liked" and self.post_liked < 10:
-            print(1)
-            self.post_liked += 1
-            self.user.experience += 10
-            self.user.save()
-            self.save()
-
-        if task == "commented" and self.commented < 10:
-            self.commented += 1
-            self.user.experience += 20
-            self.user.save()
-            self.save()
-
-        if task == "stared" and self.stared < 10:
-            self.stared += 1
-            self.user.experience += 20
-            self.user.save()
-            self.save()
+    # 每项任务的每日上限与每次奖励的经验
+    REWARD = {
+        "sign": (1, 50),
+        "bbs_post": (2, 20),
+        "column_post": (5, 50),
+        "answer_adopted": (5, 50),
+        "comment": (10, 10),
+        "like": (10, 5),
+        "comment_liked": (10, 10),
+        "post_liked": (10, 10),
+        "commented": (10, 20),
+        "stared": (10, 20),
+    }
+
+    class Meta:
+        index_together = ("user", "date")
+
+    @classmethod
+    def add(cls, user_id, task, date):
+        """
+        redis不可用时直接在数据库中计数，上限由条件UPDATE保证
+        :return: 获得的经验，已达上限时为0
+        """
+        limit, exp = cls.REWARD[task]
+        record = cls.objects.filter(user_id=user_id, date=date).first()
+        if not record:
+            record = cls.objects.create(user_id=user_id, date=date)
+        if cls.objects.filter(id=record.id, **{f"{task}__lt": limit}).update(**{task: F(task) + 1}):
+            return exp
+        return 0
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from user.models import User
+from user.management.commands.warm_graph_cache import RELATIONS
+
+
+class Command(BaseCommand):
+    help = "检查redis中的用户关系集合与数据库是否一致"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk", type=int, default=500, help="每批检查的用户数")
+        parser.add_argument("--fix", action="store_true", help="重新加载不一致的集合")
+
+    def handle(self, *args, **options):
+        chunk = options["chunk"]
+        fix = options["fix"]
+        broken = 0
+        last = 0
+        while user_ids := list(
+                User.objects.filter(id__gt=last).order_by("id").values_list("id", flat=True)[:chunk]
+        ):
+            for cache, *_ in RELATIONS:
+                for user_id in user_ids:
+                    result = cache.check(user_id)
+                    if result is None or not any(result):
+                        continue
+
+                    broken += 1
+                    extra, missing = result
+                    self.stdout.write(f"{cache.name}:{user_id} 多出{sorted(extra)} 缺少{sorted(missing)}")
+                    if fix:
+                        cache.load(user_id, replace=True)
+
+            last = user_ids[-1]
+
+        self.stdout.write(f"发现{broken}个不一致的关系集合" + ("，已修复" if fix and broken else ""))
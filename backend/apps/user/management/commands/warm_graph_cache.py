@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from user.models import User, Follow, BlackList, my_follow_graph, follow_me_graph, my_black_graph, black_me_graph
+
+RELATIONS = [
+    (my_follow_graph, Follow, "follower_id", "followed_id"),
+    (follow_me_graph, Follow, "followed_id", "follower_id"),
+    (my_black_graph, BlackList, "blacker_id", "blacked_id"),
+    (black_me_graph, BlackList, "blacked_id", "blacker_id"),
+]
+
+
+class Command(BaseCommand):
+    help = "批量加载用户关注与拉黑关系到redis"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk", type=int, default=500, help="每批加载的用户数")
+
+    def handle(self, *args, **options):
+        chunk = options["chunk"]
+        total = 0
+        last = 0
+        while user_ids := list(
+                User.objects.filter(id__gt=last).order_by("id").values_list("id", flat=True)[:chunk]
+        ):
+            for cache, model, owner, member in RELATIONS:
+                versions = cache.versions(user_ids)
+                data = {i: set() for i in user_ids}
+                for user_id, other_id in model.objects.filter(**{f"{owner}__in": user_ids}).values_list(owner, member):
+                    data[user_id].add(other_id)
+                cache.load_many(data, versions)
+
+            total += len(user_ids)
+            last = user_ids[-1]
+
+        self.stdout.write(f"已加载{total}个用户的关系集合")
@@ -1,8 +1,14 @@
+import datetime
+
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
 from message.models import MessageSetting
-from backend.libs.function.get import getDate
-from task.models import Daily
+from backend.utils.Redis.graph import RelationCache
+from backend.utils.Redis.counter import Counter
+from backend.utils.Redis.leaderboard import Leaderboard
+from backend.utils.Redis.principal import (
+    get_principal, store_principal, get_permissions, store_permissions, bump_principal
+)
 
 
 class User(AbstractUser):
@@ -41,6 +47,9 @@ class User(AbstractUser):
         through_fields=('user', 'permission'),
     )
 
+    # 由user_counter以update()更新的字段，不触发post_save，不放入认证快照
+    COUNTER_FIELDS = ("experience", "fans_num", "attention_num", "up_num")
+
     def __init__(self, *args, **kwargs):
         self._permission_set = None
         self._my_black_set = None
@@ -52,15 +61,80 @@ class User(AbstractUser):
     @property
     def permission_set(self):
         if self._permission_set is None:
-            a = []
-            for i in self.permission.filter(is_active=True).all():
-                a.append(i.description)
-            for i in self.group.filter(is_active=True).all():
-                for j in i.permission.filter(is_active=True).all():
-                    a.append(j.description)
-            self._permission_set = set(a) if a else set()
+            self._permission_set = self.get_permission_sets([self.id]).get(self.id, set())
         return self._permission_set
 
+    @classmethod
+    def get_permission_sets(cls, user_ids):
+        """
+        批量获取用户权限集合，优先读取缓存，未命中的用户以一次查询展开
+        :return: {用户id: 权限集合}
+        """
+        user_ids = list(set(filter(None, user_ids)))
+        if not user_ids:
+            return {}
+
+        hits, misses = get_permissions(user_ids)
+        if misses:
+            resolved = Permission.resolve(list(misses))
+            store_permissions(resolved, misses)
+            hits.update(resolved)
+        return hits
+
+    @classmethod
+    def check_permissions(cls, user_ids, *permissions):
+        """
+        批量检查用户是否拥有全部给定权限
+        :return: {用户id: bool}
+        """
+        permissions = set(permissions)
+        return {k: permissions <= v for k, v in cls.get_permission_sets(user_ids).items()}
+
+    def snapshot(self):
+        """
+        认证缓存中保存的用户快照：数据库字段与权限集合，以JSON保存，时间字段转为isoformat
+        关注、拉黑集合由关系缓存维护，计数字段由计数器直接更新，均不在快照中
+        """
+        fields = {}
+        for f in self._meta.concrete_fields:
+            if f.attname in self.COUNTER_FIELDS:
+                continue
+            value = getattr(self, f.attname)
+            fields[f.attname] = value.isoformat() if isinstance(value, datetime.datetime) else value
+        return {"fields": fields, "permission": list(self.permission_set)}
+
+    @classmethod
+    def from_snapshot(cls, data):
+        """
+        计数字段作为延迟字段，访问时从数据库读取
+        """
+        fields = {
+            f.attname: f.to_python(data["fields"][f.attname])
+            for f in cls._meta.concrete_fields if f.attname not in cls.COUNTER_FIELDS
+        }
+        user = cls.from_db(cls.objects.db, list(fields), list(fields.values()))
+        user._permission_set = set(data["permission"])
+        return user
+
+    @classmethod
+    def get_principal(cls, user_id, username):
+        """
+        认证时使用的用户，快照缓存有效时不访问数据库
+        用户、密码、权限或权限组变动时快照失效
+        """
+        data, version = get_principal(user_id)
+        if data is not None:
+            user = cls.from_snapshot(data)
+        else:
+            user = cls.objects.filter(pk=user_id).first()
+            if user is None:
+                return None
+            store_principal(user_id, version, user.snapshot())
+
+        if user.get_username() != username:
+            return None
+        return user
+
     def has_permission(self, permission):
         return permission in self.permission_set
 
@@ -75,58 +149,64 @@ class User(AbstractUser):
     @property
     def my_black_set(self):
         if self._my_black_set is None:
-            if self.is_anonymous:
-                self._my_black_set = set()
-            else:
-                self._my_black_set = set(map(lambda x: x[0], self.my_black.values_list('blacked'))) or set()
+            self._my_black_set = my_black_graph.members(self.id)
         return self._my_black_set
 
     @property
     def black_me_set(self):
         if self._black_me_set is None:
-            if self.is_anonymous:
-                self._black_me_set = set()
-            else:
-                self._black_me_set = set(map(lambda x: x[0], self.black_me.values_list('blacker'))) or set()
+            self._black_me_set = black_me_graph.members(self.id)
         return self._black_me_set
 
     @property
     def my_follow_set(self):
         if self._my_follow_set is None:
-            if self.is_anonymous:
-                self._my_follow_set = set()
-            else:
-                self._my_follow_set = set(map(lambda x: x[0], self.my_follow.values_list('followed'))) or set()
+            self._my_follow_set = my_follow_graph.members(self.id)
         return self._my_follow_set
 
     @property
     def follow_me_set(self):
         if self._follow_me_set is None:
-            if self.is_anonymous:
-                self._follow_me_set = set()
-            else:
-                self._follow_me_set = set(map(lambda x: x[0], self.follow_me.values_list('follower'))) or set()
+            self._follow_me_set = follow_me_graph.members(self.id)
         return self._follow_me_set
 
+    def is_following(self, user_id):
+        if self._my_follow_set is not None:
+            return user_id in self._my_follow_set
+        return my_follow_graph.contains(self.id, user_id)
+
+    def is_followed_by(self, user_id):
+        if self._follow_me_set is not None:
+            return user_id in self._follow_me_set
+        return follow_me_graph.contains(self.id, user_id)
+
+    def is_blacking(self, user_id):
+        if self._my_black_set is not None:
+            return user_id in self._my_black_set
+        return my_black_graph.contains(self.id, user_id)
+
+    def is_blacked_by(self, user_id):
+        if self._black_me_set is not None:
+            return user_id in self._black_me_set
+        return black_me_graph.contains(self.id, user_id)
+
+    @property
+    def dynamic_sender_set(self):
+        """
+        关注且未拉黑的用户
+        """
+        return my_follow_graph.diff(self.id, my_black_graph)
+
     def is_viewed(self, sender, category):
         setting = getattr(self.message_setting, category)
         if setting == MessageSetting.IGNORE:
             return True
 
         if setting == MessageSetting.FOLLOWED:
-            return sender.id not in self.my_follow_set - self.my_black_set
+            return not self.is_following(sender.id) or self.is_blacking(sender.id)
 
         return False
 
-    @property
-    def daily(self) -> Daily:
-        today = getDate()
-        record = Daily.objects.filter(user=self, date=today).first()
-        if not record:
-            record = Daily.objects.create(user=self, date=today)
-
-        return record
-
 
 class Metal(models.Model):
     description = models.CharField(max_length=40, null=True, default=None, verbose_name="勋章简介")
@@ -144,6 +224,28 @@ class Permission(models.Model):
     description = models.CharField(max_length=40, null=True, default=None, verbose_name="权限简介")
     is_active = models.BooleanField(default=True, verbose_name="是否有效")
 
+    @classmethod
+    def resolve(cls, user_ids):
+        """
+        展开直接授予与经权限组授予的有效权限，一次查询完成
+        :return: {用户id: 权限集合}
+        """
+        direct = UserToPermission.objects.filter(
+            user_id__in=user_ids,
+            permission__is_active=True,
+        ).values_list("user_id", "permission__description")
+        grouped = UserToGroup.objects.filter(
+            user_id__in=user_ids,
+            group__is_active=True,
+            group__grouptopermission__permission__is_active=True,
+        ).values_list("user_id", "group__grouptopermission__permission__description")
+
+        ret = {i: set() for i in user_ids}
+        for user_id, description in direct.union(grouped):
+            if description is not None:
+                ret[user_id].add(description)
+        return ret
+
 
 class UserToPermission(models.Model):
     user = models.ForeignKey(to="User", on_delete=models.DO_NOTHING)
@@ -181,18 +283,20 @@ class Follow(models.Model):
     @classmethod
     def add(cls, follower: User, followed: User):
         cls.objects.create(follower=follower, followed=followed)
-        follower.attention_num += 1
-        followed.fans_num += 1
-        follower.save()
-        followed.save()
+        transaction.on_commit(lambda: my_follow_graph.add(follower.id, followed.id))
+        transaction.on_commit(lambda: follow_me_graph.add(followed.id, follower.id))
+        user_counter.add(follower.id, attention_num=1)
+        user_counter.add(followed.id, fans_num=1)
+        transaction.on_commit(lambda: bump_principal([follower.id, followed.id]))
 
     @classmethod
     def remove(cls, follower: User, followed: User):
         cls.objects.get(follower=follower, followed=followed).delete()
-        follower.attention_num -= 1
-        followed.fans_num -= 1
-        follower.save()
-        followed.save()
+        transaction.on_commit(lambda: my_follow_graph.remove(follower.id, followed.id))
+        transaction.on_commit(lambda: follow_me_graph.remove(followed.id, follower.id))
+        user_counter.add(follower.id, attention_num=-1)
+        user_counter.add(followed.id, fans_num=-1)
+        transaction.on_commit(lambda: bump_principal([follower.id, followed.id]))
 
 
 class BlackList(models.Model):
@@ -203,7 +307,47 @@ class BlackList(models.Model):
     @classmethod
     def add(cls, blacker: User, blacked: User):
         cls.objects.create(blacker=blacker, blacked=blacked)
+        transaction.on_commit(lambda: my_black_graph.add(blacker.id, blacked.id))
+        transaction.on_commit(lambda: black_me_graph.add(blacked.id, blacker.id))
 
     @classmethod
     def remove(cls, blacker: User, blacked: User):
         cls.objects.get(blacker=blacker, blacked=blacked).delete()
+        transaction.on_commit(lambda: my_black_graph.remove(blacker.id, blacked.id))
+        transaction.on_commit(lambda: black_me_graph.remove(blacked.id, blacker.id))
+
+
+my_follow_graph = RelationCache(
+    "my_follow", lambda user_id: Follow.objects.filter(follower_id=user_id).values_list("followed_id", flat=True)
+)
+follow_me_graph = RelationCache(
+    "follow_me", lambda user_id: Follow.objects.filter(followed_id=user_id).values_list("follower_id", flat=True)
+)
+my_black_graph = RelationCache(
+    "my_black", lambda user_id: BlackList.objects.filter(blacker_id=user_id).values_list("blacked_id", flat=True)
+)
+black_me_graph = RelationCache(
+    "black_me", lambda user_id: BlackList.objects.filter(blacked_id=user_id).values_list("blacker_id", flat=True)
+)
+
+
+
+def load_board(field):
+    def loader(offset, n, scope=None):
+        return User.objects.filter(is_active=True).order_by(f"-{field}", "id").values_list(
+            "id", field
+        )[offset:offset + n]
+
+    return loader
+
+
+experience_board = Leaderboard("experience", load_board("experience"))
+up_board = Leaderboard("up_num", load_board("up_num"))
+fans_board = Leaderboard("fans_num", load_board("fans_num"))
+
+# 获赞数变动频繁，增量缓冲在redis中由flush_counters命令写回
+user_counter = Counter("user", User, buffered=("up_num",), boards={
+    "experience": experience_board,
+    "up_num": up_board,
+    "fans_num": fans_board,
+})
@@ -167,7 +167,7 @@ class ResetPasswordSerializer(EmptySerializer):
 
         user = instance.filter(phone=phone).first()
         user.set_password(password)
-        user.save()
+        user.save(update_fields=["password"])
         return user
 
 
@@ -204,7 +204,7 @@ class ChangePasswordSerializer(EmptySerializer):
 
     def update(self, instance, validated_data):
         instance.set_password(validated_data.get("new_password"))
-        instance.save()
+        instance.save(update_fields=["password"])
         return instance
 
 
@@ -240,7 +240,7 @@ class BindPhoneView(EmptySerializer):
         phone = validated_data.get("phone")
 
         instance.phone = phone
-        instance.save()
+        instance.save(update_fields=["phone"])
 
         return instance
 
@@ -275,7 +275,7 @@ class UnbindPhoneView(EmptySerializer):
 
     def update(self, instance, validated_data):
         instance.phone = None
-        instance.save()
+        instance.save(update_fields=["phone"])
 
         return instance
 
@@ -300,7 +300,7 @@ class UserInfoSerializer(EmptySerializer):
             instance.username = username
         if description:
             instance.description = description
-        instance.save()
+        instance.save(update_fields=["username", "description"])
 
         return instance
 
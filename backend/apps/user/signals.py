@@ -0,0 +1,53 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+
+from backend.utils.Redis.principal import bump_principal
+from .models import User, UserToPermission, UserToGroup, GroupToPermission, Group, Permission
+
+
+def bump(user_ids=None):
+    transaction.on_commit(lambda: bump_principal(user_ids))
+
+
+def user_changed(sender, instance, **kwargs):
+    bump([instance.id])
+
+
+def membership_changed(sender, instance, **kwargs):
+    bump([instance.user_id])
+
+
+def definition_changed(sender, instance, **kwargs):
+    bump()
+
+
+def user_m2m_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        bump([instance.id])
+    elif pk_set:
+        bump(list(pk_set))
+    else:
+        bump()
+
+
+def group_m2m_changed(sender, action, **kwargs):
+    if action.startswith("post_"):
+        bump()
+
+
+for model, receiver in [
+    (User, user_changed),
+    (UserToPermission, membership_changed),
+    (UserToGroup, membership_changed),
+    (GroupToPermission, definition_changed),
+    (Group, definition_changed),
+    (Permission, definition_changed),
+]:
+    post_save.connect(receiver, sender=model)
+    post_delete.connect(receiver, sender=model)
+
+m2m_changed.connect(user_m2m_changed, sender=User.permission.through)
+m2m_changed.connect(user_m2m_changed, sender=User.group.through)
+m2m_changed.connect(group_m2m_changed, sender=Group.permission.through)
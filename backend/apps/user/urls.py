@@ -9,6 +9,7 @@ router.register("self", UserInfoView, "user_info")
 router.register("info", OtherUserView, "")
 router.register("follow", FollowView, "follow")
 router.register("black_list", BlackListView, "black_list")
+router.register("leaderboard", LeaderboardView, "leaderboard")
 
 urlpatterns = [
     path("", include(router.urls))
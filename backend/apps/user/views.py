@@ -7,17 +7,20 @@ from rest_framework.decorators import action
 from .serializers import *
 from backend.libs.wraps.response import UserInfoResponse, APIResponse
 from backend.libs.wraps.authenticators import CommonJwtAuthentication, UserInfoAuthentication
-from backend.libs.wraps.views import APIModelViewSet, Pag
+from backend.libs.wraps.views import APIModelViewSet, AsyncReadMixin, Pag
 from backend.utils.COS import *
 from backend.libs.scripts.sql import post_sql, comment_sql
 from bbs.serializers import (
-    Article, ArticleSerializer, Comment as BBSComment, SelfCommentSerializer as BBSCommentSerializer
+    post_board, Article, ArticleSerializer, Comment as BBSComment, SelfCommentSerializer as BBSCommentSerializer
 )
 from special.serializers import (
     Column, ColumnSerializer, Comment as SpecialComment, SelfCommentSerializer as SpecialCommentSerializer
 )
 from issue.serializers import IssueComment, SelfCommentSerializer as IssueCommentSerializer
+from message.unread import get_user_unread
 from backend.libs.function.get import getOrder
+from backend.libs.wraps.serializers import SimpleAuthorSerializer
+from backend.utils.Redis.leaderboard import PERIODS
 
 
 class SignView(ViewSet):
@@ -42,12 +45,12 @@ class SignView(ViewSet):
         ser.is_valid(True)
         user = ser.context["user"]
         user.last_login = datetime.datetime.now()
-        user.save()
+        user.save(update_fields=["last_login"])
 
         return UserInfoResponse(user, response_code.SUCCESS_LOGIN, "登录成功")
 
 
-class UserInfoView(ViewSet):
+class UserInfoView(AsyncReadMixin, ViewSet):
     def get_authenticators(self):
         if self.request.META.get("PATH_INFO") == "/user/reset_password/":
             return None
@@ -56,6 +59,7 @@ class UserInfoView(ViewSet):
     @action(["GET", "POST"], False)
     def info(self, request):
         if request.method == "GET":
+            request.user.refresh_from_db(fields=User.COUNTER_FIELDS)
             return UserInfoResponse(request.user, response_code.SUCCESS_GET_USER_INFO, "成功获取用户信息")
         else:
             ser = UserInfoSerializer(request.user, request.data)
@@ -63,6 +67,7 @@ class UserInfoView(ViewSet):
             ser.is_valid(True)
 
             user = ser.save()
+            user.refresh_from_db(fields=User.COUNTER_FIELDS)
             return UserInfoResponse(user, response_code.SUCCESS_POST_USER_INFO, "成功修改用户信息")
 
     @action(["POST"], False)
@@ -123,7 +128,7 @@ class UserInfoView(ViewSet):
         path = f"icon/{user.id}.{form}"
         if user.icon != path:
             user.icon = path
-            user.save()
+            user.save(update_fields=["icon"])
         put_obj(file, path)
         return APIResponse(response_code.SUCCESS_CHANGE_ICON, "修改头像成功")
 
@@ -225,42 +230,7 @@ class UserInfoView(ViewSet):
 
     @action(["GET"], False)
     def message(self, request):
-        data = {
-            "dynamic": request.user.dynamic_me.all().filter(
-                is_active=True,
-                is_viewed=False,
-                sender__is_active=True,
-                receiver__is_active=True,
-            ).count(),
-            "at": request.user.at_me.all().filter(
-                is_active=True,
-                is_viewed=False,
-                sender__is_active=True,
-                receiver__is_active=True,
-            ).count(),
-            "private": request.user.private_me.all().filter(
-                is_active=True,
-                is_viewed=False,
-                sender__is_active=True,
-                receiver__is_active=True,
-            ).count(),
-            "system": request.user.system_me.all().filter(
-                is_active=True,
-                is_viewed=False,
-            ).count(),
-            "like": request.user.like_me.all().filter(
-                is_active=True,
-                is_viewed=False,
-                sender__is_active=True,
-                receiver__is_active=True,
-            ).count(),
-            "reply": request.user.reply_me.all().filter(
-                is_active=True,
-                is_viewed=False,
-                sender__is_active=True,
-                receiver__is_active=True,
-            ).count(),
-        }
+        data = get_user_unread(request.user.id)
         return APIResponse(response_code.SUCCESS_GET_MESSAGE_SUM, "成功获取消息", data)
 
 
@@ -335,7 +305,7 @@ class FollowView(ViewSet):
             followed__username__icontains=name,
         ).exclude(
             followed__in=request.user.my_black_set
-        ).order_by(
+        ).select_related("followed").prefetch_related("followed__metal").order_by(
             "-create_time"
         )
         pag = Pag()
@@ -350,7 +320,7 @@ class FollowView(ViewSet):
             follower__username__icontains=name,
         ).exclude(
             follower__in=request.user.my_black_set
-        ).order_by(
+        ).select_related("follower").prefetch_related("follower__metal").order_by(
             "-create_time"
         )
         pag = Pag()
@@ -391,7 +361,9 @@ class BlackListView(APIModelViewSet):
 
     def list(self, request, *args, **kwargs):
         name = request.query_params.get("name", "")
-        instance = request.user.my_black.all().filter(blacked__username__icontains=name).order_by("-create_time")
+        instance = request.user.my_black.all().filter(blacked__username__icontains=name).select_related(
+            "blacked"
+        ).prefetch_related("blacked__metal").order_by("-create_time")
         pag = Pag()
         paged_instance = pag.paginate_queryset(instance, request, view=self)
         ser = BlackListSerializer(paged_instance, many=True, context={"view": self, "request": request})
@@ -423,3 +395,48 @@ class BlackListView(APIModelViewSet):
 
         BlackList.remove(request.user, user.first())
         return APIResponse(response_code.SUCCESS_NOT_BLACKED, "已取消拉黑")
+
+
+class LeaderboardView(ViewSet):
+    authentication_classes = [UserInfoAuthentication]
+    boards = {
+        "experience": experience_board,
+        "up_num": up_board,
+        "fans_num": fans_board,
+        "bbs_post": post_board,
+    }
+    max_limit = 100
+
+    def list(self, request):
+        board = self.boards.get(request.query_params.get("board"))
+        period = request.query_params.get("period", "all")
+        if board is None or period not in PERIODS:
+            return APIResponse(response_code.INVALID_PARAMS, "参数错误")
+
+        scope = None
+        if board is post_board:
+            scope = request.query_params.get("category_id", "").strip()
+            if not scope.isdigit():
+                return APIResponse(response_code.INVALID_PARAMS, "参数错误")
+
+        try:
+            offset = max(int(request.query_params.get("offset", 0)), 0)
+            limit = min(max(int(request.query_params.get("limit", 20)), 1), self.max_limit)
+        except ValueError:
+            return APIResponse(response_code.INVALID_PARAMS, "参数错误")
+        items = board.top(limit, period, scope, offset)
+        users = User.objects.filter(id__in=[i for i, _ in items], is_active=True).in_bulk()
+
+        ret = {
+            "rank": [{
+                "rank": offset + i + 1,
+                "score": score,
+                "user": SimpleAuthorSerializer(users[user_id]).data,
+            } for i, (user_id, score) in enumerate(items) if user_id in users],
+            "self": None,
+        }
+        if not request.user.is_anonymous:
+            rank, score = board.rank(request.user.id, period, scope)
+            ret["self"] = {"rank": rank, "score": score}
+
+        return APIResponse(response_code.SUCCESS_GET_LEADERBOARD, "成功获取排行榜", ret)
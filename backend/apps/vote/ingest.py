@@ -0,0 +1,53 @@
+from redis.exceptions import RedisError
+
+from backend.libs.wraps.logger import log
+from backend.utils.Redis import SubmissionQueue
+from .models import VoteToUser
+
+vote_queue = SubmissionQueue(
+    "vote", lambda vote_id: VoteToUser.objects.filter(vote_id=vote_id).values_list("user_id", flat=True)
+)
+
+
+def submit(vote_id, user_id, selected):
+    """
+    提交投票，redis可用时去重后入队由flush_votes命令批量写入，否则直接在事务中写入
+    :return: 是否为首次投票
+    """
+    try:
+        return vote_queue.claim(vote_id, user_id, selected)
+    except RedisError as e:
+        log.warning(f"投票队列不可用:{str(e)}")
+    return VoteToUser.record(vote_id, user_id, selected)
+
+
+def get_pending(vote_id, user_id):
+    """
+    :return: 尚未写回的投票选项，无则为None
+    """
+    try:
+        return vote_queue.pending(vote_id, user_id)
+    except RedisError:
+        return None
+
+
+def has_pending(vote_id):
+    """
+    是否仍有尚未写回的投票，redis不可用时无法确认，按有处理
+    """
+    try:
+        return vote_queue.has_pending(vote_id)
+    except RedisError as e:
+        log.warning(f"投票队列不可用:{str(e)}")
+        return True
+
+
+def flush(batch=500):
+    """
+    将队列中的投票批量写入数据库，返回写入的投票数
+    """
+    flushed = 0
+    for items in vote_queue.drain(batch):
+        flushed += VoteToUser.bulk_record(items)
+        vote_queue.ack(items)
+    return flushed
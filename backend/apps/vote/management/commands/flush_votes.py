@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from vote.ingest import flush
+
+
+class Command(BaseCommand):
+    help = "将redis队列中的投票批量写入数据库"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=500, help="每批写入的投票数")
+        parser.add_argument("--interval", type=int, default=0, help="循环执行间隔(秒)，为0时只执行一次")
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        while True:
+            count = flush(options["batch"])
+            if count:
+                self.stdout.write(f"写入{count}条投票")
+
+            if not interval:
+                break
+            time.sleep(interval)
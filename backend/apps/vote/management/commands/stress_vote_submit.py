@@ -0,0 +1,63 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.db.models import Count
+
+from user.models import User
+from vote.ingest import flush, submit
+from vote.models import Vote, VoteChoice, VoteToUser, ChoiceToUser
+
+
+class Command(BaseCommand):
+    help = "以大量并发提交检查投票是否会重复写入，会真实写入投票记录，仅用于测试环境"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--vote", type=int, required=True, help="投票id")
+        parser.add_argument("--users", type=int, default=200, help="参与提交的用户数")
+        parser.add_argument("--repeat", type=int, default=5, help="每个用户重复提交的次数")
+        parser.add_argument("--concurrency", type=int, default=50, help="并发数")
+        parser.add_argument("--direct", action="store_true", help="不经过redis队列，直接写入数据库")
+
+    def handle(self, *args, **options):
+        vote = Vote.objects.filter(id=options["vote"]).first()
+        if not vote:
+            raise CommandError("投票不存在")
+        if not options["direct"]:
+            flush()
+        choice_ids = list(VoteChoice.objects.filter(vote=vote).values_list("id", flat=True))
+        user_ids = list(User.objects.filter(is_active=True).order_by("id").values_list("id", flat=True)[:options["users"]])
+        voted = set(VoteToUser.objects.filter(vote=vote).values_list("user_id", flat=True))
+
+        def run(user_id):
+            close_old_connections()
+            try:
+                selected = random.sample(choice_ids, random.randint(max(vote.min_num, 1), vote.max_num))
+                if options["direct"]:
+                    return VoteToUser.record(vote.id, user_id, selected)
+                return submit(vote.id, user_id, selected)
+            finally:
+                close_old_connections()
+
+        jobs = user_ids * options["repeat"]
+        random.shuffle(jobs)
+        with ThreadPoolExecutor(options["concurrency"]) as executor:
+            accepted = sum(executor.map(run, jobs))
+        flushed = 0 if options["direct"] else flush()
+
+        expected = len(set(user_ids) - voted)
+        vote_dup = VoteToUser.objects.filter(vote=vote).values("user_id").annotate(n=Count("id")).filter(n__gt=1).count()
+        choice_dup = ChoiceToUser.objects.filter(choice__vote=vote).values("choice_id", "user_id").annotate(
+            n=Count("id")
+        ).filter(n__gt=1).count()
+        counted = dict(ChoiceToUser.objects.filter(choice__vote=vote).values("choice_id").annotate(
+            n=Count("id")
+        ).values_list("choice_id", "n"))
+        mismatch = [i for i, n in VoteChoice.objects.filter(vote=vote).values_list("id", "num") if counted.get(i, 0) != n]
+
+        self.stdout.write(f"提交{len(jobs)}次，接受{accepted}次(应为{expected})，队列写入{flushed}条")
+        self.stdout.write(f"重复投票记录: {vote_dup}  重复选项记录: {choice_dup}  票数不一致的选项: {mismatch}")
+        if accepted != expected or vote_dup or choice_dup or mismatch:
+            raise CommandError("检查未通过")
+        self.stdout.write("检查通过")
@@ -1,5 +1,14 @@
+import datetime
+import json
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Value, When
+
 from backend.libs.wraps.models import APIModel, models
 
+# 投票结束后延迟固化结果，等待截止前开始的提交完成
+FREEZE_DELAY = datetime.timedelta(minutes=1)
+
 
 class Vote(APIModel):
     title = models.CharField(max_length=128, verbose_name="题目")
@@ -20,11 +29,34 @@ class Vote(APIModel):
         related_name="my_vote"
     )
 
+    def can_show(self, user, voted=False):
+        """
+        是否可查看结果
+        :param voted: 已知用户投过票时跳过查询
+        """
+        if not self.need_vote or voted or self.end_time < datetime.datetime.now():
+            return True
+        if user.is_anonymous:
+            return False
+        return VoteToUser.objects.filter(vote=self, user=user).exists()
+
+    def get_tally(self):
+        """
+        各选项票数，总数由同一次查询的结果求和，保证与各选项一致；
+        投票结束并超过FREEZE_DELAY、且队列中的投票均已写回后固化为VoteResult，之后只读取结果行
+        :return: {选项id: 票数}
+        """
+        if self.end_time + FREEZE_DELAY < datetime.datetime.now():
+            if result := VoteResult.objects.filter(vote=self).first() or VoteResult.freeze(self):
+                return result.get_tally()
+        return dict(VoteChoice.objects.filter(vote=self).values_list("id", "num"))
+
 
 class VoteChoice(APIModel):
     content = models.CharField(max_length=128, verbose_name="选项")
 
     vote = models.ForeignKey(to="Vote", on_delete=models.DO_NOTHING, default=None, verbose_name="对应投票")
+    num = models.IntegerField(default=0, verbose_name="票数")
 
     voter = models.ManyToManyField(
         to="user.User",
@@ -38,7 +70,91 @@ class VoteToUser(APIModel):
     user = models.ForeignKey(to="user.User", on_delete=models.DO_NOTHING)
     vote_time = models.DateTimeField(auto_now_add=True, verbose_name="投票时间")
 
+    class Meta:
+        unique_together = ("vote", "user")
+
+    @classmethod
+    def record(cls, vote_id, user_id, selected):
+        """
+        在一个事务中写入投票记录、选项记录与选项票数，由唯一约束保证不重复投票
+        :return: 是否写入
+        """
+        try:
+            with transaction.atomic():
+                cls.objects.create(vote_id=vote_id, user_id=user_id)
+                ChoiceToUser.objects.bulk_create([ChoiceToUser(user_id=user_id, choice_id=i) for i in selected])
+                VoteChoice.objects.filter(id__in=selected).update(num=F("num") + 1)
+        except IntegrityError:
+            return False
+        return True
+
+    @classmethod
+    def bulk_record(cls, items):
+        """
+        批量写入[(投票id, 用户id, 选项id列表)]，已存在的投票记录跳过
+        :return: 写入的投票数
+        """
+        with transaction.atomic():
+            existing = set(cls.objects.filter(
+                vote_id__in={vote_id for vote_id, _, _ in items},
+                user_id__in={user_id for _, user_id, _ in items},
+            ).values_list("vote_id", "user_id"))
+
+            records = {}
+            for vote_id, user_id, selected in items:
+                if (vote_id, user_id) not in existing:
+                    records.setdefault((vote_id, user_id), selected)
+            if not records:
+                return 0
+
+            cls.objects.bulk_create([
+                cls(vote_id=vote_id, user_id=user_id) for vote_id, user_id in records
+            ], ignore_conflicts=True)
+            ChoiceToUser.objects.bulk_create([
+                ChoiceToUser(user_id=user_id, choice_id=i) for (_, user_id), selected in records.items() for i in selected
+            ], ignore_conflicts=True)
+
+            tally = {}
+            for selected in records.values():
+                for i in selected:
+                    tally[i] = tally.get(i, 0) + 1
+            VoteChoice.objects.filter(id__in=list(tally)).update(num=F("num") + Case(
+                *[When(id=choice_id, then=Value(n)) for choice_id, n in tally.items()], default=Value(0)
+            ))
+        return len(records)
+
 
 class ChoiceToUser(APIModel):
     choice = models.ForeignKey(to="VoteChoice", on_delete=models.DO_NOTHING)
     user = models.ForeignKey(to="user.User", on_delete=models.DO_NOTHING)
+
+    class Meta:
+        unique_together = ("choice", "user")
+
+
+class VoteResult(APIModel):
+    vote = models.OneToOneField(to="Vote", on_delete=models.DO_NOTHING, related_name="result")
+    num = models.IntegerField(verbose_name="总票数")
+    result = models.TextField(verbose_name="各选项票数")
+    create_time = models.DateTimeField(auto_now_add=True, verbose_name="固化时间")
+
+    @classmethod
+    def freeze(cls, vote: Vote):
+        """
+        固化已结束投票的结果，结果行创建后不再修改
+        :return: 结果行，队列中仍有该投票未写回的提交时不固化，返回None
+        """
+        from .ingest import has_pending
+
+        if has_pending(vote.id):
+            return None
+
+        tally = dict(VoteChoice.objects.filter(vote=vote).values_list("id", "num"))
+        try:
+            with transaction.atomic():
+                return cls.objects.create(vote=vote, num=sum(tally.values()), result=json.dumps(tally))
+        except IntegrityError:
+            return cls.objects.get(vote=vote)
+
+    def get_tally(self):
+        return {int(k): v for k, v in json.loads(self.result).items()}
@@ -1,7 +1,9 @@
 import datetime
 
 from .models import *
-from backend.libs.wraps.serializers import APIModelSerializer, serializers, SimpleAuthorSerializer, OtherUserSerializer
+from .ingest import get_pending
+from backend.libs.wraps.serializers import APIModelSerializer, serializers, SimpleAuthorSerializer, OtherUserSerializer, \
+    ActionSerializerMixin
 
 
 class VoteChoiceSerializer(APIModelSerializer):
@@ -10,7 +12,7 @@ class VoteChoiceSerializer(APIModelSerializer):
     def get_num(self, instance: VoteChoice):
         if not self.context.get("show"):
             return None
-        return instance.voter.all().count()
+        return self.context["tally"].get(instance.id, 0)
 
     class Meta:
         model = VoteChoice
@@ -21,7 +23,7 @@ class VoteChoiceSerializer(APIModelSerializer):
         ]
 
 
-class VoteSerializer(APIModelSerializer):
+class VoteSerializer(ActionSerializerMixin, APIModelSerializer):
     choice_list = serializers.ListField(write_only=True)
     choice = serializers.SerializerMethodField()
     creator = serializers.SerializerMethodField()
@@ -30,26 +32,33 @@ class VoteSerializer(APIModelSerializer):
     opened = serializers.SerializerMethodField()
     show = serializers.SerializerMethodField()
 
+    def get_state(self, instance: Vote):
+        """
+        当前用户的投票记录、是否可查看结果与票数，每个投票只查询一次
+        """
+        state = self.context.setdefault("vote_tally_state", {})
+        if instance.id not in state:
+            user = self.context["request"].user
+            voted = [] if user.is_anonymous else list(ChoiceToUser.objects.filter(
+                choice__vote=instance, user=user
+            ).values_list("choice_id", flat=True))
+            if not voted and not user.is_anonymous:
+                voted = get_pending(instance.id, user.id)
+            state[instance.id] = {
+                "voted": voted or False,
+                "show": instance.can_show(user, bool(voted)),
+                "tally": instance.get_tally(),
+            }
+        return state[instance.id]
+
     def get_show(self, instance: Vote):
-        if not self.context.get("show"):
-            self.context["show"] = \
-                not instance.need_vote \
-                or VoteToUser.objects.filter(vote=instance, user=self.context["request"].user).exists() \
-                or instance.end_time < datetime.datetime.now()
-        return self.context["show"]
+        return self.get_state(instance)["show"]
 
     def get_opened(self, instance: Vote):
         return instance.start_time < datetime.datetime.now() < instance.end_time
 
     def get_voted(self, instance):
-        record = ChoiceToUser.objects.filter(
-            choice__vote=instance,
-            user_id=self.context["request"].user
-        ).values_list("choice_id")
-        if not record:
-            return False
-
-        return list(map(lambda x: x[0], record))
+        return self.get_state(instance)["voted"]
 
     def get_creator(self, instance):
         if self.context["view"].action == "retrieve":
@@ -57,15 +66,15 @@ class VoteSerializer(APIModelSerializer):
         return SimpleAuthorSerializer(instance.creator).data
 
     def get_num(self, instance: Vote):
-        return ChoiceToUser.objects.filter(choice__vote=instance).all().count()
+        return sum(self.get_state(instance)["tally"].values())
 
     def get_choice(self, instance: Vote):
-        if not self.context.get("show"):
-            self.context["show"] = \
-                not instance.need_vote \
-                or VoteToUser.objects.filter(vote=instance, user=self.context["request"].user).exists() \
-                or instance.end_time < datetime.datetime.now()
-        return VoteChoiceSerializer(instance=instance.votechoice_set.all(), many=True, context=self.context).data
+        state = self.get_state(instance)
+        return VoteChoiceSerializer(
+            instance=instance.votechoice_set.all(),
+            many=True,
+            context={**self.context, "show": state["show"], "tally": state["tally"]}
+        ).data
 
     class Meta:
         model = Vote
@@ -87,17 +96,13 @@ class VoteSerializer(APIModelSerializer):
             "show",
         ]
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-
-        action = self.context["view"].action
-        self.context["action"] = action
-        remove = []
-
+    @classmethod
+    def get_remove_fields(cls, context):
+        action = context["view"].action
         if action == "retrieve":
-            remove = ["choice_list"]
+            return ["choice_list"]
         if action == "list":
-            remove = [
+            return [
                 "min_num",
                 "max_num",
                 "anonymous",
@@ -108,8 +113,7 @@ class VoteSerializer(APIModelSerializer):
                 "show",
                 "num",
             ]
-        for i in remove:
-            self.fields.pop(i)
+        return []
 
     def create(self, validated_data):
         choice_list = validated_data.pop("choice_list")
@@ -1,10 +1,15 @@
 import datetime
+import hashlib
+import json
 
 from django.core.files.base import File
+from rest_framework import status
+from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
 from rest_framework.decorators import action
 
 from .serializers import *
+from .ingest import submit, get_pending
 from backend.libs.wraps.response import UserInfoResponse, APIResponse
 from backend.libs.wraps.authenticators import CommonJwtAuthentication, UserInfoAuthentication
 from backend.libs.wraps.views import APIModelViewSet
@@ -39,7 +44,7 @@ class VoteView(APIModelViewSet):
     def submit(self, request, pk):
         selected = request.data.get("selected")
 
-        vote = Vote.objects.filter(id=pk).first()
+        vote = Vote.objects.filter(id=pk, is_active=True).first()
 
         if not vote:
             return APIResponse(response_code.NOT_FOUND, "投票不存在")
@@ -47,13 +52,41 @@ class VoteView(APIModelViewSet):
         if not vote.start_time < datetime.datetime.now() < vote.end_time:
             return APIResponse(response_code.VOTE_NOT_OPENED, "投票不在开放时间")
 
-        if not (vote.min_num <= len(selected) <= vote.max_num):
+        if not isinstance(selected, list) or not (vote.min_num <= len(selected) <= vote.max_num):
             return APIResponse(response_code.INVALID_SELECTED_NUM, "选项数目错误")
 
-        if VoteToUser.objects.filter(user=request.user, vote=vote).exists():
-            return APIResponse(response_code.HAS_VOTED, "您已经投过票了")
+        try:
+            choice_ids = sorted({int(i) for i in selected})
+        except (TypeError, ValueError):
+            return APIResponse(response_code.INVALID_CHOICE, "选项不存在")
+        if len(choice_ids) != len(selected) or \
+                VoteChoice.objects.filter(vote=vote, id__in=choice_ids).count() != len(choice_ids):
+            return APIResponse(response_code.INVALID_CHOICE, "选项不存在")
 
-        VoteToUser.objects.create(user=request.user, vote=vote)
-        ChoiceToUser.objects.bulk_create(map(lambda x: ChoiceToUser(user=request.user, choice_id=x), selected))
+        if not submit(vote.id, request.user.id, choice_ids):
+            return APIResponse(response_code.HAS_VOTED, "您已经投过票了")
 
         return APIResponse(response_code.SUCCESS_VOTE, "已投票")
+
+    @action(["GET"], True)
+    def tally(self, request, pk):
+        """
+        仅返回票数，供轮询使用；结果未变化时按If-None-Match返回304
+        """
+        vote = Vote.objects.filter(id=pk, is_active=True).first()
+        if not vote:
+            return APIResponse(response_code.NOT_FOUND, "投票不存在")
+
+        voted = not request.user.is_anonymous and get_pending(vote.id, request.user.id)
+        show = vote.can_show(request.user, bool(voted))
+        tally = vote.get_tally()
+        data = {
+            "num": sum(tally.values()),
+            "choice": [{"id": k, "num": v} for k, v in sorted(tally.items())] if show else None,
+            "show": show,
+        }
+        etag = '"{}"'.format(hashlib.md5(json.dumps(data).encode("utf-8")).hexdigest())
+        if etag in request.META.get("HTTP_IF_NONE_MATCH", ""):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        return APIResponse(response_code.SUCCESS_GET_VOTE_TALLY, "成功获取票数", data, headers={"ETag": etag})
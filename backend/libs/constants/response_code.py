@@ -120,6 +120,17 @@ SUCCESS_GET_COLLECTION_LIST = 184
 SUCCESS_POST_COLLECTION = 185
 SUCCESS_EDIT_COLLECTION = 186
 SUCCESS_DELETE_COLLECTION = 187
+
+SUCCESS_SEARCH = 188
+
+SUCCESS_GET_FANOUT = 189
+SUCCESS_GET_FANOUT_LIST = 190
+
+SUCCESS_SORT_COLLECTION = 191
+
+SUCCESS_GET_LEADERBOARD = 192
+
+SUCCESS_GET_VOTE_TALLY = 193
 # 电话
 INVALID_PHONE = 200
 NOT_REGISTERED = 201
@@ -176,6 +187,7 @@ INEXISTENT_COLUMN = 1000
 INVALID_SELECTED_NUM = 1100
 HAS_VOTED = 1101
 VOTE_NOT_OPENED = 1101
+INVALID_CHOICE = 1102
 
 # 其他
 INVALID_PK = 2000
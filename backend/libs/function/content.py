@@ -0,0 +1,88 @@
+from lxml import etree
+
+from user.models import User
+
+MENTION_STYLE = "color: rgb(54, 88, 226);"
+
+
+class RichContent:
+    """
+    富文本单次解析：一次遍历同时提取纯文本、首张图片与@用户
+    @用户在resolve_mention中一次查询完成校验
+    """
+
+    def __init__(self, html):
+        self.tree = etree.HTML(html)
+        self.image = None
+        self.mention = []
+        self._candidates = []
+
+        text = []
+        for event, element in etree.iterwalk(self.tree, events=("start", "end", "comment", "pi")):
+            if event in ("comment", "pi"):
+                if element.tail:
+                    text.append(element.tail)
+                continue
+
+            if event == "end":
+                if element is not self.tree and element.tail:
+                    text.append(element.tail)
+                continue
+
+            if element.text:
+                text.append(element.text)
+
+            if element.tag == "img" and self.image is None:
+                self.image = element.get("src")
+            elif element.tag == "span" and element.get("data-w-e-type") == "mention":
+                self._candidates.append(element)
+
+        self.text = "".join(text)
+        self.resolve_mention()
+
+    def resolve_mention(self):
+        candidates = []
+        for element in self._candidates:
+            uid = element.get("data-info")
+            if uid and uid.isdigit():
+                candidates.append((int(uid), (element.text or "").replace("@", ""), element))
+
+        if not candidates:
+            return
+
+        users = User.objects.in_bulk({uid for uid, _, _ in candidates})
+        for uid, username, element in candidates:
+            user = users.get(uid)
+            if user is None or user.username != username:
+                continue
+
+            element.set("style", MENTION_STYLE)
+            element.set("uid", str(uid))
+            if user not in self.mention:
+                self.mention.append(user)
+
+    @property
+    def html(self):
+        return etree.tostring(self.tree).decode("utf-8")[12:-14]
+
+    def article_description(self, length=64):
+        if len(self.text) <= length:
+            html_text = f'<div>{self.text}</div>'
+        else:
+            html_text = f'<div>{self.text[:length]}...</div>'
+
+        if not self.image:
+            return html_text
+
+        return html_text + f'<img src="{self.image}"/>'
+
+    def comment_description(self, length=40):
+        if len(self.text) <= length:
+            html_text = f'<span>{self.text}</span>'
+        else:
+            html_text = f'<span>{self.text[:length]}...</span>'
+
+        if not self.image:
+            return html_text
+
+        return html_text + "<span>[图片]</span>"
@@ -1,75 +1,3 @@
-like_sql = """
-SELECT id,
-       origin,
-       bbs_article_id,
-       bbs_comment_id,
-       receiver_id,
-       sender_id,
-       max(time)                 last_time,
-       count(*)                  total,
-       min(is_viewed)            viewed,
-       count(*) - sum(is_viewed) new
-FROM message_like
-WHERE is_active = true
-  AND receiver_id = %d
-GROUP BY bbs_article_id,
-         bbs_comment_id,
-         special_column_id,
-         special_comment_id
-ORDER BY viewed,
-         last_time DESC;
-"""
-
-
-private_sql = """
-SELECT id,
-       content,
-       IF(T.sender_id='{user_id}',T.receiver_id,T.sender_id) target_id,
-       MAX(time)                 last_time,
-       MIN(_is_viewed)            viewed,
-       COUNT(*) - SUM(_is_viewed) new
-FROM (
-         SELECT id,
-                content,
-                time,
-                is_viewed,
-                is_active,
-                sender_id,
-                receiver_id,
-                IF(sender_id='{user_id}',TRUE,is_viewed) _is_viewed,
-                CONCAT(CONVERT(IF(sender_id < receiver_id, sender_id, receiver_id), CHAR), ',',
-                       CONVERT(IF(sender_id > receiver_id, sender_id, receiver_id), CHAR)) AS tag
-         FROM message_private
-         WHERE is_active = 1
-         AND (sender_id='{user_id}' OR  receiver_id ='{user_id}')
-         ORDER BY time DESC 
-     ) as T
-GROUP BY tag
-ORDER BY viewed,
-last_time DESC 
-"""
-recommend_sql = """
-SELECT *
-FROM (
-         SELECT id, update_time, 1 AS recommend_type
-         FROM bbs_article
-         WHERE is_active = true
-         UNION
-         SELECT id, update_time, 2 AS recommend_type
-         FROM special_column
-         WHERE is_active = true
-           AND is_audit = true
-           AND is_draft = false
-         UNION
-         SELECT id, update_time, 3 AS recommend_type
-         FROM information_news
-         WHERE is_draft = false
-           AND is_active = true
-     ) AS C
-ORDER BY update_time DESC
-LIMIT 10 OFFSET %d;
-"""
-
 post_sql = """
 SELECT *
 FROM (
@@ -1,11 +1,30 @@
 import jwt
 
 from rest_framework_jwt.authentication import BaseJSONWebTokenAuthentication
-from rest_framework_jwt.authentication import jwt_decode_handler
+from rest_framework_jwt.authentication import jwt_decode_handler, jwt_get_username_from_payload
 from rest_framework.exceptions import AuthenticationFailed
+from user.models import User
 
 
-class CommonJwtAuthentication(BaseJSONWebTokenAuthentication):
+class PrincipalAuthentication(BaseJSONWebTokenAuthentication):
+    def authenticate_credentials(self, payload):
+        """
+        从用户快照缓存还原登录用户，缓存有效时认证不访问数据库
+        """
+        username = jwt_get_username_from_payload(payload)
+        if not username or not payload.get("user_id"):
+            raise AuthenticationFailed("登录信息无效，请重新登陆")
+
+        user = User.get_principal(payload["user_id"], username)
+        if user is None:
+            raise AuthenticationFailed("登录信息变动，请重新登陆")
+        if not user.is_active:
+            raise AuthenticationFailed("账号已被禁用")
+
+        return user
+
+
+class CommonJwtAuthentication(PrincipalAuthentication):
     def authenticate(self, request):
         token = request.META.get("HTTP_AUTHORIZATION")
         if token:
@@ -24,7 +43,7 @@ class CommonJwtAuthentication(BaseJSONWebTokenAuthentication):
         raise AuthenticationFailed("未登录")
 
 
-class UserInfoAuthentication(BaseJSONWebTokenAuthentication):
+class UserInfoAuthentication(PrincipalAuthentication):
     def authenticate(self, request):
         token = request.META.get("HTTP_AUTHORIZATION")
         if token:
@@ -1,3 +1,5 @@
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 from rest_framework import serializers
 from user.models import *
 from rest_framework_jwt.serializers import jwt_payload_handler, jwt_encode_handler
@@ -23,6 +25,202 @@ class APIModelSerializer(serializers.ModelSerializer):
         return instance
 
 
+class ActionSerializerMixin:
+    """
+    按action等条件裁剪字段的序列化器
+    子类实现get_remove_fields返回需要移除的字段，每种移除组合只在首次使用时生成一个子类并缓存，
+    实例化时直接使用裁剪后的字段，不再构建后丢弃
+    """
+    full_fields = None
+    _specialized = False
+    _specialized_cache = {}
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._specialized:
+            cls = cls.specialize(tuple(cls.get_remove_fields(kwargs.get("context") or {})))
+        return super(ActionSerializerMixin, cls).__new__(cls, *args, **kwargs)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if view := self.context.get("view"):
+            self.context["action"] = view.action
+
+    @classmethod
+    def get_remove_fields(cls, context):
+        return []
+
+    @classmethod
+    def specialize(cls, remove):
+        key = (cls, remove)
+        if (serializer_class := cls._specialized_cache.get(key)) is None:
+            attrs = {
+                "__module__": cls.__module__,
+                "__qualname__": cls.__qualname__,
+                "Meta": type("Meta", (cls.Meta,), {"fields": [i for i in cls.Meta.fields if i not in remove]}),
+                "full_fields": cls.Meta.fields,
+                "_specialized": True,
+                **{i: None for i in remove if i in cls._declared_fields},
+            }
+            serializer_class = ActionSerializerMixin._specialized_cache[key] = type(cls.__name__, (cls,), attrs)
+        return serializer_class
+
+
+class VoteStateLoader:
+    """
+    按请求缓存当前用户对某类对象的点赞/点踩状态
+    同一页数据只查询一次
+    """
+
+    def __init__(self, model, field, user_id):
+        self.model = model
+        self.field = field
+        self.user_id = user_id
+        self.pending = set()
+        self.state = {}
+
+    def prime(self, ids):
+        self.pending.update(i for i in ids if i is not None and i not in self.state)
+
+    def get(self, pk):
+        if pk not in self.state:
+            self.pending.add(pk)
+            self._load()
+        return self.state[pk]
+
+    def _load(self):
+        ids, self.pending = self.pending, set()
+        for i in ids:
+            self.state[i] = None
+
+        record = self.model.objects.filter(
+            author_id=self.user_id,
+            **{f"{self.field}_id__in": ids}
+        ).values_list(f"{self.field}_id", "is_up")
+        for target_id, is_up in record:
+            self.state[target_id] = is_up
+
+
+def get_vote_loader(context, model, field):
+    request = context.get("request")
+    if not request or not request.user.id:
+        return None
+
+    loaders = context.setdefault("vote_state", {})
+    if (model, field) not in loaders:
+        loaders[(model, field)] = VoteStateLoader(model, field, request.user.id)
+    return loaders[(model, field)]
+
+
+def prime_vote_state(context, model, field, ids):
+    if loader := get_vote_loader(context, model, field):
+        loader.prime(ids)
+
+
+class VoteStateField(serializers.Field):
+    """
+    当前用户的点赞状态，点赞为True，点踩为False，未评价为None
+    :param model: 点赞记录模型，如UpAndDown、IssueCommentVote
+    :param field: 点赞记录指向对象的外键名，如article、comment
+    """
+
+    def __init__(self, model, field, **kwargs):
+        self.model = model
+        self.field = field
+        kwargs["source"] = "*"
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        loader = get_vote_loader(self.context, self.model, self.field)
+        if loader is None:
+            return None
+
+        if instance.id not in loader.state:
+            page = getattr(self.parent.parent, "instance", None)
+            if isinstance(self.parent.parent, serializers.ListSerializer) and page is not None:
+                loader.prime(map(lambda x: x.id, page))
+
+        return loader.get(instance.id)
+
+
+class TopChildrenLoader:
+    """
+    按请求批量加载评论点赞数最高的前n条子评论
+    同一页评论的子评论以ROW_NUMBER窗口函数一次查询
+    """
+
+    def __init__(self, model, n):
+        self.model = model
+        self.n = n
+        self.pending = set()
+        self.state = {}
+
+    def prime(self, ids):
+        self.pending.update(i for i in ids if i is not None and i not in self.state)
+
+    def get(self, pk):
+        if pk not in self.state:
+            self.pending.add(pk)
+            self._load()
+        return self.state[pk]
+
+    def _load(self):
+        ids, self.pending = self.pending, set()
+        for i in ids:
+            self.state[i] = []
+
+        ranked = self.model.objects.filter(parent_id__in=ids, is_active=True).annotate(
+            row_rank=Window(RowNumber(), partition_by=[F("parent_id")], order_by=[F("up_num").desc(), F("id")])
+        ).order_by()
+        sql, params = ranked.query.sql_with_params()
+        children = self.model.objects.raw(
+            f"SELECT * FROM ({sql}) ranked WHERE ranked.row_rank <= %s ORDER BY ranked.row_rank",
+            (*params, self.n)
+        ).prefetch_related("author", "author__metal")
+        for i in children:
+            self.state[i.parent_id].append(i)
+
+
+# 子评论预览条数的请求参数、默认值与上限
+CHILDREN_QUERY_PARAM = "children"
+CHILDREN_DEFAULT = 2
+CHILDREN_MAX = 10
+
+
+def get_children_num(context):
+    request = context.get("request")
+    try:
+        n = int(request.query_params.get(CHILDREN_QUERY_PARAM, CHILDREN_DEFAULT))
+    except (AttributeError, TypeError, ValueError):
+        n = CHILDREN_DEFAULT
+    return min(max(n, 0), CHILDREN_MAX)
+
+
+def get_top_children(serializer, instance, model, vote=None):
+    """
+    子评论预览，首次调用时预取同页全部评论的子评论
+    :param vote: (点赞记录模型, 外键名)，一并预取子评论的点赞状态
+    """
+    n = get_children_num(serializer.context)
+    if not n:
+        return []
+
+    loaders = serializer.context.setdefault("top_children", {})
+    if (loader := loaders.get(model)) is None:
+        loader = loaders[model] = TopChildrenLoader(model, n)
+
+    if instance.id not in loader.state:
+        page = getattr(serializer.parent, "instance", None)
+        if isinstance(serializer.parent, serializers.ListSerializer) and page is not None:
+            loader.prime(map(lambda x: x.id, page))
+        children = loader.get(instance.id)
+        if vote:
+            prime_vote_state(serializer.context, *vote, [j.id for i in loader.state.values() for j in i])
+        return children
+
+    return loader.get(instance.id)
+
+
 class MetalSerializer(serializers.ModelSerializer):
     class Meta:
         model = Metal
@@ -32,7 +230,6 @@ class MetalSerializer(serializers.ModelSerializer):
         ]
 
 
-
 class UserSerializer(serializers.ModelSerializer):
     permission = serializers.SerializerMethodField()
     metal = MetalSerializer(many=True)
@@ -71,19 +268,20 @@ class OtherUserSerializer(serializers.ModelSerializer):
     followed = serializers.SerializerMethodField()
     follower = serializers.SerializerMethodField()
 
+    # 关注关系取自当前用户缓存的关注集合，整页只加载一次
     def get_followed(self, instance: User):
         user = self.context["request"].user
         if user.is_anonymous:
             return None
 
-        return user.my_follow.filter(followed=instance).exists()
+        return instance.id in user.my_follow_set
 
     def get_follower(self, instance: User):
         user = self.context["request"].user
         if user.is_anonymous:
             return None
 
-        return user.follow_me.filter(follower=instance).exists()
+        return instance.id in user.follow_me_set
 
     class Meta:
         model = User
@@ -1,11 +1,25 @@
+import asyncio
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+
+from asgiref.sync import sync_to_async
+
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.pagination import PageNumberPagination, OrderedDict
 from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.utils.urls import replace_query_param
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.exceptions import MethodNotAllowed
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models, close_old_connections
+from django.db.models import Q
+from rest_framework import serializers
+from rest_framework.exceptions import MethodNotAllowed, NotFound
 from rest_framework.request import Request
 
 from .response import APIResponse
+from .logger import log
 
 
 class Pag(PageNumberPagination):
@@ -22,11 +36,245 @@ class Pag(PageNumberPagination):
         ]))
 
 
+class CursorPag(Pag):
+    """
+    游标分页，请求携带cursor参数时启用，否则与Pag一致
+    游标由排序字段与id组成，不做COUNT，需要总数时携带count=1
+    每页条数上限只在游标模式下生效，页码模式与Pag一致
+    """
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    max_cursor_page_size = 100
+
+    def __init__(self):
+        self.cursor_mode = False
+        self.ordering = None
+        self.next_position = None
+        self.count = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        self.ordering = self.get_ordering(queryset)
+        if not self.cursor_mode or self.ordering is None:
+            self.cursor_mode = False
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = min(self.get_page_size(request) or self.page_size, self.max_cursor_page_size)
+        if request.query_params.get(self.count_query_param, "").lower() in ("1", "true"):
+            self.count = queryset.count()
+
+        field, desc = self.ordering
+        sign = "-" if desc else ""
+        queryset = queryset.order_by(f"{sign}{field}", f"{sign}id")
+
+        if position := self.decode_cursor(request):
+            value, pk = position
+            lookup = "lt" if desc else "gt"
+            if field == "id":
+                queryset = queryset.filter(**{f"id__{lookup}": pk})
+            else:
+                queryset = queryset.filter(
+                    Q(**{f"{field}__{lookup}": value}) | Q(**{field: value, f"id__{lookup}": pk})
+                )
+
+        page = list(queryset[:page_size + 1])
+        self.next_position = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_position = self.encode_position(page[-1])
+
+        return page
+
+    def get_ordering(self, queryset):
+        order_by = queryset.query.order_by or queryset.model._meta.ordering or ["-id"]
+        ordering = order_by[0]
+        if not isinstance(ordering, str):
+            return None
+
+        desc = ordering.startswith("-")
+        field = ordering.lstrip("-")
+        if field == "pk":
+            field = "id"
+
+        try:
+            model_field = queryset.model._meta.get_field(field)
+        except FieldDoesNotExist:
+            return None
+
+        if model_field.is_relation or model_field.null:
+            return None
+
+        self.model_field = model_field
+        return field, desc
+
+    def encode_position(self, instance):
+        field, desc = self.ordering
+        position = {
+            "o": f"{'-' if desc else ''}{field}",
+            "v": self.model_field.value_to_string(instance),
+            "id": instance.id,
+        }
+        return urlsafe_b64encode(json.dumps(position).encode("utf-8")).decode("ascii")
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+
+        field, desc = self.ordering
+        try:
+            position = json.loads(urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+            if position["o"] != f"{'-' if desc else ''}{field}":
+                raise ValueError(position["o"])
+            return self.model_field.to_python(position["v"]), int(position["id"])
+        except Exception:
+            raise NotFound("无效的游标")
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+
+        if self.next_position is None:
+            return None
+
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_position)
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+
+        return APIResponse(data[0], "成功获取此页数据", OrderedDict([
+            ('count', self.count),
+            ('next', self.get_next_link()),
+            ('previous', None),
+            ('results', data[1])
+        ]))
+
+
+def get_relation(model, name):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    return field if field.is_relation else None
+
+
+def derive_queryset_options(serializer, model, prefix=""):
+    """
+    根据序列化器实际输出的字段推导查询优化
+    嵌套的单个模型序列化器对应外键时select_related，嵌套的多个模型序列化器对应多对多或反向关系时prefetch_related，
+    Meta.fields中声明但已被移除的大文本字段defer
+    :return: (select_related集合, prefetch_related集合, defer集合)
+    """
+    select, prefetch, defer = set(), set(), set()
+
+    for field in serializer.fields.values():
+        if field.write_only or field.source == "*":
+            continue
+
+        current, path = model, []
+        for attr in field.source_attrs[:-1]:
+            relation = get_relation(current, attr)
+            if relation is None or not (relation.many_to_one or relation.one_to_one):
+                break
+            current = relation.related_model
+            path.append(attr)
+        else:
+            attr = field.source_attrs[-1]
+            relation = get_relation(current, attr)
+            if path:
+                select.add(prefix + "__".join(path))
+
+            lookup = prefix + "__".join([*path, attr])
+            if isinstance(field, serializers.ListSerializer) and isinstance(field.child, serializers.ModelSerializer):
+                if relation is not None and (relation.many_to_many or relation.one_to_many):
+                    prefetch.add(lookup)
+                    child_select, child_prefetch, _ = derive_queryset_options(
+                        field.child, relation.related_model, lookup + "__"
+                    )
+                    prefetch.update(child_select, child_prefetch)
+            elif isinstance(field, serializers.ModelSerializer):
+                if relation is not None and (relation.many_to_one or relation.one_to_one):
+                    select.add(lookup)
+                    child_select, child_prefetch, child_defer = derive_queryset_options(
+                        field, relation.related_model, lookup + "__"
+                    )
+                    select.update(child_select)
+                    prefetch.update(child_prefetch)
+                    defer.update(child_defer)
+
+    declared = getattr(serializer, "full_fields", None) or getattr(getattr(serializer, "Meta", None), "fields", None)
+    if isinstance(declared, (list, tuple)):
+        for name in declared:
+            if name in serializer.fields:
+                continue
+            try:
+                model_field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if isinstance(model_field, models.TextField):
+                defer.add(prefix + name)
+
+    return select, prefetch, defer
+
+
+# 异步读接口线程池的线程数，即同时执行的读请求上限
+ASYNC_READ_WORKERS = 32
+
+read_executor = ThreadPoolExecutor(max_workers=ASYNC_READ_WORKERS, thread_name_prefix="async-read")
+
+
+def run_read(view, request, *args, **kwargs):
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, "render", None)):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_read_view(view):
+    """
+    将同步视图包装为异步视图
+    GET/HEAD请求在有界线程池中并行执行，其余请求仍与同步视图一样在单一线程中执行
+    """
+    sync_view = sync_to_async(view, thread_sensitive=True)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return await sync_view(request, *args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(read_executor, partial(run_read, view, request, *args, **kwargs))
+
+    wrapper.csrf_exempt = True
+    return wrapper
+
+
+class AsyncReadMixin:
+    """
+    ASGI下同步视图全部在同一线程中串行执行，混入后读请求改为在线程池中并行执行
+    """
+
+    @classmethod
+    def as_view(cls, *args, **kwargs):
+        return async_read_view(super().as_view(*args, **kwargs))
+
+
 class APIModelViewSet(ModelViewSet):
     exclude = []
     pagination_class = Pag
     filter_backends = (SearchFilter, DjangoFilterBackend, OrderingFilter)
     code = {}
+    # 按action声明的查询优化，如{"list": {"select_related": [], "prefetch_related": [], "only": [], "defer": []}}
+    queryset_options = {}
+    # 是否为list与retrieve根据序列化器字段自动推导查询优化
+    auto_queryset_options = True
+    _derived_options = {}
 
     def is_exclude(self):
         if self.action in self.exclude:
@@ -68,7 +316,7 @@ class APIModelViewSet(ModelViewSet):
         if response := self.after_retrieve(instance, request, *args, **kwargs):
             return response
 
-        return APIResponse(self.code["retrieve"], "成功获取单条数据", serializer.data)
+        return APIResponse(self.code["retrieve"], "成功获取单条数据", self.get_serializer_data(serializer))
 
     def after_retrieve(self, instance, request, *args, **kwargs):
         pass
@@ -117,13 +365,13 @@ class APIModelViewSet(ModelViewSet):
             if response := self.after_list(queryset, request, *args, **kwargs):
                 return response
 
-            return self.get_paginated_response((self.code["list"], serializer.data))
+            return self.get_paginated_response((self.code["list"], self.get_serializer_data(serializer)))
 
         if response := self.after_list(queryset, request, *args, **kwargs):
             return response
 
         serializer = self.get_serializer(queryset, many=True, args=args, kwargs=kwargs)
-        return APIResponse(self.code["list"], "成功获取此页数据", serializer.data)
+        return APIResponse(self.code["list"], "成功获取此页数据", self.get_serializer_data(serializer))
 
     def after_list(self, queryset, request, *args, **kwargs):
         pass
@@ -149,6 +397,63 @@ class APIModelViewSet(ModelViewSet):
     def after_destroy(self, instance, request, *args, **kwargs):
         pass
 
+    def filter_queryset(self, queryset):
+        return self.optimize_queryset(super().filter_queryset(queryset))
+
+    def get_queryset_options(self, queryset):
+        options = {}
+        if self.auto_queryset_options and self.action in ["list", "retrieve"]:
+            # 按裁剪后的序列化器类缓存，同一action下不同查询参数裁剪出的字段组合各自推导
+            serializer_class = self.get_serializer_class()
+            try:
+                serializer = self.get_serializer()
+                serializer_class = type(serializer)
+            except Exception as e:
+                log.warning(f"无法推导{serializer_class.__name__}的查询优化:{str(e)}")
+                serializer = None
+            key = (serializer_class, self.action)
+            if key not in self._derived_options:
+                derived = (set(), set(), set())
+                if getattr(getattr(serializer, "Meta", None), "model", None) is queryset.model:
+                    try:
+                        derived = derive_queryset_options(serializer, queryset.model)
+                    except Exception as e:
+                        log.warning(f"无法推导{serializer_class.__name__}的查询优化:{str(e)}")
+                APIModelViewSet._derived_options[key] = derived
+
+            select, prefetch, defer = self._derived_options[key]
+            options = {
+                "select_related": list(select),
+                "prefetch_related": list(prefetch),
+                "defer": list(defer),
+            }
+
+        for name, value in self.queryset_options.get(self.action, {}).items():
+            options[name] = [*options.get(name, []), *value]
+        return options
+
+    def optimize_queryset(self, queryset):
+        if not isinstance(queryset, models.QuerySet):
+            return queryset
+
+        options = self.get_queryset_options(queryset)
+        if select := options.get("select_related"):
+            queryset = queryset.select_related(*select)
+        if prefetch := options.get("prefetch_related"):
+            queryset = queryset.prefetch_related(*prefetch)
+        if only := options.get("only"):
+            queryset = queryset.only(*only)
+        if defer := options.get("defer"):
+            queryset = queryset.defer(*defer)
+        return queryset
+
+    @staticmethod
+    def get_serializer_data(serializer):
+        """
+        只读接口直接使用to_representation的结果，省去ReturnDict/ReturnList的拷贝
+        """
+        return serializer.to_representation(serializer.instance)
+
     def get_serializer(self, *args, **kwargs):
         _args = kwargs.pop("args", None)
         _kwargs = kwargs.pop("kwargs", None)
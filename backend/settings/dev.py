@@ -42,4 +42,5 @@ INSTALLED_APPS = [
     "user",
     "vote",
     "issue",
+    "search",
 ]
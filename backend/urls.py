@@ -11,4 +11,5 @@ urlpatterns = [
     path("message/", include("message.urls")),
     path("issue/", include("issue.urls")),
     path("vote/", include("vote.urls")),
+    path("search/", include("search.urls")),
 ]
@@ -0,0 +1,7 @@
+from .client import get_redis
+from .view_counter import ViewCounter
+from .graph import RelationCache
+from .counter import Counter
+from .ledger import DailyLedger
+from .leaderboard import Leaderboard
+from .ingest import SubmissionQueue
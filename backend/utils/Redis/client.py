@@ -0,0 +1,17 @@
+from django_redis import get_redis_connection
+
+from .settings import PREFIX
+
+
+def get_redis():
+    return get_redis_connection("default")
+
+
+def make_key(*args):
+    return ":".join(map(str, [PREFIX, *args]))
+
+
+__all__ = [
+    "get_redis",
+    "make_key",
+]
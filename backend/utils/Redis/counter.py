@@ -0,0 +1,97 @@
+from django.db import transaction
+from django.db.models import F, Case, When, Value
+from redis.exceptions import RedisError
+
+from .client import get_redis, make_key
+from .settings import FLUSH_BATCH
+from backend.libs.wraps.logger import log
+
+
+class Counter:
+    """
+    冗余计数字段的原子更新
+    增量以F()表达式直接写入，不读取也不回写整行；buffered中的字段增量先累积在redis中，
+    由flush_counters命令批量写回，redis不可用时退回直接写入
+    :param name: 计数器名称
+    :param model: 计数字段所在的模型
+    :param buffered: 缓冲写入的字段
+    :param boards: {字段: 排行榜}，字段增量同时计入排行榜
+    """
+
+    def __init__(self, name, model, buffered=(), boards=None):
+        self.name = name
+        self.model = model
+        self.buffered = set(buffered)
+        self.boards = boards or {}
+
+    @property
+    def delta_key(self):
+        return make_key("counter", self.name, "delta")
+
+    @property
+    def flushing_key(self):
+        return make_key("counter", self.name, "flushing")
+
+    def add(self, pk, **fields):
+        """
+        整数值作为增量，其余值直接写入，如add(pk, comment_num=1, comment_time=now)
+        """
+        fields = {k: v for k, v in fields.items() if v}
+        for field, board in self.boards.items():
+            if isinstance(fields.get(field), int):
+                board.incr(pk, fields[field])
+
+        buffered = {k: v for k, v in fields.items() if k in self.buffered and isinstance(v, int)}
+        if buffered:
+            try:
+                pipe = get_redis().pipeline(transaction=False)
+                for field, n in buffered.items():
+                    pipe.hincrby(self.delta_key, f"{pk}:{field}", n)
+                pipe.execute()
+                fields = {k: v for k, v in fields.items() if k not in buffered}
+            except RedisError as e:
+                log.warning(f"计数器{self.name}缓冲失败:{str(e)}")
+
+        if fields:
+            self.model.objects.filter(pk=pk).update(**{
+                k: F(k) + v if isinstance(v, int) and not isinstance(v, bool) else v for k, v in fields.items()
+            })
+
+    def pending(self, pk, field):
+        """
+        尚未写回数据库的增量
+        """
+        if field not in self.buffered:
+            return 0
+        try:
+            pipe = get_redis().pipeline()
+            pipe.hget(self.delta_key, f"{pk}:{field}")
+            pipe.hget(self.flushing_key, f"{pk}:{field}")
+            return sum(int(i or 0) for i in pipe.execute())
+        except RedisError:
+            return 0
+
+    def flush(self):
+        """
+        将缓冲的增量按字段分批写回数据库，返回写回的增量条数
+        全部批次在一个事务中写回，提交后才删除
+        """
+        conn = get_redis()
+        if not conn.exists(self.flushing_key) and conn.exists(self.delta_key):
+            conn.rename(self.delta_key, self.flushing_key)
+
+        delta = {}
+        for k, v in conn.hgetall(self.flushing_key).items():
+            pk, field = k.decode("utf-8").split(":")
+            if int(v):
+                delta.setdefault(field, []).append((int(pk), int(v)))
+
+        with transaction.atomic():
+            for field, items in delta.items():
+                for i in range(0, len(items), FLUSH_BATCH):
+                    batch = items[i:i + FLUSH_BATCH]
+                    self.model.objects.filter(pk__in=[pk for pk, _ in batch]).update(**{
+                        field: F(field) + Case(*[When(pk=pk, then=Value(n)) for pk, n in batch], default=Value(0))
+                    })
+            transaction.on_commit(lambda: conn.delete(self.flushing_key))
+        return sum(len(i) for i in delta.values())
@@ -0,0 +1,259 @@
+import time
+from uuid import uuid4
+from collections import OrderedDict
+from threading import Lock
+
+from redis.exceptions import RedisError
+
+from .client import get_redis, make_key
+from .settings import GRAPH_EXPIRE, GRAPH_LOCAL_SIZE, GRAPH_LOCAL_EXPIRE
+from backend.libs.wraps.logger import log
+
+# 集合中的占位元素，用于区分空集合与未加载
+SENTINEL = 0
+
+# 仅在集合已加载时写入，避免生成缺少占位元素的残缺集合；集合未加载时递增版本，使进行中的加载作废
+WRITE_SCRIPT = """
+if redis.call("exists", KEYS[1]) == 1 then
+    if ARGV[1] == "add" then
+        return redis.call("sadd", KEYS[1], ARGV[2])
+    end
+    return redis.call("srem", KEYS[1], ARGV[2])
+end
+redis.call("incr", KEYS[2])
+redis.call("expire", KEYS[2], ARGV[3])
+return 0
+"""
+
+# 集合仍未加载且版本与读取数据库前一致时，才将临时集合改名为关系集合
+INSTALL_SCRIPT = """
+if redis.call("exists", KEYS[2]) == 0 and tonumber(redis.call("get", KEYS[3]) or "0") == tonumber(ARGV[1]) then
+    redis.call("rename", KEYS[1], KEYS[2])
+    return 1
+end
+redis.call("del", KEYS[1])
+return 0
+"""
+
+
+class LocalLRU:
+    """
+    redis不可用时使用的进程内LRU缓存，条目短时过期
+    """
+
+    def __init__(self, size=GRAPH_LOCAL_SIZE, expire=GRAPH_LOCAL_EXPIRE):
+        self.size = size
+        self.expire = expire
+        self.data = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = (time.monotonic() + self.expire, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.size:
+                self.data.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+
+class RelationCache:
+    """
+    用户关系集合缓存
+    每个用户的关系集合保存为redis集合，首次访问时从数据库加载，
+    增删关系时写穿，redis不可用时退回进程内LRU
+    :param name: 关系名称
+    :param loader: 以用户id返回关系用户id列表的函数
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.local = LocalLRU()
+        # 写穿失败的用户id，redis恢复后删除其集合
+        self.stale = set()
+        self._script = None
+        self._install = None
+
+    def key(self, user_id):
+        return make_key("graph", self.name, user_id)
+
+    def version_key(self, user_id):
+        return make_key("graph", self.name, user_id, "version")
+
+    def versions(self, user_ids, conn=None):
+        """
+        读取数据库之前调用，返回{用户id: 版本}，供load_many判断加载期间是否有写入
+        """
+        values = (conn or get_redis()).mget([self.version_key(i) for i in user_ids])
+        return {i: int(v or 0) for i, v in zip(user_ids, values)}
+
+    def _fill(self, pipe, user_id, members, version):
+        """
+        先写入临时集合，集合仍未加载且加载期间没有写穿时才改名为关系集合，
+        避免覆盖已写穿的集合或写入缺少新关系的集合
+        """
+        if self._install is None:
+            self._install = get_redis().register_script(INSTALL_SCRIPT)
+        key = self.key(user_id)
+        tmp = f"{key}:loading:{uuid4().hex}"
+        pipe.sadd(tmp, SENTINEL, *members)
+        pipe.expire(tmp, GRAPH_EXPIRE)
+        self._install(keys=[tmp, key, self.version_key(user_id)], args=[version], client=pipe)
+
+    def load(self, user_id, conn=None, replace=False):
+        """
+        从数据库加载一个用户的关系集合，集合已存在时不覆盖，replace为True时强制替换
+        """
+        conn = conn or get_redis()
+        if replace:
+            members = set(self.loader(user_id))
+            pipe = conn.pipeline()
+            pipe.delete(self.key(user_id))
+            pipe.sadd(self.key(user_id), SENTINEL, *members)
+            pipe.expire(self.key(user_id), GRAPH_EXPIRE)
+            pipe.execute()
+            return members
+
+        version = self.versions([user_id], conn)[user_id]
+        members = set(self.loader(user_id))
+        pipe = conn.pipeline()
+        self._fill(pipe, user_id, members, version)
+        pipe.execute()
+        return members
+
+    def load_many(self, data, versions, conn=None):
+        """
+        :param data: {用户id: 关系用户id集合}，只写入尚未缓存的集合
+        :param versions: 读取数据库之前由versions返回的版本
+        """
+        pipe = (conn or get_redis()).pipeline(transaction=False)
+        for user_id, members in data.items():
+            self._fill(pipe, user_id, members, versions[user_id])
+        pipe.execute()
+
+    def _redis(self):
+        """
+        返回redis连接，并先删除此前写穿失败的集合，使其下次访问时从数据库重新加载
+        """
+        conn = get_redis()
+        if self.stale:
+            stale = set(self.stale)
+            pipe = conn.pipeline()
+            for user_id in stale:
+                pipe.delete(self.key(user_id))
+                pipe.incr(self.version_key(user_id))
+                pipe.expire(self.version_key(user_id), GRAPH_EXPIRE)
+            pipe.execute()
+            self.stale -= stale
+        return conn
+
+    def _local_members(self, user_id):
+        if (members := self.local.get(user_id)) is None:
+            members = set(self.loader(user_id))
+            self.local.set(user_id, members)
+        return members
+
+    def members(self, user_id):
+        if not user_id:
+            return set()
+        try:
+            conn = self._redis()
+            members = conn.smembers(self.key(user_id))
+            if not members:
+                return self.load(user_id, conn)
+            return {int(i) for i in members} - {SENTINEL}
+        except RedisError as e:
+            log.warning(f"关系缓存{self.name}不可用:{str(e)}")
+            return set(self._local_members(user_id))
+
+    def contains(self, user_id, other_id):
+        if not user_id or not other_id:
+            return False
+        try:
+            conn = self._redis()
+            pipe = conn.pipeline()
+            pipe.exists(self.key(user_id))
+            pipe.sismember(self.key(user_id), other_id)
+            exists, contained = pipe.execute()
+            if not exists:
+                return int(other_id) in self.load(user_id, conn)
+            return bool(contained)
+        except RedisError as e:
+            log.warning(f"关系缓存{self.name}不可用:{str(e)}")
+            return int(other_id) in self._local_members(user_id)
+
+    def diff(self, user_id, other: "RelationCache"):
+        """
+        返回本关系集合中不属于other关系集合的用户id，差集在redis中计算
+        """
+        if not user_id:
+            return set()
+        try:
+            conn = self._redis()
+            pipe = conn.pipeline()
+            pipe.exists(self.key(user_id))
+            pipe.exists(other.key(user_id))
+            pipe.sdiff(self.key(user_id), other.key(user_id))
+            exists, other_exists, members = pipe.execute()
+            if not exists or not other_exists:
+                if not exists:
+                    self.load(user_id, conn)
+                if not other_exists:
+                    other.load(user_id, conn)
+                members = conn.sdiff(self.key(user_id), other.key(user_id))
+            return {int(i) for i in members} - {SENTINEL}
+        except RedisError as e:
+            log.warning(f"关系缓存{self.name}不可用:{str(e)}")
+            return self._local_members(user_id) - other._local_members(user_id)
+
+    def _write(self, action, user_id, other_id):
+        members = self.local.get(user_id)
+        if members is not None:
+            members = set(members)
+            if action == "add":
+                members.add(int(other_id))
+            else:
+                members.discard(int(other_id))
+            self.local.set(user_id, members)
+
+        try:
+            conn = self._redis()
+            if self._script is None:
+                self._script = conn.register_script(WRITE_SCRIPT)
+            self._script(
+                keys=[self.key(user_id), self.version_key(user_id)], args=[action, other_id, GRAPH_EXPIRE]
+            )
+        except RedisError as e:
+            log.warning(f"关系缓存{self.name}写入失败:{str(e)}")
+            self.stale.add(user_id)
+
+    def add(self, user_id, other_id):
+        self._write("add", user_id, other_id)
+
+    def remove(self, user_id, other_id):
+        self._write("remove", user_id, other_id)
+
+    def check(self, user_id, conn=None):
+        """
+        比较缓存与数据库，返回(缓存多出的id, 缓存缺少的id)，未缓存时返回None
+        """
+        members = (conn or get_redis()).smembers(self.key(user_id))
+        if not members:
+            return None
+        cached = {int(i) for i in members} - {SENTINEL}
+        actual = set(self.loader(user_id))
+        return cached - actual, actual - cached
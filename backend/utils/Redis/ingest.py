@@ -0,0 +1,107 @@
+import json
+
+from .client import get_redis, make_key
+from .settings import INGEST_MEMBER_EXPIRE
+
+# 集合中的占位元素，用于区分空集合与未加载
+SENTINEL = 0
+
+# 成员集合未加载时返回-1；成员已存在或仍待写回时返回0；否则记入成员集合、待写回哈希与队列，返回1
+CLAIM_SCRIPT = """
+if redis.call("exists", KEYS[1]) == 0 then
+    return -1
+end
+if redis.call("hexists", KEYS[2], ARGV[1]) == 1 or redis.call("sadd", KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+redis.call("hset", KEYS[2], ARGV[1], ARGV[2])
+redis.call("rpush", KEYS[3], ARGV[3])
+return 1
+"""
+
+
+class SubmissionQueue:
+    """
+    每个成员在每组内只能提交一次的写入队列
+    提交时在脚本中原子地完成去重并入队，由命令批量取出写回数据库；
+    写回前的提交内容保存在待写回哈希中，供提交者立即读到自己的提交
+    :param name: 队列名称
+    :param loader: 以组id返回数据库中已提交成员的函数，成员集合缺失时用于初始化
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self._script = None
+
+    def member_key(self, group):
+        return make_key("ingest", self.name, group, "member")
+
+    def pending_key(self, group):
+        return make_key("ingest", self.name, group, "pending")
+
+    @property
+    def queue_key(self):
+        return make_key("ingest", self.name, "queue")
+
+    @property
+    def processing_key(self):
+        return make_key("ingest", self.name, "processing")
+
+    def _load(self, conn, group):
+        key = self.member_key(group)
+        pipe = conn.pipeline()
+        pipe.sadd(key, SENTINEL, *self.loader(group))
+        pipe.expire(key, INGEST_MEMBER_EXPIRE)
+        pipe.execute()
+
+    def claim(self, group, member, payload):
+        """
+        :return: 是否为该成员在组内的首次提交
+        """
+        conn = get_redis()
+        if self._script is None:
+            self._script = conn.register_script(CLAIM_SCRIPT)
+        keys = [self.member_key(group), self.pending_key(group), self.queue_key]
+        args = [member, json.dumps(payload), json.dumps([group, member, payload])]
+        ret = self._script(keys=keys, args=args)
+        if ret == -1:
+            self._load(conn, group)
+            ret = self._script(keys=keys, args=args)
+        return ret == 1
+
+    def pending(self, group, member):
+        """
+        :return: 尚未写回的提交内容，无则为None
+        """
+        payload = get_redis().hget(self.pending_key(group), member)
+        return None if payload is None else json.loads(payload)
+
+    def has_pending(self, group):
+        """
+        组内是否仍有尚未写回的提交
+        """
+        return bool(get_redis().hlen(self.pending_key(group)))
+
+    def drain(self, batch):
+        """
+        逐批取出待写回的提交，返回[(组id, 成员, 提交内容)]的迭代器
+        每批写回数据库后调用ack移出队列，未确认的批次在下次执行时重新取出
+        """
+        conn = get_redis()
+        if not conn.exists(self.processing_key) and conn.exists(self.queue_key):
+            conn.rename(self.queue_key, self.processing_key)
+
+        while True:
+            items = conn.lrange(self.processing_key, 0, batch - 1)
+            if not items:
+                return
+            yield [tuple(json.loads(i)) for i in items]
+
+    def ack(self, items):
+        conn = get_redis()
+        pipe = conn.pipeline()
+        pipe.ltrim(self.processing_key, len(items), -1)
+        for group, member, _ in items:
+            pipe.hdel(self.pending_key(group), member)
+        pipe.execute()
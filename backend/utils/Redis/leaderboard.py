@@ -0,0 +1,107 @@
+import datetime
+
+from redis.exceptions import RedisError
+
+from .client import get_redis, make_key
+from .settings import BOARD_WEEK_EXPIRE
+from backend.libs.wraps.logger import log
+
+PERIODS = ("all", "week")
+
+
+def week_of(date=None):
+    year, week, _ = (date or datetime.date.today()).isocalendar()
+    return f"{year}w{week:02d}"
+
+
+class Leaderboard:
+    """
+    基于redis有序集合的排行榜
+    每个榜单同时维护总榜与按ISO周分键的周榜，增量与计数字段在同一处写入；
+    排名与分数查询均为O(log n)，redis数据丢失后需执行rebuild_leaderboards重建
+    :param name: 榜单名称
+    :param fallback: redis不可用或总榜未构建时，以(offset, n, scope)从数据库读取总榜的函数
+    """
+
+    def __init__(self, name, fallback=None):
+        self.name = name
+        self.fallback = fallback
+
+    def key(self, period="all", scope=None):
+        if period == "week":
+            period = week_of()
+        return make_key("board", self.name, *([] if scope is None else [scope]), period)
+
+    def staging_key(self, period="all", scope=None):
+        return f"{self.key(period, scope)}:staging"
+
+    def incr(self, member, n=1, scope=None, periods=PERIODS):
+        """
+        :param periods: 计入的榜单，撤销往周的记录时只应计入总榜
+        """
+        if not n:
+            return
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            for period in periods:
+                key = self.key(period, scope)
+                pipe.zincrby(key, n, member)
+                if period == "week":
+                    pipe.expire(key, BOARD_WEEK_EXPIRE)
+            pipe.execute()
+        except RedisError as e:
+            log.warning(f"排行榜{self.name}更新失败:{str(e)}")
+
+    def top(self, n, period="all", scope=None, offset=0):
+        """
+        :return: [(成员, 分数)]
+        """
+        key = self.key(period, scope)
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            pipe.exists(key)
+            pipe.zrevrange(key, offset, offset + n - 1, withscores=True)
+            exists, items = pipe.execute()
+            if exists or period != "all" or self.fallback is None:
+                return [(int(member), int(score)) for member, score in items]
+        except RedisError as e:
+            log.warning(f"排行榜{self.name}读取失败:{str(e)}")
+            if period != "all" or self.fallback is None:
+                return []
+        return list(self.fallback(offset, n, scope))
+
+    def rank(self, member, period="all", scope=None):
+        """
+        :return: (从1开始的排名, 分数)，未上榜时排名为None
+        """
+        key = self.key(period, scope)
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            pipe.zrevrank(key, member)
+            pipe.zscore(key, member)
+            rank, score = pipe.execute()
+        except RedisError as e:
+            log.warning(f"排行榜{self.name}读取失败:{str(e)}")
+            return None, 0
+        return None if rank is None else rank + 1, int(score or 0)
+
+    def reset_staging(self, period="all", scope=None):
+        get_redis().delete(self.staging_key(period, scope))
+
+    def stage(self, scores, period="all", scope=None):
+        """
+        重建时分批写入暂存榜单，全部写入后由publish替换正式榜单
+        """
+        scores = {member: score for member, score in scores.items() if score}
+        if scores:
+            get_redis().zadd(self.staging_key(period, scope), scores)
+
+    def publish(self, period="all", scope=None):
+        conn = get_redis()
+        key, staging_key = self.key(period, scope), self.staging_key(period, scope)
+        if not conn.exists(staging_key):
+            conn.delete(key)
+            return
+        conn.rename(staging_key, key)
+        if period == "week":
+            conn.expire(key, BOARD_WEEK_EXPIRE)
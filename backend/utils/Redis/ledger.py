@@ -0,0 +1,97 @@
+from .client import get_redis, make_key
+from .settings import DAILY_EXPIRE
+
+# 未达上限时计数加一并返回1；已达上限返回0
+ADD_SCRIPT = """
+local n = tonumber(redis.call("hget", KEYS[1], ARGV[1]) or "0")
+if n >= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call("hincrby", KEYS[1], ARGV[1], 1)
+redis.call("expire", KEYS[1], ARGV[4])
+redis.call("sadd", KEYS[2], ARGV[3])
+redis.call("expire", KEYS[2], ARGV[4])
+return 1
+"""
+
+
+class DailyLedger:
+    """
+    每日任务台账
+    每个用户每天的任务次数保存为redis哈希，上限检查与计数在脚本中原子完成，
+    有变动的用户记入脏集合，由flush_daily命令批量写回数据库
+    :param name: 台账名称
+    :param rules: {任务: (每日上限, 每次经验)}
+    :param loader: 以(用户id, 日期)返回数据库中当日任务次数的函数，台账缺失时用于初始化
+    """
+
+    def __init__(self, name, rules, loader):
+        self.name = name
+        self.rules = rules
+        self.loader = loader
+        self._script = None
+
+    def key(self, date, user_id):
+        return make_key("daily", self.name, date, user_id)
+
+    def dirty_key(self, date):
+        return make_key("daily", self.name, date, "dirty")
+
+    def flushing_key(self, date):
+        return make_key("daily", self.name, date, "flushing")
+
+    def _ensure(self, conn, date, user_id):
+        key = self.key(date, user_id)
+        if conn.exists(key):
+            return
+        pipe = conn.pipeline()
+        for task, n in self.loader(user_id, date).items():
+            pipe.hsetnx(key, task, n)
+        pipe.expire(key, DAILY_EXPIRE)
+        pipe.execute()
+
+    def add(self, user_id, task, date):
+        """
+        :return: 是否获得奖励
+        """
+        limit, _ = self.rules[task]
+        conn = get_redis()
+        self._ensure(conn, date, user_id)
+        if self._script is None:
+            self._script = conn.register_script(ADD_SCRIPT)
+        return bool(self._script(
+            keys=[self.key(date, user_id), self.dirty_key(date)],
+            args=[task, limit, user_id, DAILY_EXPIRE],
+        ))
+
+    def get(self, user_id, date):
+        conn = get_redis()
+        self._ensure(conn, date, user_id)
+        data = conn.hgetall(self.key(date, user_id))
+        return {task: int(data.get(task.encode("utf-8"), 0)) for task in self.rules}
+
+    def drain(self, date, batch):
+        """
+        逐批取出有变动的用户，返回{用户id: {任务: 次数}}的迭代器
+        次数为当日累计值，写回时应据此与数据库中的次数求差得到应奖励的经验，重复写回不会重复奖励
+        """
+        conn = get_redis()
+        if not conn.exists(self.flushing_key(date)) and conn.exists(self.dirty_key(date)):
+            conn.rename(self.dirty_key(date), self.flushing_key(date))
+
+        user_ids = [int(i) for i in conn.smembers(self.flushing_key(date))]
+        for i in range(0, len(user_ids), batch):
+            ids = user_ids[i:i + batch]
+            pipe = conn.pipeline(transaction=False)
+            for user_id in ids:
+                pipe.hgetall(self.key(date, user_id))
+
+            counts = {}
+            for user_id, data in zip(ids, pipe.execute()):
+                if not data:
+                    continue
+                data = {k.decode("utf-8"): int(v) for k, v in data.items()}
+                counts[user_id] = {task: data.get(task, 0) for task in self.rules}
+            yield counts
+
+        conn.delete(self.flushing_key(date))
@@ -0,0 +1,127 @@
+import json
+
+from redis.exceptions import RedisError
+
+from .client import get_redis, make_key
+from .settings import PRINCIPAL_EXPIRE
+from backend.libs.wraps.logger import log
+
+
+def principal_key(user_id):
+    return make_key("principal", user_id)
+
+
+def permission_key(user_id):
+    return make_key("permission", user_id)
+
+
+def version_key(user_id=None):
+    """
+    user_id为None时为全局版本，权限或权限组本身变动时递增
+    """
+    if user_id is None:
+        return make_key("principal", "version")
+    return make_key("principal", "version", user_id)
+
+
+def get_principal(user_id):
+    """
+    返回(快照, 当前版本)，快照缺失或版本不一致时快照为None，redis不可用时返回(None, None)
+    """
+    try:
+        data, user_version, global_version = get_redis().mget(
+            principal_key(user_id), version_key(user_id), version_key()
+        )
+    except RedisError as e:
+        log.warning(f"用户快照缓存不可用:{str(e)}")
+        return None, None
+
+    version = (int(user_version or 0), int(global_version or 0))
+    if data is None:
+        return None, version
+
+    try:
+        data = json.loads(data)
+    except ValueError:
+        return None, version
+    if tuple(data["version"]) != version:
+        return None, version
+    return data, version
+
+
+def store_principal(user_id, version, data):
+    """
+    :param version: 加载数据库之前读取的版本，期间发生变动时快照随即失效
+    :param data: 可JSON序列化的快照
+    """
+    if version is None:
+        return
+    try:
+        get_redis().set(principal_key(user_id), json.dumps({**data, "version": version}), ex=PRINCIPAL_EXPIRE)
+    except RedisError as e:
+        log.warning(f"用户快照写入失败:{str(e)}")
+
+
+def get_permissions(user_ids):
+    """
+    批量读取权限集合缓存
+    :return: ({用户id: 权限集合}, {未命中的用户id: 当前版本})
+    """
+    try:
+        conn = get_redis()
+        values = conn.mget(
+            [permission_key(i) for i in user_ids] + [version_key(i) for i in user_ids] + [version_key()]
+        )
+    except RedisError as e:
+        log.warning(f"权限缓存不可用:{str(e)}")
+        return {}, {i: None for i in user_ids}
+
+    n = len(user_ids)
+    global_version = int(values[-1] or 0)
+    hits, misses = {}, {}
+    for user_id, data, user_version in zip(user_ids, values[:n], values[n:2 * n]):
+        version = (int(user_version or 0), global_version)
+        try:
+            data = json.loads(data) if data is not None else None
+        except ValueError:
+            data = None
+        if data is None or tuple(data["version"]) != version:
+            misses[user_id] = version
+        else:
+            hits[user_id] = set(data["permission"])
+    return hits, misses
+
+
+def store_permissions(data, versions):
+    """
+    :param data: {用户id: 权限集合}
+    :param versions: {用户id: 加载数据库之前读取的版本}
+    """
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for user_id, permission in data.items():
+            if (version := versions.get(user_id)) is None:
+                continue
+            value = json.dumps({"permission": list(permission), "version": version})
+            pipe.set(permission_key(user_id), value, ex=PRINCIPAL_EXPIRE)
+        pipe.execute()
+    except RedisError as e:
+        log.warning(f"权限缓存写入失败:{str(e)}")
+
+
+def bump_principal(user_ids=None):
+    """
+    使用户快照及权限集合缓存失效
+    :param user_ids: 用户id列表，为None时使全部缓存失效
+    """
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        if user_ids is None:
+            pipe.incr(version_key())
+        else:
+            for user_id in user_ids:
+                pipe.incr(version_key(user_id))
+                pipe.delete(principal_key(user_id), permission_key(user_id))
+        pipe.execute()
+    except RedisError as e:
+        log.warning(f"用户快照失效失败:{str(e)}")
@@ -0,0 +1,29 @@
+PREFIX = "bc"
+
+# 浏览记录集合过期时间(秒)
+VIEW_SEEN_EXPIRE = 7 * 24 * 60 * 60
+
+# 每批写回数据库的条数
+FLUSH_BATCH = 500
+
+# 未读消息计数过期时间(秒)
+UNREAD_EXPIRE = 30 * 24 * 60 * 60
+
+# 用户关系集合过期时间(秒)
+GRAPH_EXPIRE = 24 * 60 * 60
+
+# redis不可用时进程内关系集合的容量与过期时间(秒)
+GRAPH_LOCAL_SIZE = 1024
+GRAPH_LOCAL_EXPIRE = 60
+
+# 登录用户快照过期时间(秒)
+PRINCIPAL_EXPIRE = 5 * 60
+
+# 每日任务台账过期时间(秒)，需长于写回间隔
+DAILY_EXPIRE = 2 * 24 * 60 * 60
+
+# 周榜过期时间(秒)，保留上一周的榜单
+BOARD_WEEK_EXPIRE = 14 * 24 * 60 * 60
+
+# 提交队列成员集合过期时间(秒)
+INGEST_MEMBER_EXPIRE = 24 * 60 * 60
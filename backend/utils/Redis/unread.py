@@ -0,0 +1,62 @@
+from redis.exceptions import RedisError
+
+from .client import get_redis, make_key
+from .settings import UNREAD_EXPIRE
+from backend.libs.wraps.logger import log
+
+CATEGORY = ("dynamic", "at", "private", "system", "like", "reply")
+
+
+def unread_key(user_id):
+    return make_key("unread", user_id)
+
+
+def incr_unread(category, counts):
+    """
+    :param category: 消息类别
+    :param counts: {用户id: 增量}
+    """
+    counts = {k: v for k, v in counts.items() if v}
+    if not counts:
+        return
+
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for user_id, n in counts.items():
+            pipe.hincrby(unread_key(user_id), category, n)
+            pipe.expire(unread_key(user_id), UNREAD_EXPIRE)
+        pipe.execute()
+    except RedisError as e:
+        log.warning(f"未读计数更新失败:{str(e)}")
+
+
+def reset_unread(user_id, category):
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.hset(unread_key(user_id), category, 0)
+        pipe.expire(unread_key(user_id), UNREAD_EXPIRE)
+        pipe.execute()
+    except RedisError as e:
+        log.warning(f"未读计数清零失败:{str(e)}")
+
+
+def get_unread(user_id):
+    """
+    缓存缺失或不完整时返回None
+    """
+    data = get_redis().hgetall(unread_key(user_id))
+    data = {k.decode("utf-8"): max(int(v), 0) for k, v in data.items()}
+    if any(i not in data for i in CATEGORY):
+        return None
+    return {i: data[i] for i in CATEGORY}
+
+
+def store_unread(data):
+    """
+    :param data: {用户id: {类别: 未读数}}
+    """
+    pipe = get_redis().pipeline(transaction=False)
+    for user_id, counts in data.items():
+        pipe.hset(unread_key(user_id), mapping={i: counts.get(i, 0) for i in CATEGORY})
+        pipe.expire(unread_key(user_id), UNREAD_EXPIRE)
+    pipe.execute()
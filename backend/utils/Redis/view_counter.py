@@ -0,0 +1,138 @@
+from django.db import transaction
+from django.db.models import F, Case, When, Value
+from redis.exceptions import RedisError
+
+from .client import get_redis, make_key
+from .settings import VIEW_SEEN_EXPIRE, FLUSH_BATCH
+from backend.libs.wraps.logger import log
+
+
+class ViewCounter:
+    """
+    浏览量写缓冲
+    浏览去重与浏览量增量保存在redis中，由flush_view_num命令批量写回数据库
+    :param name: 计数器名称
+    :param model: 被浏览的模型，需有view_num字段
+    :param view_model: 浏览记录模型
+    :param field: 浏览记录中指向被浏览对象的外键名
+    """
+
+    def __init__(self, name, model, view_model, field):
+        self.name = name
+        self.model = model
+        self.view_model = view_model
+        self.field = field
+
+    def seen_key(self, pk):
+        return make_key("view", self.name, "seen", pk)
+
+    @property
+    def delta_key(self):
+        return make_key("view", self.name, "delta")
+
+    @property
+    def flushing_key(self):
+        return make_key("view", self.name, "flushing")
+
+    @property
+    def log_key(self):
+        return make_key("view", self.name, "log")
+
+    @property
+    def log_processing_key(self):
+        return make_key("view", self.name, "log", "processing")
+
+    def _load_seen(self, conn, pk):
+        viewers = self.view_model.objects.filter(**{f"{self.field}_id": pk}).values_list("name_id", flat=True)
+        pipe = conn.pipeline()
+        pipe.sadd(self.seen_key(pk), 0, *viewers)
+        pipe.expire(self.seen_key(pk), VIEW_SEEN_EXPIRE)
+        pipe.execute()
+
+    def view(self, pk, user_id):
+        """
+        记录一次浏览，返回尚未写回数据库的浏览量增量，redis不可用时直接写入数据库
+        """
+        try:
+            return self._view(pk, user_id)
+        except RedisError as e:
+            log.warning(f"浏览计数{self.name}不可用:{str(e)}")
+        if not user_id:
+            return 0
+
+        with transaction.atomic():
+            _, created = self.view_model.objects.get_or_create(**{f"{self.field}_id": pk, "name_id": user_id})
+            if created:
+                self.model.objects.filter(id=pk).update(view_num=F("view_num") + 1)
+        return int(created)
+
+    def _view(self, pk, user_id):
+        conn = get_redis()
+        if not user_id:
+            return self.pending(pk, conn)
+
+        key = self.seen_key(pk)
+        if not conn.exists(key):
+            self._load_seen(conn, pk)
+
+        if conn.sadd(key, user_id):
+            pipe = conn.pipeline()
+            pipe.hincrby(self.delta_key, pk, 1)
+            pipe.rpush(self.log_key, f"{pk},{user_id}")
+            pipe.expire(key, VIEW_SEEN_EXPIRE)
+            pipe.execute()
+
+        return self.pending(pk, conn)
+
+    def pending(self, pk, conn=None):
+        conn = conn or get_redis()
+        pipe = conn.pipeline()
+        pipe.hget(self.delta_key, pk)
+        pipe.hget(self.flushing_key, pk)
+        return sum(int(i or 0) for i in pipe.execute())
+
+    def flush(self):
+        """
+        将浏览量增量与浏览记录批量写回数据库，返回(更新对象数, 新增浏览记录数)
+        增量在一个事务中写回，提交后才删除；浏览记录写入后才移出处理队列，重复执行不会重复写入
+        """
+        conn = get_redis()
+        if not conn.exists(self.flushing_key) and conn.exists(self.delta_key):
+            conn.rename(self.delta_key, self.flushing_key)
+
+        delta = {int(k): int(v) for k, v in conn.hgetall(self.flushing_key).items()}
+        items = list(delta.items())
+        with transaction.atomic():
+            for i in range(0, len(items), FLUSH_BATCH):
+                batch = items[i:i + FLUSH_BATCH]
+                self.model.objects.filter(id__in=[pk for pk, _ in batch]).update(
+                    view_num=F("view_num") + Case(*[When(id=pk, then=Value(n)) for pk, n in batch], default=Value(0))
+                )
+            transaction.on_commit(lambda: conn.delete(self.flushing_key))
+
+        if not conn.exists(self.log_processing_key) and conn.exists(self.log_key):
+            conn.rename(self.log_key, self.log_processing_key)
+
+        logged = 0
+        while True:
+            records = conn.lrange(self.log_processing_key, 0, FLUSH_BATCH - 1)
+            if not records:
+                break
+
+            pairs = set()
+            for record in records:
+                pk, user_id = record.decode("utf-8").split(",")
+                pairs.add((int(pk), int(user_id)))
+            existing = set(self.view_model.objects.filter(**{
+                f"{self.field}_id__in": {pk for pk, _ in pairs},
+                "name_id__in": {user_id for _, user_id in pairs},
+            }).values_list(f"{self.field}_id", "name_id"))
+            create_data = [
+                self.view_model(**{f"{self.field}_id": pk, "name_id": user_id})
+                for pk, user_id in pairs - existing
+            ]
+            self.view_model.objects.bulk_create(create_data)
+            conn.ltrim(self.log_processing_key, len(records), -1)
+            logged += len(create_data)
+
+        return len(items), logged